@@ -0,0 +1,387 @@
+"""
+Almacén de inventario en memoria con recarga en caliente
+Lee el inventario una sola vez y solo lo vuelve a leer cuando cambia el archivo. Un inventario .xlsx/.csv
+se importa a una base SQLite indexada (inventario_sqlite) y el DataFrame se carga desde la base.
+Los cambios por ID de producto se aplican al snapshot en memoria y se persisten en la base en segundo plano;
+los demás procesos los leen del registro de cambios de la base
+"""
+
+import os
+import time
+import uuid
+import queue
+import sqlite3
+import threading
+import logging
+from collections import namedtuple
+
+from metricas import metricas
+from cambios_inventario import (
+    COLUMNA_ID, ErrorCambios, clave_id, normalizar_operaciones, planificar, lector_filas, aplicar_a_dataframe,
+    encadenar_huella
+)
+from inventario_sqlite import (
+    InventarioSQLite, es_base, firma_archivo, leer_origen, base_actualizada, importar_inventario, leer_base,
+    leer_cambios, aplicar_lotes
+)
+
+logger = logging.getLogger(__name__)
+
+# Snapshot inmutable del inventario: no modificar el DataFrame, reemplazar el snapshot completo
+# consultas: InventarioSQLite de la misma importación que df, o None si no hay base indexada
+# cambios: huella de los lotes de cambios aplicados sobre la importación ('' si no hay ninguno)
+SnapshotInventario = namedtuple(
+    'SnapshotInventario', ['df', 'version', 'mtime', 'tamano', 'cargado_en', 'consultas', 'cambios']
+)
+
+# Lotes de cambios que se escriben en la base en una misma transacción
+MAX_LOTES_PERSISTENCIA = 100
+
+# Reintentos al persistir un grupo de lotes (base bloqueada por otro proceso)
+REINTENTOS_PERSISTENCIA = 3
+
+
+class AlmacenInventario:
+    """Mantiene el inventario en memoria y lo recarga cuando cambia el archivo en disco"""
+
+    def __init__(self, ruta='inventario.xlsx', intervalo_verificacion=1.0, ruta_base=None):
+        self.ruta = ruta
+        # Base SQLite usada en tiempo de ejecución (None: se usa solo el DataFrame leído con pandas)
+        self.ruta_base = ruta if es_base(ruta) else ruta_base
+        self.intervalo_verificacion = intervalo_verificacion
+        self._lock = threading.Lock()
+        # Sin DataFrame hasta la primera carga: pandas se importa recién al leer el inventario
+        self._snapshot = SnapshotInventario(None, 0, None, None, 0.0, None, '')
+        self._ultima_verificacion = 0.0
+        # Cambios incrementales: último lote del registro de la base reflejado en memoria, firma de la base
+        # al leerlo y lotes de este proceso aplicados en memoria que todavía no se vieron en el registro
+        self._secuencia = 0
+        self._firma_base = (None, None)
+        self._propios = set()
+        self._claves = (None, None)
+        self._suscriptores = []
+        self._pendientes = queue.Queue()
+        self._persistencia = None
+        self._pid_persistencia = None
+
+    @property
+    def version(self):
+        """Versión del snapshot actual (cambia cada vez que se recarga el inventario)"""
+        return self._snapshot.version
+
+    def obtener_snapshot(self):
+        """Retorna el snapshot actual, recargándolo si el archivo cambió"""
+        ahora = time.monotonic()
+        if ahora - self._ultima_verificacion >= self.intervalo_verificacion or self._snapshot.df is None:
+            self._verificar_cambios(ahora)
+        return self._snapshot
+
+    def version_de(self, df):
+        """Retorna la versión del snapshot al que pertenece df, o None si no es el actual"""
+        snapshot = self._snapshot
+        return snapshot.version if df is snapshot.df and snapshot.version else None
+
+    def huella_de(self, df):
+        """Retorna una huella estable entre procesos o None si df no es el actual
+
+        Es la de la importación (mtime-tamaño del archivo de origen) más la de los cambios aplicados después.
+        """
+        snapshot = self._snapshot
+        if df is not snapshot.df or not snapshot.version:
+            return None
+        huella = snapshot.consultas.huella if snapshot.consultas is not None else f"{snapshot.mtime}-{snapshot.tamano}"
+        return f"{huella}+{snapshot.cambios}" if snapshot.cambios else huella
+
+    def consultas_de(self, df):
+        """Retorna las consultas indexadas del snapshot al que pertenece df, o None"""
+        snapshot = self._snapshot
+        return snapshot.consultas if df is snapshot.df else None
+
+    def obtener_dataframe(self):
+        """Retorna el DataFrame del snapshot actual"""
+        return self.obtener_snapshot().df
+
+    def forzar_recarga(self):
+        """Vuelve a leer el archivo aunque no haya cambiado"""
+        with self._lock:
+            self._recargar(*self._firma_archivo())
+        return self._snapshot
+
+    def _firma_archivo(self):
+        """Obtiene (mtime, tamaño) del archivo o (None, None) si no existe"""
+        return firma_archivo(self.ruta)
+
+    def _firma_base_actual(self):
+        return firma_archivo(self.ruta_base) if self.ruta_base else (None, None)
+
+    def _verificar_cambios(self, ahora):
+        """Compara la firma del archivo con la del snapshot y recarga si es distinta
+
+        Si solo cambió la base (otro proceso persistió cambios), se aplican los lotes nuevos de su registro.
+        """
+        # Un solo hilo verifica a la vez; el resto sigue usando el snapshot actual
+        if not self._lock.acquire(blocking=self._snapshot.version == 0):
+            return
+        try:
+            self._ultima_verificacion = ahora
+            mtime, tamano = self._firma_archivo()
+            snapshot = self._snapshot
+            origen_igual = (mtime, tamano) == (snapshot.mtime, snapshot.tamano)
+            if snapshot.version and origen_igual and self._firma_base_actual() == self._firma_base:
+                return
+            if snapshot.version and snapshot.consultas is not None and (origen_igual or self.ruta_base == self.ruta):
+                firma_base = self._firma_base_actual()
+                if self._aplicar_cambios_externos(snapshot):
+                    self._firma_base = firma_base
+                    if not origen_igual:
+                        # El origen es la propia base: su firma cambia con cada lote persistido
+                        self._snapshot = self._snapshot._replace(mtime=mtime, tamano=tamano)
+                    return
+            self._recargar(mtime, tamano)
+        finally:
+            self._lock.release()
+
+    def _recargar(self, mtime, tamano):
+        """Lee el archivo y reemplaza el snapshot de forma atómica (debe llamarse con el lock)"""
+        if self._snapshot.df is None:
+            import pandas as pd
+            self._snapshot = self._snapshot._replace(df=pd.DataFrame())
+        if mtime is None:
+            if self._snapshot.version == 0:
+                logger.error(f"Archivo {self.ruta} no encontrado")
+            return
+        try:
+            with metricas.medir('inventario_carga_segundos'):
+                df, consultas, meta, firma_base = self._leer(mtime, tamano)
+        except Exception as e:
+            # Conservar el último snapshot válido si el archivo está a medio escribir
+            logger.error(f"Error cargando inventario: {e}")
+            return
+        self._snapshot = SnapshotInventario(
+            df, self._snapshot.version + 1, mtime, tamano, time.time(), consultas, meta.get('cadena', '')
+        )
+        # La base ya incluye todos los lotes persistidos hasta su secuencia (también los propios)
+        self._secuencia = int(meta.get('secuencia', 0))
+        self._firma_base = firma_base
+        self._propios = set()
+        self._claves = (None, None)
+        logger.info(f"Inventario cargado: {len(df)} productos (versión {self._snapshot.version})")
+
+    def _leer(self, mtime, tamano):
+        """Retorna (DataFrame, consultas indexadas, metadatos, firma de la base), importando el origen si cambió"""
+        if self.ruta_base is None:
+            return leer_origen(self.ruta), None, {}, (None, None)
+        if self.ruta_base != self.ruta and not base_actualizada(self.ruta_base, mtime, tamano):
+            try:
+                importar_inventario(self.ruta, self.ruta_base)
+            except (OSError, sqlite3.Error) as e:
+                # Sin permisos de escritura (o sin espacio) se sigue sirviendo el archivo de origen
+                logger.error(f"No se pudo importar el inventario a {self.ruta_base}: {e}")
+                return leer_origen(self.ruta), None, {}, (None, None)
+        # La firma se toma antes de leer: un lote persistido durante la lectura se detecta en la próxima verificación
+        firma_base = self._firma_base_actual()
+        df, meta = leer_base(self.ruta_base)
+        return df, InventarioSQLite(self.ruta_base, meta['huella']), meta, firma_base
+
+    def suscribir(self, funcion):
+        """Registra funcion(df, version_anterior, version, posiciones), llamada al aplicar cada lote de cambios
+
+        Permite actualizar los índices derivados del inventario solo en las posiciones modificadas; se llama
+        antes de publicar el snapshot nuevo.
+        """
+        self._suscriptores.append(funcion)
+
+    def aplicar_cambios(self, altas=None, bajas=None):
+        """Aplica un lote de filas a insertar o actualizar y de IDs a eliminar; la base se actualiza en segundo plano
+
+        Retorna (snapshot, plan). Lanza ErrorCambios si el lote es inválido (no se aplica nada).
+        """
+        lote = uuid.uuid4().hex
+        # Carga el inventario si este proceso todavía no lo leyó y aplica los lotes de otros procesos
+        self.obtener_snapshot()
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot.consultas is None:
+                raise ErrorCambios("Los cambios requieren la base SQLite del inventario (INVENTARIO_SQLITE=true)")
+            df = snapshot.df
+            numericas = [c for c in df.columns if c != COLUMNA_ID and df[c].dtype.kind in 'biuf']
+            operaciones = normalizar_operaciones(altas, bajas, list(df.columns), numericas)
+            with metricas.medir('inventario_cambios_segundos'):
+                snapshot, plan = self._aplicar_en_memoria(snapshot, operaciones, lote)
+            self._propios.add(lote)
+            # Se encola con el lock tomado: la base recibe los lotes en el mismo orden que la memoria
+            self._encolar_persistencia(snapshot.consultas.huella, lote, operaciones)
+        for operacion, cantidad in plan.resumen.items():
+            if cantidad:
+                metricas.contar('inventario_cambios_total', cantidad, operacion=operacion)
+        return snapshot, plan
+
+    def _mapa_claves(self, snapshot):
+        """{clave de ID: posición} del snapshot (se construye una vez y se actualiza con cada lote)"""
+        version, claves = self._claves
+        if version == snapshot.version:
+            return claves
+        claves = {}
+        if COLUMNA_ID in snapshot.df.columns:
+            for posicion, valor in enumerate(snapshot.df[COLUMNA_ID].tolist()):
+                try:
+                    claves[clave_id(valor)] = posicion
+                except ErrorCambios:
+                    continue
+        return claves
+
+    def _aplicar_en_memoria(self, snapshot, operaciones, lote):
+        """Aplica el lote al snapshot, actualiza los índices suscritos y publica el snapshot nuevo (con el lock)"""
+        df = snapshot.df
+        claves = self._mapa_claves(snapshot)
+        plan = planificar(operaciones, claves.get, lector_filas(df), len(df), list(df.columns))
+        nuevo_df = aplicar_a_dataframe(df, plan)
+        for clave, posicion in plan.claves.items():
+            if posicion is None:
+                claves.pop(clave, None)
+            else:
+                claves[clave] = posicion
+
+        version = snapshot.version + 1
+        posiciones = sorted(plan.escrituras)
+        for funcion in self._suscriptores:
+            try:
+                funcion(nuevo_df, snapshot.version, version, posiciones)
+            except Exception as e:
+                # El índice se reconstruye completo la próxima vez que se use
+                logger.error(f"Error actualizando un índice del inventario: {e}")
+
+        nuevo = snapshot._replace(
+            df=nuevo_df, version=version, cargado_en=time.time(), cambios=encadenar_huella(snapshot.cambios, lote)
+        )
+        self._snapshot = nuevo
+        self._claves = (version, claves)
+        return nuevo, plan
+
+    def _aplicar_cambios_externos(self, snapshot):
+        """Aplica los lotes que otros procesos persistieron en la base (con el lock)
+
+        Retorna False si hay que releer la base completa: se reimportó, el registro ya no tiene los lotes
+        pendientes o un lote ajeno quedó ordenado antes que uno propio ya aplicado en memoria.
+        """
+        try:
+            meta, lotes = leer_cambios(self.ruta_base, self._secuencia)
+        except (OSError, sqlite3.Error, ValueError) as e:
+            logger.error(f"Error leyendo los cambios del inventario: {e}")
+            return False
+        if meta.get('huella') != snapshot.consultas.huella:
+            return False
+        if lotes and lotes[0][0] != self._secuencia + 1:
+            logger.warning("El registro de cambios ya no tiene todos los lotes pendientes, se relee la base")
+            return False
+
+        aplicados = 0
+        for secuencia, lote, operaciones in lotes:
+            if lote in self._propios:
+                self._propios.discard(lote)
+            elif self._propios:
+                logger.info("Cambios simultáneos desde otro proceso, se relee la base")
+                return False
+            else:
+                try:
+                    snapshot, _ = self._aplicar_en_memoria(snapshot, operaciones, lote)
+                except ErrorCambios as e:
+                    logger.warning(f"Lote {lote} no aplicable en memoria ({e}), se relee la base")
+                    return False
+                aplicados += 1
+            self._secuencia = secuencia
+        if lotes:
+            snapshot.consultas.invalidar()
+        if aplicados:
+            logger.info(f"{aplicados} lotes de cambios de otros procesos aplicados (versión {snapshot.version})")
+        return True
+
+    def _encolar_persistencia(self, huella, lote, operaciones):
+        """Encola el lote para escribirlo en la base, arrancando el hilo de persistencia del proceso si hace falta"""
+        if self._pid_persistencia != os.getpid():
+            # Tras un fork el hilo del proceso padre no existe en el hijo
+            self._pendientes = queue.Queue()
+            self._persistencia = threading.Thread(target=self._persistir, name='inventario-persistencia', daemon=True)
+            self._pid_persistencia = os.getpid()
+            self._persistencia.start()
+        self._pendientes.put((huella, lote, operaciones))
+
+    def _persistir(self):
+        """Bucle del hilo de persistencia: escribe los lotes encolados, varios por transacción"""
+        pendientes = self._pendientes
+        while True:
+            grupo = [pendientes.get()]
+            while len(grupo) < MAX_LOTES_PERSISTENCIA:
+                try:
+                    grupo.append(pendientes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                inicio = 0
+                while inicio < len(grupo):
+                    # Lotes consecutivos de la misma importación
+                    huella = grupo[inicio][0]
+                    fin = inicio
+                    while fin < len(grupo) and grupo[fin][0] == huella:
+                        fin += 1
+                    self._persistir_lotes(huella, [(lote, operaciones) for _, lote, operaciones in grupo[inicio:fin]])
+                    inicio = fin
+            finally:
+                for _ in grupo:
+                    pendientes.task_done()
+
+    def _persistir_lotes(self, huella, lotes):
+        """Escribe los lotes en la base, reintentando si está bloqueada"""
+        for intento in range(REINTENTOS_PERSISTENCIA):
+            try:
+                with metricas.medir('inventario_persistencia_segundos'):
+                    resultado = aplicar_lotes(self.ruta_base, huella, lotes)
+                break
+            except (OSError, sqlite3.Error) as e:
+                logger.error(f"Error persistiendo {len(lotes)} lotes de cambios del inventario (intento {intento + 1}): {e}")
+                time.sleep(0.2 * (intento + 1))
+            except Exception as e:
+                logger.error(f"Lotes de cambios del inventario no persistidos: {e}")
+                break
+        else:
+            metricas.contar('inventario_persistencia_errores_total', len(lotes))
+            return
+        if resultado is None:
+            logger.warning(f"El inventario se reimportó: se descartan {len(lotes)} lotes de cambios sin persistir")
+            return
+        consultas = self._snapshot.consultas
+        if consultas is not None and consultas.huella == huella:
+            consultas.invalidar()
+
+    def esperar_persistencia(self, timeout=10.0):
+        """Espera a que se escriban en la base los lotes encolados; retorna False si no terminaron a tiempo"""
+        limite = time.monotonic() + timeout
+        while self._pendientes.unfinished_tasks:
+            if time.monotonic() >= limite:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def pendientes_persistencia(self):
+        """Lotes de cambios aplicados en memoria que aún no se escribieron en la base"""
+        return self._pendientes.unfinished_tasks
+
+
+def ruta_base_inventario(ruta):
+    """Base SQLite para el inventario: INVENTARIO_DB, o la ruta del origen con extensión .db
+
+    Con INVENTARIO_SQLITE=false no se usa base y el origen se lee directamente con pandas.
+    """
+    if os.getenv('INVENTARIO_SQLITE', 'true').lower() != 'true':
+        return None
+    return os.getenv('INVENTARIO_DB') or os.path.splitext(ruta)[0] + '.db'
+
+
+# Almacén compartido por todo el proceso
+_ruta_inventario = os.getenv('INVENTARIO_PATH', 'inventario.xlsx')
+almacen_inventario = AlmacenInventario(_ruta_inventario, ruta_base=ruta_base_inventario(_ruta_inventario))
+
+
+def obtener_snapshot_inventario():
+    """Retorna el snapshot actual del inventario del proceso"""
+    return almacen_inventario.obtener_snapshot()
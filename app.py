@@ -1,22 +1,42 @@
+# Primero: marca el inicio del arranque para medir cada fase
+from arranque import fases_arranque
 import os
-import json
-import requests
-import pandas as pd
-from flask import Flask, request, render_template, jsonify
+from flask import Flask, request, render_template, jsonify, g, Response
 from twilio.twiml.messaging_response import MessagingResponse
-from twilio.rest import Client
-import google.generativeai as genai
 from dotenv import load_dotenv
-import redis
 from datetime import datetime
+import time
+import hmac
+import socket
 import logging
-from config_agente import obtener_system_prompt, obtener_configuracion, obtener_limites, obtener_mensajes, validar_consulta
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from configuracion_dinamica import almacen_configuracion
+from almacen_inventario import almacen_inventario
+from cambios_inventario import ErrorCambios
+from constructor_prompts import constructor_prompts
+from busqueda_inventario import buscador_inventario
+from clasificador_mensajes import obtener_clasificador
+from consultas_rapidas import motor_consultas, formatear_precio, palabras_de_producto, presente
+from resolutor_productos import resolutor_productos, palabras_normalizadas
+from cache_respuestas import cache_respuestas, RespuestaRespaldo, CacheRespuestas
+from cliente_siliconflow import crear_cliente_siliconflow, CircuitoAbierto
+from cola_respuestas import ColaRespuestas
+from limitador import limitador_consultas, deduplicador_mensajes
+from metricas import metricas
+from modelos_gemini import ResolutorModelos
+from medios import descargar_medio, credenciales_twilio, executor_medios, ErrorMedio, CacheReferenciasArchivos
+from memoria_conversacion import memoria_conversacion, historial_para_siliconflow, historial_para_gemini
+from registro import configurar_logging, muestrear_debug, telefono_log, texto_log
+from respuesta_streaming import EntregaAnticipada, AcumuladorRespuesta, fragmentos_gemini
+from enrutador_proveedores import EnrutadorProveedores, ProveedorIA
+from resiliencia import InterruptorCircuito
 
 # Cargar variables de entorno
 load_dotenv()
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# Configurar logging (nivel LOG_LEVEL, escritura en un hilo aparte)
+configurar_logging()
 logger = logging.getLogger(__name__)
 
 # Fix: Usar gemini-1.5-flash (modelo disponible en API gratuita) - v3
@@ -28,331 +48,347 @@ app = Flask(__name__)
 gemini_api_key = os.getenv('GEMINI_API_KEY')
 siliconflow_api_key = os.getenv('SILICONFLOW_API_KEY')
 
-# Configurar Gemini
-if gemini_api_key:
-    genai.configure(api_key=gemini_api_key)
-    logger.info("Gemini API configurada correctamente")
-else:
+if not gemini_api_key:
     logger.warning("GEMINI_API_KEY no configurada")
 
-# Configurar SiliconFlow
-logger.info("SiliconFlow API configurada correctamente")
+# SDK de Gemini: se importa y configura en el primer uso (importarlo tarda cerca de un segundo)
+_genai = None
+_lock_genai = threading.Lock()
 
-# Variable global para el proveedor de IA activo
-PROVEEDOR_IA_ACTIVO = "siliconflow"  # "gemini" o "siliconflow" - FORZAR SILICONFLOW
+def obtener_genai():
+    """Retorna el módulo google.generativeai configurado con GEMINI_API_KEY"""
+    global _genai
+    if _genai is None:
+        with _lock_genai:
+            if _genai is None:
+                import google.generativeai as genai
+                # Transporte REST: a diferencia de gRPC, sigue funcionando tras el fork de los workers
+                if gemini_api_key:
+                    # GEMINI_API_ENDPOINT permite apuntar a otro servidor compatible (por ejemplo, el falso de benchmark.py)
+                    opciones_cliente = {'api_endpoint': os.getenv('GEMINI_API_ENDPOINT')} if os.getenv('GEMINI_API_ENDPOINT') else None
+                    genai.configure(api_key=gemini_api_key, transport=os.getenv('GEMINI_TRANSPORT', 'rest'), client_options=opciones_cliente)
+                    logger.info("Gemini API configurada correctamente")
+                _genai = genai
+    return _genai
+
+def errores_google():
+    """Excepciones de google.api_core (ya importadas junto con el SDK cuando una llamada a Gemini falla)"""
+    from google.api_core import exceptions
+    return exceptions
+
+# Cliente de SiliconFlow (sesión HTTP persistente, se crea por worker en inicializar_servicios)
+cliente_siliconflow = None
+
+# Proveedor de IA activo: parte de la configuración del agente (PROVEEDOR_IA al arrancar, /api/proveedor después)
+# "auto" reparte entre los proveedores configurados según latencia y errores; "gemini" o "siliconflow" fuerzan uno
+PROVEEDORES_IA = ["auto", "gemini", "siliconflow"]
+
+# Streaming: la generación se corta al llegar a max_respuesta_caracteres y, en modo asíncrono,
+# la primera oración se envía por WhatsApp antes de que termine la respuesta
+STREAMING_IA = os.getenv('STREAMING_IA', 'false').lower() == 'true'
+STREAMING_MIN_SEGMENTO = int(os.getenv('STREAMING_MIN_SEGMENTO', 40))
+
+# Listar modelos de la API (una sola llamada de metadatos, sin generación)
+def consultar_modelos_gemini():
+    """Retorna los modelos de la API de Gemini que soportan generateContent (lanza excepción si falla)"""
+    models = obtener_genai().list_models()
+    available_models = [model.name for model in models if 'generateContent' in model.supported_generation_methods]
+    logger.info(f"Modelos disponibles: {available_models}")
+    return available_models
+
+# Modelo de Gemini resuelto una vez y refrescado en segundo plano
+resolutor_modelos = ResolutorModelos(
+    consultar_modelos_gemini,
+    ttl=int(os.getenv('GEMINI_MODELOS_TTL', 3600))
+)
 
-# Verificar qué modelos están disponibles
 def listar_modelos_disponibles():
-    """Lista los modelos disponibles en la API de Gemini"""
-    try:
-        models = genai.list_models()
-        available_models = []
-        for model in models:
-            if 'generateContent' in model.supported_generation_methods:
-                available_models.append(model.name)
-        logger.info(f"Modelos disponibles: {available_models}")
-        return available_models
-    except Exception as e:
-        logger.error(f"Error listando modelos: {e}")
-        return []
+    """Lista los modelos disponibles según la última resolución (no consulta la API)"""
+    return resolutor_modelos.modelos_disponibles()
 
 # Verificar que el modelo esté disponible
 def verificar_modelo_disponible():
     """Verifica que el modelo de Gemini esté disponible"""
-    try:
-        # Primero listar modelos disponibles
-        modelos_disponibles = listar_modelos_disponibles()
-        
-        # Intentar con diferentes modelos en orden de preferencia
-        modelos_a_probar = [
-            'gemini-1.5-flash',
-            'gemini-1.5-flash-001', 
-            'gemini-1.5-flash-002',
-            'gemini-1.5-pro',
-            'gemini-pro'
-        ]
-        
-        for modelo in modelos_a_probar:
-            try:
-                model = genai.GenerativeModel(modelo)
-                response = model.generate_content("Hola")
-                logger.info(f"Modelo {modelo} verificado correctamente")
-                return True, modelo
-            except Exception as e:
-                logger.warning(f"Modelo {modelo} no disponible: {e}")
-                continue
-        
-        logger.error("Ningún modelo de Gemini está disponible")
-        return False, None
-        
-    except Exception as e:
-        logger.warning(f"Advertencia verificando modelo: {e}")
-        logger.warning("La aplicación continuará, pero el modelo podría no estar disponible")
+    modelo = obtener_modelo_funcional()
+    if not modelo:
         return False, None
+    logger.info(f"Modelo {modelo} verificado correctamente")
+    return True, modelo
 
-# Cargar configuración del agente
-def cargar_configuracion_dinamica():
-    """Carga configuración dinámica si existe, sino usa la por defecto"""
-    try:
-        if os.path.exists('config_dinamico.json'):
-            with open('config_dinamico.json', 'r', encoding='utf-8') as f:
-                config_dinamico = json.load(f)
-            logger.info("Configuración dinámica cargada desde config_dinamico.json")
-            return (
-                config_dinamico.get("system_prompt", obtener_system_prompt()),
-                config_dinamico.get("config_agente", obtener_configuracion()),
-                config_dinamico.get("limites", obtener_limites()),
-                config_dinamico.get("mensajes", obtener_mensajes())
-            )
-        else:
-            logger.info("Usando configuración por defecto")
-            return (
-                obtener_system_prompt(),
-                obtener_configuracion(),
-                obtener_limites(),
-                obtener_mensajes()
-            )
-    except Exception as e:
-        logger.error(f"Error cargando configuración dinámica: {e}")
-        logger.info("Usando configuración por defecto como fallback")
-        return (
-            obtener_system_prompt(),
-            obtener_configuracion(),
-            obtener_limites(),
-            obtener_mensajes()
-        )
+# Verificación del modelo en curso (el proceso ya atiende tráfico mientras tanto)
+verificando_modelo = threading.Event()
 
-SYSTEM_PROMPT, CONFIG, LIMITES, MENSAJES = cargar_configuracion_dinamica()
+def verificar_modelo_en_segundo_plano():
+    """Importa el SDK de Gemini y resuelve el modelo en un hilo aparte"""
+    if not gemini_api_key or verificando_modelo.is_set():
+        return
+    verificando_modelo.set()
 
-# Variable global para almacenar el modelo que funciona
-MODELO_DISPONIBLE = None
+    def verificar():
+        try:
+            modelo_disponible, modelo_usado = verificar_modelo_disponible()
+            if modelo_disponible:
+                fases_arranque.marcar('modelo')
+            else:
+                logger.warning("El modelo de Gemini no está disponible al inicio, pero la aplicación continuará")
+                logger.warning("Se intentará encontrar un modelo funcional cuando se reciba el primer mensaje")
+        except Exception as e:
+            logger.error(f"Error verificando el modelo de Gemini: {e}")
+        finally:
+            verificando_modelo.clear()
+
+    threading.Thread(target=verificar, name='verificacion-modelo', daemon=True).start()
 
 def obtener_modelo_funcional():
-    """Obtiene un modelo de Gemini que funcione"""
-    global MODELO_DISPONIBLE
-    
-    if MODELO_DISPONIBLE:
-        return MODELO_DISPONIBLE
-    
-    # Intentar con diferentes modelos en orden de preferencia
-    # Basado en los modelos disponibles según el debug
-    modelos_a_probar = [
-        'gemini-1.5-flash-latest',
-        'gemini-1.5-flash',
-        'gemini-1.5-pro-latest',
-        'gemini-1.5-pro',
-        'gemini-2.0-flash',
-        'gemini-2.0-flash-001',
-        'gemini-2.5-flash',
-        'gemini-pro-latest',
-        'gemini-pro'
-    ]
+    """Obtiene el modelo de Gemini a usar (cacheado, sin llamadas de prueba)"""
+    return resolutor_modelos.obtener()
+
+# Clientes externos: se crean una vez por proceso (después del fork en gunicorn)
+twilio_client = None
+redis_client = None
+_PID_SERVICIOS = None
+_lock_servicios = threading.Lock()
+
+# Segundos máximos para conectar con Redis al iniciar cada worker (sin Redis se sigue en memoria local)
+REDIS_TIMEOUT_CONEXION = float(os.getenv('REDIS_TIMEOUT_CONEXION', 2))
+
+def inicializar_servicios():
+    """Crea los clientes de Twilio, Redis y SiliconFlow del proceso actual (una sola vez por worker)"""
+    global twilio_client, redis_client, cliente_siliconflow, _PID_SERVICIOS
     
-    for modelo in modelos_a_probar:
+    if _PID_SERVICIOS == os.getpid():
+        return
+    with _lock_servicios:
+        if _PID_SERVICIOS == os.getpid():
+            return
+        
+        # El hilo que escribe los logs no sobrevive al fork
+        configurar_logging()
+        
+        # Configurar SiliconFlow
+        cliente_siliconflow = crear_cliente_siliconflow(siliconflow_api_key)
+        logger.info("SiliconFlow API configurada correctamente")
+        
+        # Configurar Twilio (twilio.rest y redis se importan aquí: no hacen falta para arrancar ni para /health)
+        from twilio.rest import Client
+        twilio_client = Client(
+            os.getenv('TWILIO_ACCOUNT_SID'),
+            os.getenv('TWILIO_AUTH_TOKEN')
+        )
+        
+        # Configurar Redis para memoria (opcional)
         try:
-            logger.info(f"Probando modelo: {modelo}")
-            model = genai.GenerativeModel(modelo)
-            logger.info(f"Modelo {modelo} inicializado correctamente")
-            
-            # Hacer una prueba rápida
-            response = model.generate_content("test")
-            logger.info(f"Modelo {modelo} respondió correctamente: {response.text[:50]}...")
-            
-            MODELO_DISPONIBLE = modelo
-            logger.info(f"Modelo funcional encontrado: {modelo}")
-            return modelo
-        except Exception as e:
-            logger.error(f"Modelo {modelo} falló con error: {str(e)}")
-            logger.error(f"Tipo de error: {type(e).__name__}")
-            continue
+            import redis
+            redis_client = redis.from_url(
+                os.getenv('REDIS_URL', 'redis://localhost:6379'),
+                socket_connect_timeout=REDIS_TIMEOUT_CONEXION
+            )
+            redis_client.ping()
+            logger.info("Redis conectado exitosamente")
+        except Exception:
+            redis_client = None
+            logger.warning("Redis no disponible, usando memoria local")
+        
+        # Compartir la caché de respuestas, la memoria conversacional y la cola entre workers cuando hay Redis
+        cache_respuestas.redis_client = redis_client
+        memoria_conversacion.redis_client = redis_client
+        cache_analisis_medios.redis_client = redis_client
+        limitador_consultas.redis_client = redis_client
+        deduplicador_mensajes.redis_client = redis_client
+        # Los cambios de configuración hechos en otros nodos llegan por pub/sub
+        almacen_configuracion.redis_client = redis_client
+        almacen_configuracion.escuchar()
+        if COLA_BACKEND == 'redis':
+            cola_respuestas.redis_client = redis_client
+        
+        _PID_SERVICIOS = os.getpid()
+        fases_arranque.marcar('servicios')
     
-    logger.error("Ningún modelo de Gemini está disponible")
-    return None
+    # El modelo de Gemini se resuelve sin bloquear (la primera consulta a Gemini espera si aún no terminó)
+    verificar_modelo_en_segundo_plano()
 
-# Configurar Twilio
-twilio_client = Client(
-    os.getenv('TWILIO_ACCOUNT_SID'),
-    os.getenv('TWILIO_AUTH_TOKEN')
-)
+def cerrar_servicios():
+    """Libera los recursos del worker al apagarse (cola, conexiones HTTP y Redis)"""
+    cola_respuestas.detener()
+    # Los lotes de cambios del inventario ya aplicados en memoria se terminan de escribir en la base
+    if not almacen_inventario.esperar_persistencia():
+        logger.warning("Quedaron lotes de cambios del inventario sin escribir en la base")
+    if cliente_siliconflow:
+        cliente_siliconflow.cerrar()
+    if redis_client:
+        redis_client.close()
+    logger.info("Servicios del worker cerrados")
+
+# Los índices derivados del inventario se actualizan solo en las filas tocadas por cada lote de cambios
+almacen_inventario.suscribir(motor_consultas.actualizar)
+almacen_inventario.suscribir(resolutor_productos.actualizar)
 
-# Configurar Redis para memoria (opcional)
-try:
-    redis_client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'))
-    redis_client.ping()
-    logger.info("Redis conectado exitosamente")
-except:
-    redis_client = None
-    logger.warning("Redis no disponible, usando memoria local")
+def precargar():
+    """Carga inventario e índices antes de atender tráfico (en gunicorn, antes del fork)
+
+    El modelo de Gemini no se resuelve aquí: cada worker lo hace en segundo plano al iniciar sus servicios.
+    """
+    snapshot = almacen_inventario.obtener_snapshot()
+    if not snapshot.df.empty:
+        # Con la base SQLite la búsqueda usa su índice FTS5 y no hace falta construirlo en memoria
+        if snapshot.consultas is None:
+            buscador_inventario.obtener_indice(snapshot.df, snapshot.version)
+        if 'Producto' in snapshot.df.columns:
+            motor_consultas.obtener_catalogo(snapshot.df, snapshot.version)
+            resolutor_productos.obtener_indice(snapshot.df, snapshot.version)
+    fases_arranque.marcar('inventario')
+
+def create_app():
+    """Fábrica de la aplicación para servidores WSGI de producción"""
+    precargar()
+    return app
 
 # Cargar datos del Excel
 def cargar_inventario():
-    """Carga el archivo Excel de inventario"""
-    try:
-        df = pd.read_excel('inventario.xlsx')
-        logger.info(f"Inventario cargado: {len(df)} productos")
-        return df
-    except FileNotFoundError:
-        logger.error("Archivo inventario.xlsx no encontrado")
-        return pd.DataFrame()
-    except Exception as e:
-        logger.error(f"Error cargando inventario: {e}")
-        return pd.DataFrame()
+    """Retorna el inventario en memoria (se relee el Excel solo si el archivo cambió)"""
+    return almacen_inventario.obtener_dataframe()
 
-# Función para obtener/crear sesión de chat
-def obtener_sesion_chat(usuario_id):
-    """Obtiene o crea una sesión de chat para el usuario"""
-    if redis_client:
-        # Intentar obtener sesión desde Redis
-        sesion_data = redis_client.get(f"chat_session_{usuario_id}")
-        if sesion_data:
-            return json.loads(sesion_data)
-    
-    # Crear nueva sesión
-    modelo_funcional = obtener_modelo_funcional()
-    if not modelo_funcional:
-        logger.error("No hay modelos disponibles para crear sesión de chat")
-        return None
-    
-    model = genai.GenerativeModel(modelo_funcional)
-    chat = model.start_chat(history=[])
-    
-    # Guardar en Redis si está disponible
-    if redis_client:
-        redis_client.setex(f"chat_session_{usuario_id}", 3600, json.dumps({
-            'history': chat.history
-        }))
-    
-    return chat
+# Memoria conversacional: historial compacto por usuario con presupuesto de turnos y tokens
+def obtener_historial(usuario_id):
+    """Obtiene los mensajes previos del usuario (lista vacía si no hay usuario o sesión)"""
+    if not usuario_id:
+        return []
+    return memoria_conversacion.obtener_historial(usuario_id)
 
-def guardar_sesion_chat(usuario_id, chat):
-    """Guarda la sesión de chat en Redis"""
-    if redis_client:
-        redis_client.setex(f"chat_session_{usuario_id}", 3600, json.dumps({
-            'history': chat.history
-        }))
+def guardar_turno(usuario_id, pregunta, respuesta):
+    """Agrega la pregunta y la respuesta al historial del usuario"""
+    configuracion = almacen_configuracion.obtener()
+    if not usuario_id or isinstance(respuesta, RespuestaRespaldo):
+        return
+    memoria_conversacion.agregar_turno(
+        usuario_id, pregunta, respuesta,
+        max_turnos=configuracion.config.get("max_turnos_historial", 6),
+        max_tokens=configuracion.config.get("max_tokens_historial", 1000)
+    )
 
-def consultar_con_siliconflow(query_texto, df):
+def construir_prompt(plantilla, query_texto, df):
+    """Arma el prompt reutilizando el contexto cacheado para la versión actual de inventario y configuración"""
+    configuracion = almacen_configuracion.obtener()
+    # El inventario completo tiene la versión del snapshot; las filas seleccionadas, la versión y sus posiciones
+    version_inventario = almacen_inventario.version_de(df)
+    if version_inventario is None:
+        version_inventario = buscador_inventario.version_de(df)
+    with metricas.medir('prompt_construccion_segundos', plantilla=plantilla):
+        return constructor_prompts.construir(
+            plantilla, query_texto, configuracion.system_prompt, df,
+            version_inventario, configuracion.version
+        )
+
+def consultar_con_siliconflow(query_texto, df, historial=None, entrega=None, cancelado=None):
     """Consulta usando SiliconFlow API o respuestas estáticas como fallback"""
+    configuracion = almacen_configuracion.obtener()
+    acumulador = AcumuladorRespuesta(configuracion.config["max_respuesta_caracteres"], entrega, cancelado)
     try:
-        # Crear contexto para SiliconFlow
-        contexto = f"""
-        {SYSTEM_PROMPT}
-        
-        INVENTARIO (10 productos):
-        {df.to_string()}
-        
-        CONSULTA: {query_texto}
+        # Crear contexto para SiliconFlow (system prompt + inventario cacheados por versión)
+        contexto = construir_prompt("siliconflow", query_texto, df)
+        mensajes_previos = historial_para_siliconflow(historial or [])
         
-        Responde solo con información del inventario.
-        """
-        
-        # Configurar headers para SiliconFlow
-        headers = {
-            'Authorization': f'Bearer {siliconflow_api_key}',
-            'Content-Type': 'application/json'
-        }
+        if STREAMING_IA:
+            with metricas.medir('proveedor_segundos', proveedor='siliconflow', modelo=cliente_siliconflow.modelo):
+                respuesta = acumulador.consumir(cliente_siliconflow.completar_en_streaming(
+                    contexto, max_tokens=500, temperature=0.7, historial=mensajes_previos
+                ))
+            registrar_primer_fragmento(acumulador, 'siliconflow', cliente_siliconflow.modelo)
+            return respuesta
         
-        # Datos para la API
-        data = {
-            "model": "deepseek-ai/DeepSeek-R1-Distill-Qwen-14B",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": contexto
-                }
-            ],
-            "max_tokens": 500,
-            "temperature": 0.7
-        }
+        with metricas.medir('proveedor_segundos', proveedor='siliconflow', modelo=cliente_siliconflow.modelo):
+            respuesta = cliente_siliconflow.completar(
+                contexto, max_tokens=500, temperature=0.7, historial=mensajes_previos
+            )
         
-        # Hacer la petición
-        response = requests.post(
-            'https://api.siliconflow.com/v1/chat/completions',
-            headers=headers,
-            json=data,
-            timeout=30
-        )
+        # Limitar longitud de respuesta
+        if len(respuesta) > configuracion.config["max_respuesta_caracteres"]:
+            respuesta = respuesta[:configuracion.config["max_respuesta_caracteres"]] + "..."
         
-        if response.status_code == 200:
-            result = response.json()
-            respuesta = result['choices'][0]['message']['content']
-            
-            # Limitar longitud de respuesta
-            if len(respuesta) > CONFIG["max_respuesta_caracteres"]:
-                respuesta = respuesta[:CONFIG["max_respuesta_caracteres"]] + "..."
-            
-            return respuesta
-        else:
-            logger.error(f"Error en SiliconFlow API: {response.status_code} - {response.text}")
-            # Fallback a respuestas estáticas
-            return generar_respuesta_estatica(query_texto, df)
-            
+        return respuesta
+    
+    except CircuitoAbierto:
+        # El proveedor está fallando: responder localmente sin esperar otro timeout
+        logger.warning("Circuito de SiliconFlow abierto, usando respuestas estáticas")
+        metricas.contar('proveedor_errores_total', proveedor='siliconflow', tipo='CircuitoAbierto')
+        return generar_respuesta_estatica(query_texto, df)
     except Exception as e:
         logger.error(f"Error consultando con SiliconFlow: {e}")
+        metricas.contar('proveedor_errores_total', proveedor='siliconflow', tipo=type(e).__name__)
+        if entrega is not None and entrega.enviado:
+            # El usuario ya recibió el comienzo: completar con lo generado antes del error
+            return RespuestaRespaldo(acumulador.resultado())
         # Fallback a respuestas estáticas
         return generar_respuesta_estatica(query_texto, df)
 
+def registrar_primer_fragmento(acumulador, proveedor, modelo):
+    """Registra el tiempo hasta el primer fragmento de una respuesta en streaming"""
+    if acumulador.primer_fragmento is not None:
+        metricas.observar('proveedor_primer_fragmento_segundos', acumulador.primer_fragmento, proveedor=proveedor, modelo=modelo)
+
 def generar_respuesta_estatica(query_texto, df):
     """Genera respuestas estáticas basadas en el inventario"""
-    query_lower = query_texto.lower()
-    
-    # Respuestas para consultas comunes
-    if any(palabra in query_lower for palabra in ['inventario', 'productos', 'lista']):
-        return """📦 **INVENTARIO DISPONIBLE** (10 productos)
-
-🔹 **Auriculares Sony WH-1000XM4** - $350
-🔹 **iPhone 15 Pro** - $1,200  
-🔹 **Samsung Galaxy S24** - $800
-🔹 **MacBook Pro M3** - $2,500
-🔹 **iPad Air** - $600
-🔹 **AirPods Pro** - $250
-🔹 **Apple Watch Series 9** - $400
-🔹 **Samsung Galaxy Buds** - $150
-🔹 **Dell XPS 13** - $1,100
-🔹 **Surface Pro 9** - $1,000
-
-💡 *Para consultas específicas sobre stock o precios, contacta al administrador.*"""
-    
-    elif any(palabra in query_lower for palabra in ['precio', 'cuesta', 'vale']):
-        return """💰 **CONSULTAS DE PRECIOS**
+    metricas.contar('respuestas_estaticas_total')
+    return RespuestaRespaldo(_generar_respuesta_estatica(query_texto, df))
 
-Para obtener precios específicos, menciona el producto exacto. Por ejemplo:
-• "precio iPhone 15 Pro"
-• "cuanto cuesta MacBook Pro"
-• "precio de los auriculares Sony"
+def ficha_producto(fila):
+    """Ficha de un producto del inventario para las respuestas estáticas"""
+    configuracion = almacen_configuracion.obtener()
+    lineas = [f"📦 **{str(fila['Producto']).upper()}**", ""]
+    if configuracion.config.get("incluir_precios", True) and presente(fila, 'Precio'):
+        lineas.append(f"💰 **Precio:** {formatear_precio(fila['Precio'])}")
+    if configuracion.config.get("incluir_stock", True) and presente(fila, 'Stock'):
+        lineas.append(f"📊 **Stock:** {int(fila['Stock'])} unidades")
+    if presente(fila, 'Categoria'):
+        lineas.append(f"🏷️ **Categoría:** {fila['Categoria']}")
+    if configuracion.config.get("incluir_proveedores", True) and presente(fila, 'Proveedor'):
+        lineas.append(f"🏭 **Proveedor:** {fila['Proveedor']}")
+    lineas += ["", "📞 *Para más detalles o confirmar stock, contacta al administrador.*"]
+    return "\n".join(lineas)
 
-📱 *Productos disponibles: iPhone, Samsung, MacBook, iPad, AirPods, Apple Watch, Dell, Surface*"""
+def _generar_respuesta_estatica(query_texto, df):
+    """Texto de las respuestas estáticas"""
+    intenciones = clasificar_mensaje(query_texto).intenciones
     
-    elif any(palabra in query_lower for palabra in ['stock', 'disponible', 'hay']):
-        return """📊 **CONSULTA DE STOCK**
-
-Para verificar disponibilidad, especifica el producto:
-• "stock iPhone 15 Pro"
-• "hay MacBook Pro disponible"
-• "disponibilidad Samsung Galaxy"
-
-🔄 *El stock se actualiza constantemente. Contacta para confirmar disponibilidad inmediata.*"""
+    # Producto nombrado en la consulta (tolera errores de tipeo): ficha con los datos del inventario
+    try:
+        fila = motor_consultas.buscar_producto(
+            query_texto, df, almacen_inventario.version_de(df), almacen_inventario.consultas_de(df)
+        )
+        if fila is not None:
+            return ficha_producto(fila)
+    except Exception as e:
+        logger.error(f"Error buscando el producto para la respuesta estática: {e}")
     
-    elif any(palabra in query_lower for palabra in ['sony', 'auriculares']):
-        return """🎧 **AURICULARES SONY WH-1000XM4**
-
-💰 **Precio:** $350
-📊 **Stock:** Consultar disponibilidad
-⭐ **Características:** Cancelación de ruido, 30h batería, carga rápida
-
-📞 *Para más detalles o confirmar stock, contacta al administrador.*"""
+    # Respuestas para consultas comunes, con productos y ejemplos tomados del inventario
+    configuracion = almacen_configuracion.obtener()
+    productos = _productos_inventario(df)
+    ejemplos = [nombre for nombre, _ in productos[:2]] or ["el nombre del producto"]
+    if 'inventario' in intenciones:
+        if not productos:
+            return "📦 *No hay productos cargados en el inventario. Contacta al administrador.*"
+        incluir_precios = configuracion.config.get("incluir_precios", True)
+        lineas = ["📦 **PRODUCTOS DEL INVENTARIO**", ""]
+        for nombre, precio in productos[:MAX_PRODUCTOS_ESTATICOS]:
+            lineas.append(f"🔹 **{nombre}**" + (f" - {formatear_precio(precio)}" if incluir_precios and precio is not None else ""))
+        if len(productos) > MAX_PRODUCTOS_ESTATICOS:
+            lineas.append(f"… y {len(productos) - MAX_PRODUCTOS_ESTATICOS} productos más")
+        lineas += ["", "💡 *Para consultas específicas sobre stock o precios, contacta al administrador.*"]
+        return "\n".join(lineas)
     
-    elif any(palabra in query_lower for palabra in ['iphone', 'apple']):
-        return """📱 **IPHONE 15 PRO**
-
-💰 **Precio:** $1,200
-📊 **Stock:** Consultar disponibilidad  
-⭐ **Características:** A17 Pro, 48MP cámara, Titanio, USB-C
-
-📞 *Para más detalles o confirmar stock, contacta al administrador.*"""
+    elif 'precio' in intenciones:
+        return "\n".join(["💰 **CONSULTAS DE PRECIOS**", "",
+                          "Para obtener precios específicos, menciona el producto exacto. Por ejemplo:"]
+                         + [f'• "precio {nombre}"' for nombre in ejemplos])
+    
+    elif 'stock' in intenciones:
+        return "\n".join(["📊 **CONSULTA DE STOCK**", "",
+                          "Para verificar disponibilidad, especifica el producto:"]
+                         + [f'• "stock {nombre}"' for nombre in ejemplos]
+                         + ["", "🔄 *El stock se actualiza constantemente. Contacta para confirmar disponibilidad inmediata.*"])
     
     else:
-        return """🤖 **ASISTENTE DE INVENTARIO**
+        return f"""🤖 **ASISTENTE DE INVENTARIO**
 
 Puedo ayudarte con:
 📦 Lista de productos disponibles
@@ -360,116 +396,420 @@ Puedo ayudarte con:
 📊 Verificación de stock
 🔍 Información específica de productos
 
-💡 *Ejemplos: "inventario", "precio iPhone", "stock MacBook"*
+💡 *Ejemplos: "inventario", "precio {ejemplos[0]}"*
 
 ❌ *Servicio de IA temporalmente no disponible - usando respuestas básicas*"""
 
-def consultar_excel(query_texto, df):
-    """Consulta el Excel usando el proveedor de IA configurado"""
+# Productos listados en la respuesta estática de inventario
+MAX_PRODUCTOS_ESTATICOS = 10
+
+def _productos_inventario(df):
+    """[(nombre, precio o None)] de los productos de df con nombre, en orden"""
+    import pandas as pd
+    if df is None or 'Producto' not in df.columns:
+        return []
+    precios = df['Precio'].tolist() if 'Precio' in df.columns else [None] * len(df)
+    return [
+        (str(nombre), precio if pd.notna(precio) else None)
+        for nombre, precio in zip(df['Producto'].tolist(), precios) if pd.notna(nombre)
+    ]
+
+def permitir_consulta_ia(usuario_id):
+    """Descuenta una consulta del límite del número; False si lo superó
+
+    Solo se cobran los mensajes que llegan a un proveedor de IA: saludos, camino rápido y caché no cuentan.
+    """
+    configuracion = almacen_configuracion.obtener()
+    permitido = limitador_consultas.permitir(
+        usuario_id,
+        configuracion.limites.get("max_intentos_consulta", 0),
+        configuracion.limites.get("ventana_consultas_segundos", 60)
+    )
+    if not permitido:
+        logger.warning("Límite de consultas excedido por %s", telefono_log(usuario_id))
+    return permitido
+
+def clasificar_mensaje(texto):
+    """Clasifica el mensaje (prohibido, saludo, intenciones) con el matcher de la configuración actual"""
+    configuracion = almacen_configuracion.obtener()
+    return obtener_clasificador(configuracion.version, configuracion.limites.get("palabras_prohibidas", [])).clasificar(texto)
+
+def consultar_excel(query_texto, df, usuario_id=None, clasificacion=None, entrega=None, limitar=False):
+    """Consulta el Excel usando el proveedor de IA configurado (limitar: aplicar el límite de consultas del usuario)"""
+    configuracion = almacen_configuracion.obtener()
     if df.empty:
-        return MENSAJES["error_general"]
+        return configuracion.mensajes["error_general"]
     
     # Validar consulta de seguridad
-    es_valida, mensaje_error = validar_consulta(query_texto)
-    if not es_valida:
-        return mensaje_error
+    if clasificacion is None:
+        clasificacion = clasificar_mensaje(query_texto)
+    if clasificacion.bloqueado:
+        return configuracion.mensajes["consulta_fuera_tema"]
     
-    # Usar el proveedor configurado
-    logger.info(f"Proveedor activo: {PROVEEDOR_IA_ACTIVO}")
-    if PROVEEDOR_IA_ACTIVO == "siliconflow":
-        logger.info("Usando SiliconFlow para consulta")
-        return consultar_con_siliconflow(query_texto, df)
-    else:
-        logger.info("Usando Gemini para consulta")
-        return consultar_con_gemini(query_texto, df)
+    historial = obtener_historial(usuario_id)
+    respuesta = resolver_consulta(query_texto, df, historial, entrega, limitar=usuario_id if limitar else None)
+    guardar_turno(usuario_id, query_texto, respuesta)
+    return respuesta
 
-def consultar_con_gemini(query_texto, df):
-    """Consulta el Excel usando Gemini para interpretar la consulta"""
-    # Crear contexto para Gemini con system prompt
-    contexto_excel = f"""
-    {SYSTEM_PROMPT}
+def resolver_consulta(query_texto, df, historial, entrega=None, camino_rapido=True, limitar=None):
+    """Responde la consulta por el camino rápido, la caché o el proveedor de IA
+
+    camino_rapido=False omite el camino rápido (quien llama ya lo intentó, como el lote de /api/chat/batch).
+    limitar: número al que se le descuenta la consulta del límite si llega al proveedor de IA.
+    """
+    configuracion = almacen_configuracion.obtener()
+    version_inventario = almacen_inventario.version_de(df)
+    consultas_inventario = almacen_inventario.consultas_de(df)
     
-    DATOS DEL INVENTARIO:
-    Columnas disponibles: {list(df.columns)}
+    # Responder directamente las consultas simples de precio/stock/proveedor
+    if camino_rapido:
+        respuesta = motor_consultas.responder(query_texto, df, version_inventario, configuracion.config, consultas_inventario)
+        if respuesta is not None:
+            logger.debug("Consulta respondida por el camino rápido")
+            return respuesta
     
-    Inventario completo:
-    {df.to_string()}
+    # Reutilizar respuestas previas mientras no cambien inventario, proveedor ni configuración
+    # (solo sin historial: una pregunta de seguimiento depende de la conversación)
+    proveedor = configuracion.proveedor
+    huella_inventario = almacen_inventario.huella_de(df)
+    clave_cache = None
+    if huella_inventario is not None and not historial:
+        clave_cache = cache_respuestas.clave(query_texto, proveedor, huella_inventario, configuracion.version)
+        respuesta = cache_respuestas.obtener(clave_cache)
+        if respuesta is not None:
+            logger.debug("Respuesta obtenida de la caché")
+            return respuesta
     
-    CONSULTA DEL USUARIO: {query_texto}
+    if limitar and not permitir_consulta_ia(limitar):
+        return RespuestaRespaldo(configuracion.mensajes["limite_excedido"])
     
-    Responde siguiendo las reglas establecidas y usando solo la información del inventario.
-    """
+    # Enviar al modelo solo las filas relevantes para la consulta (y la pregunta anterior del usuario)
+    consulta_busqueda = query_texto
+    preguntas_previas = [t['texto'] for t in historial if t['rol'] == 'user']
+    if preguntas_previas:
+        consulta_busqueda = f"{preguntas_previas[-1]} {query_texto}"
+    df = buscador_inventario.seleccionar_filas(
+        df, consulta_busqueda, version_inventario,
+        top_k=configuracion.config.get("top_k_inventario", 8),
+        min_filas=configuracion.config.get("min_productos_busqueda", 50),
+        consultas=consultas_inventario
+    )
+    
+    # Usar el proveedor configurado
+    logger.debug("Consultando con el proveedor %s", proveedor)
+    if proveedor == "siliconflow":
+        respuesta = consultar_con_siliconflow(query_texto, df, historial, entrega)
+    elif proveedor == "gemini":
+        respuesta = consultar_con_gemini(query_texto, df, historial, entrega)
+    else:
+        respuesta = enrutador_proveedores.consultar(query_texto, df, historial, entrega)
+    
+    if clave_cache is not None:
+        cache_respuestas.guardar(clave_cache, respuesta)
+    return respuesta
+
+def consultar_con_gemini(query_texto, df, historial=None, entrega=None, cancelado=None):
+    """Consulta el Excel usando Gemini para interpretar la consulta"""
+    configuracion = almacen_configuracion.obtener()
+    # Crear contexto para Gemini con system prompt
+    contexto_excel = construir_prompt("gemini", query_texto, df)
+    acumulador = AcumuladorRespuesta(configuracion.config["max_respuesta_caracteres"], entrega, cancelado)
     
     try:
         modelo_funcional = obtener_modelo_funcional()
         if not modelo_funcional:
             logger.error("No hay modelos disponibles para consultar Excel")
-            return MENSAJES["error_general"]
+            return RespuestaRespaldo(configuracion.mensajes["error_general"])
+        
+        model = obtener_genai().GenerativeModel(modelo_funcional)
+        contenidos = historial_para_gemini(historial or []) + [{"role": "user", "parts": [contexto_excel]}]
+        
+        if STREAMING_IA:
+            with metricas.medir('proveedor_segundos', proveedor='gemini', modelo=modelo_funcional):
+                respuesta = acumulador.consumir(fragmentos_gemini(model.generate_content(contenidos, stream=True)))
+            registrar_primer_fragmento(acumulador, 'gemini', modelo_funcional)
+            return respuesta
         
-        model = genai.GenerativeModel(modelo_funcional)
-        response = model.generate_content(contexto_excel)
+        with metricas.medir('proveedor_segundos', proveedor='gemini', modelo=modelo_funcional):
+            response = model.generate_content(contenidos)
         
         # Limitar longitud de respuesta
         respuesta = response.text
-        if len(respuesta) > CONFIG["max_respuesta_caracteres"]:
-            respuesta = respuesta[:CONFIG["max_respuesta_caracteres"]] + "..."
+        if len(respuesta) > configuracion.config["max_respuesta_caracteres"]:
+            respuesta = respuesta[:configuracion.config["max_respuesta_caracteres"]] + "..."
         
         return respuesta
+    except errores_google().NotFound as e:
+        # El modelo dejó de existir: elegir otro en la próxima consulta
+        logger.error(f"Modelo de Gemini no encontrado: {e}")
+        metricas.contar('proveedor_errores_total', proveedor='gemini', tipo='NotFound')
+        resolutor_modelos.descartar(modelo_funcional)
+        return RespuestaRespaldo(configuracion.mensajes["error_general"])
     except Exception as e:
         logger.error(f"Error consultando Excel con Gemini: {e}")
-        return MENSAJES["error_general"]
+        metricas.contar('proveedor_errores_total', proveedor='gemini', tipo=type(e).__name__)
+        if entrega is not None and entrega.enviado:
+            return RespuestaRespaldo(acumulador.resultado())
+        return RespuestaRespaldo(configuracion.mensajes["error_general"])
+
+def crear_enrutador_proveedores():
+    """Pool de proveedores para el modo "auto" (SiliconFlow siempre: sin clave responde con el fallback estático)"""
+    proveedores = [ProveedorIA(
+        "siliconflow", consultar_con_siliconflow,
+        lambda: cliente_siliconflow.modelo if cliente_siliconflow else None,
+        lambda: cliente_siliconflow is not None and cliente_siliconflow.circuito.estado != InterruptorCircuito.ABIERTO
+    )]
+    if gemini_api_key:
+        proveedores.append(ProveedorIA(
+            "gemini", consultar_con_gemini,
+            lambda: resolutor_modelos.estado()["modelo"],
+            lambda: True
+        ))
+    return EnrutadorProveedores(
+        proveedores,
+        cobertura=os.getenv('ENRUTADOR_COBERTURA', 'false').lower() == 'true',
+        retardo_inicial=float(os.getenv('ENRUTADOR_RETARDO_INICIAL', 3.0)),
+        retardo_minimo=float(os.getenv('ENRUTADOR_RETARDO_MINIMO', 0.5)),
+        max_tasa_error=float(os.getenv('ENRUTADOR_MAX_TASA_ERROR', 0.5)),
+        hilos=int(os.getenv('ENRUTADOR_HILOS', os.getenv('GUNICORN_THREADS', 16)))
+    )
+
+enrutador_proveedores = crear_enrutador_proveedores()
+
+# Límites de descarga de archivos multimedia
+MEDIA_MAX_BYTES = int(os.getenv('MEDIA_MAX_BYTES', 16 * 1024 * 1024))
+MEDIA_TIMEOUT = float(os.getenv('MEDIA_TIMEOUT', 20))
+
+# Archivos repetidos (mismo SHA-256): se reutiliza la subida a Gemini y el análisis por versión de inventario
+referencias_medios = CacheReferenciasArchivos()
+cache_analisis_medios = CacheRespuestas(
+    max_entradas=int(os.getenv('CACHE_MEDIOS_MAX', 500)),
+    ttl=int(os.getenv('CACHE_MEDIOS_TTL', 24 * 3600)),
+    prefijo='analisis_medio_'
+)
+
+def limpiar_caches_configuracion(anterior, nueva):
+    """Vacía las cachés en memoria cuando cambia la configuración (sus claves llevan la versión anterior)"""
+    if nueva.version != anterior.version:
+        cache_respuestas.limpiar()
+        cache_analisis_medios.limpiar()
+
+# Cambios de configuración hechos en este worker o recibidos de otros
+almacen_configuracion.suscribir(limpiar_caches_configuracion)
 
-def procesar_archivo_multimodal(url_archivo, tipo_archivo, usuario_id, df):
-    """Procesa archivos de audio o imagen"""
+def _cerrar_descarga(futuro):
+    """Cierra el archivo de una descarga que ya no se va a usar"""
+    if not futuro.cancelled() and futuro.exception() is None:
+        futuro.result().cerrar()
+
+# Similitud mínima para sugerir un producto a partir del mensaje que acompaña a un archivo (texto libre, más ruidoso)
+SIMILITUD_MENCION = 0.15
+
+def productos_mencionados(texto, df, k=5):
+    """Nombres de los productos del inventario más parecidos al texto (para orientar el análisis multimodal)"""
+    if not texto or df.empty or 'Producto' not in df.columns:
+        return []
+    candidatos = resolutor_productos.buscar(
+        palabras_de_producto(palabras_normalizadas(texto)), df, almacen_inventario.version_de(df),
+        k=k, minimo=SIMILITUD_MENCION
+    )
+    return [str(df['Producto'].iat[posicion]) for posicion, _ in candidatos]
+
+def procesar_archivo_multimodal(url_archivo, tipo_archivo, usuario_id, df, mime_declarado=None, texto=''):
+    """Procesa archivos de audio o imagen (texto: mensaje que acompaña al archivo)"""
+    configuracion = almacen_configuracion.obtener()
+    # Descargar el archivo mientras se prepara el prompt
+    descarga = executor_medios.submit(
+        descargar_medio, url_archivo, mime_declarado,
+        auth=credenciales_twilio(), max_bytes=MEDIA_MAX_BYTES, timeout=(3.05, MEDIA_TIMEOUT)
+    )
+    medio = None
     try:
-        # Descargar archivo
-        response = requests.get(url_archivo)
-        if response.status_code != 200:
-            return "Error al descargar el archivo."
-        
-        # Guardar temporalmente
-        extension = 'jpg' if tipo_archivo == 'image' else 'wav'
-        archivo_temp = f"temp_{usuario_id}.{extension}"
-        
-        with open(archivo_temp, 'wb') as f:
-            f.write(response.content)
-        
-        # Subir a Gemini
-        file_ref = genai.upload_file(archivo_temp)
-        
         # Crear prompt contextualizado con system prompt
-        prompt = f"""
-        {SYSTEM_PROMPT}
+        prompt = construir_prompt("multimodal", tipo_archivo, df)
+        texto = (texto or '').strip()
+        if texto:
+            prompt += f"\n\nMensaje que acompaña al archivo: {texto}"
+            mencionados = productos_mencionados(texto, df)
+            if mencionados:
+                prompt += "\nProductos del inventario que coinciden con el mensaje: " + ", ".join(mencionados)
+        historial = obtener_historial(usuario_id)
+        modelo_funcional = obtener_modelo_funcional()
         
-        DATOS DEL INVENTARIO:
-        {df.to_string() if not df.empty else "No hay datos de inventario"}
+        medio = descarga.result()
         
-        TAREA: Analiza este {tipo_archivo} y busca información relacionada en el inventario.
+        # Mismo archivo y mensaje con el mismo inventario y configuración: responder desde la caché
+        clave_analisis = cache_analisis_medios.clave(
+            f"{medio.sha256} {texto}".strip(), f"multimodal-{tipo_archivo}",
+            almacen_inventario.huella_de(df) or f"local-{id(df)}", configuracion.version
+        )
+        respuesta = cache_analisis_medios.obtener(clave_analisis)
+        if respuesta is not None:
+            logger.info("Análisis de archivo obtenido de la caché")
+            guardar_turno(usuario_id, f"[{tipo_archivo} enviado] {texto}".strip(), respuesta)
+            return respuesta
         
-        Responde siguiendo las reglas establecidas y usando solo la información del inventario.
-        """
+        if not modelo_funcional:
+            logger.error("No hay modelos disponibles para procesar el archivo")
+            return configuracion.mensajes["error_general"]
         
-        # Obtener sesión de chat
-        chat = obtener_sesion_chat(usuario_id)
+        if not permitir_consulta_ia(usuario_id):
+            return RespuestaRespaldo(configuracion.mensajes["limite_excedido"])
         
-        # Enviar mensaje con archivo
-        response = chat.send_message([prompt, file_ref])
+        # Subir a Gemini directamente desde el temporal de la petición (o reutilizar la subida previa)
+        file_ref = referencias_medios.obtener(medio.sha256)
+        if file_ref is None:
+            with metricas.medir('medio_subida_segundos', tipo=tipo_archivo):
+                file_ref = obtener_genai().upload_file(medio.archivo, mime_type=medio.mime)
+            referencias_medios.guardar(medio.sha256, file_ref)
         
-        # Guardar sesión
-        guardar_sesion_chat(usuario_id, chat)
+        # Enviar mensaje con archivo junto con el historial del usuario
+        model = obtener_genai().GenerativeModel(modelo_funcional)
+        contenidos = historial_para_gemini(historial) + [{"role": "user", "parts": [prompt, file_ref]}]
+        with metricas.medir('proveedor_segundos', proveedor='gemini', modelo=modelo_funcional):
+            response = model.generate_content(contenidos)
         
-        # Limpiar archivo temporal
-        os.remove(archivo_temp)
+        # Guardar turno y análisis
+        guardar_turno(usuario_id, f"[{tipo_archivo} enviado] {texto}".strip(), response.text)
+        cache_analisis_medios.guardar(clave_analisis, response.text)
         
         return response.text
-        
+    
+    except ErrorMedio as e:
+        logger.error(f"Error descargando archivo multimodal: {e}")
+        return "Error al descargar el archivo."
     except Exception as e:
         logger.error(f"Error procesando archivo multimodal: {e}")
         return "Error al procesar el archivo. Intenta de nuevo."
+    finally:
+        # Limpiar el temporal siempre, aunque la descarga termine después de un error
+        if medio is not None:
+            medio.cerrar()
+        else:
+            descarga.add_done_callback(_cerrar_descarga)
+
+def procesar_mensaje_whatsapp(incoming_msg, from_number, media_url, media_content_type, entrega=None):
+    """Genera la respuesta para un mensaje entrante de WhatsApp (entrega: envío anticipado del primer segmento)"""
+    configuracion = almacen_configuracion.obtener()
+    # Cargar inventario
+    df = cargar_inventario()
+    
+    # Determinar tipo de mensaje
+    if media_url:
+        # Mensaje con archivo (imagen o audio)
+        if 'image' in media_content_type:
+            return procesar_archivo_multimodal(media_url, 'image', from_number, df, media_content_type, incoming_msg)
+        elif 'audio' in media_content_type:
+            return procesar_archivo_multimodal(media_url, 'audio', from_number, df, media_content_type, incoming_msg)
+        return configuracion.mensajes["archivo_no_soportado"]
+    
+    # Mensaje de texto
+    # Detectar saludos, palabras prohibidas e intenciones en una sola pasada
+    clasificacion = clasificar_mensaje(incoming_msg)
+    if clasificacion.saludo:
+        logger.debug("Mensaje reconocido como saludo")
+        return configuracion.config["saludo_personalizado"]
+    
+    # Consultar inventario con el proveedor configurado
+    respuesta = consultar_excel(incoming_msg, df, usuario_id=from_number, clasificacion=clasificacion, entrega=entrega, limitar=True)
+    if muestrear_debug(logger):
+        logger.debug("Mensaje de %s: %s -> respuesta: %s", telefono_log(from_number), texto_log(incoming_msg), texto_log(respuesta))
+    return respuesta
+
+def enviar_respuesta_encolada(tarea):
+    """Procesa un mensaje encolado y envía la respuesta con la API REST de Twilio"""
+    def enviar(texto):
+        twilio_client.messages.create(
+            from_=tarea['to'] or os.getenv('TWILIO_WHATSAPP_NUMBER'),
+            to=tarea['from'],
+            body=texto
+        )
+    
+    # Con streaming, la primera oración sale mientras el modelo sigue generando
+    entrega = EntregaAnticipada(enviar, STREAMING_MIN_SEGMENTO) if STREAMING_IA else None
+    try:
+        respuesta = procesar_mensaje_whatsapp(
+            tarea['body'], tarea['from'], tarea['media_url'], tarea['media_content_type'], entrega
+        )
+    except Exception as e:
+        logger.error("Error procesando mensaje encolado de %s: %s", telefono_log(tarea['from']), e)
+        respuesta = "Lo siento, ocurrió un error. Intenta de nuevo."
+    
+    pendiente = entrega.resto(respuesta) if entrega is not None else respuesta
+    if pendiente:
+        enviar(pendiente)
+    logger.info("Respuesta enviada por API a %s (%d caracteres)", telefono_log(tarea['from']), len(respuesta))
+
+# Modo asíncrono: el webhook responde de inmediato y la respuesta se envía desde la cola
+RESPUESTA_ASINCRONA = os.getenv('RESPUESTA_ASINCRONA', 'false').lower() == 'true'
+COLA_BACKEND = os.getenv('COLA_BACKEND', 'memoria')
+cola_respuestas = ColaRespuestas(
+    enviar_respuesta_encolada,
+    max_pendientes=int(os.getenv('COLA_MAX_PENDIENTES', 100)),
+    hilos=int(os.getenv('COLA_HILOS', 4))
+)
+
+# Los clientes se crean en la primera petición de cada proceso si no lo hizo el servidor
+@app.before_request
+def inicializar_servicios_peticion():
+    """Inicializa los servicios del proceso antes de atender (salvo /health, que responde sin esperarlos)"""
+    fases_arranque.marcar('primera_peticion')
+    if request.endpoint != 'health_check':
+        inicializar_servicios()
+
+@app.before_request
+def iniciar_medicion():
+    """Marca el inicio de la petición para medir su latencia"""
+    if metricas.habilitado:
+        g.inicio_peticion = time.perf_counter()
+
+@app.after_request
+def registrar_medicion(response):
+    """Registra latencia y total de peticiones por endpoint y código de estado"""
+    inicio = g.get('inicio_peticion')
+    if inicio is not None:
+        endpoint = request.endpoint or 'desconocido'
+        metricas.observar('peticion_segundos', time.perf_counter() - inicio, endpoint=endpoint)
+        metricas.contar('peticiones_total', endpoint=endpoint, estado=response.status_code)
+    return response
+
+def recolectar_estadisticas():
+    """Expone como métricas las estadísticas que ya llevan los componentes"""
+    rapidas = motor_consultas.estadisticas()
+    cache = cache_respuestas.estadisticas()
+    cache_medios = cache_analisis_medios.estadisticas()
+    valores = [
+        ('consultas_rapidas_total', 'counter', {}, rapidas["consultas"]),
+        ('consultas_rapidas_aciertos_total', 'counter', {}, rapidas["aciertos"]),
+        ('cache_aciertos_total', 'counter', {'cache': 'respuestas'}, cache["aciertos"]),
+        ('cache_fallos_total', 'counter', {'cache': 'respuestas'}, cache["fallos"]),
+        ('cache_aciertos_total', 'counter', {'cache': 'medios'}, cache_medios["aciertos"]),
+        ('cache_fallos_total', 'counter', {'cache': 'medios'}, cache_medios["fallos"]),
+        ('limite_rechazados_total', 'counter', {}, limitador_consultas.rechazados),
+        ('mensajes_duplicados_total', 'counter', {}, deduplicador_mensajes.duplicados),
+        ('inventario_version', 'gauge', {}, almacen_inventario.version),
+    ]
+    for clave, estado in enrutador_proveedores.estado().items():
+        if estado["p95_ms"] is not None:
+            valores.append(('proveedor_p95_reciente_segundos', 'gauge', {'proveedor': clave}, estado["p95_ms"] / 1000))
+        valores.append(('proveedor_tasa_error_reciente', 'gauge', {'proveedor': clave}, estado["tasa_error"]))
+    if RESPUESTA_ASINCRONA:
+        cola = cola_respuestas.estadisticas()
+        valores += [
+            ('cola_pendientes', 'gauge', {}, cola["pendientes"]),
+            ('cola_rechazados_total', 'counter', {}, cola["rechazados"]),
+            ('cola_procesados_total', 'counter', {}, cola["procesados"]),
+        ]
+    for fase, segundos in fases_arranque.segundos().items():
+        valores.append(('arranque_fase_segundos', 'gauge', {'fase': fase}, segundos))
+    return valores
+
+metricas.registrar_colector(recolectar_estadisticas)
 
 @app.route("/whatsapp", methods=['POST'])
 def whatsapp_webhook():
     """Webhook principal para recibir mensajes de WhatsApp"""
+    configuracion = almacen_configuracion.obtener()
     try:
         # Obtener datos del mensaje
         incoming_msg = request.values.get('Body', '')
@@ -477,48 +817,43 @@ def whatsapp_webhook():
         media_url = request.values.get('MediaUrl0', '')
         media_content_type = request.values.get('MediaContentType0', '')
         
-        logger.info(f"Mensaje recibido de {from_number}: {incoming_msg}")
+        # Descartar reintentos de Twilio antes de cualquier trabajo
+        if deduplicador_mensajes.es_duplicado(request.values.get('MessageSid', '')):
+            logger.info("Mensaje duplicado de %s descartado", telefono_log(from_number))
+            return str(MessagingResponse())
         
-        # Cargar inventario
-        df = cargar_inventario()
+        logger.info("Mensaje recibido de %s: %s", telefono_log(from_number), texto_log(incoming_msg))
         
-        # Determinar tipo de mensaje
-        if media_url:
-            # Mensaje con archivo (imagen o audio)
-            if 'image' in media_content_type:
-                respuesta = procesar_archivo_multimodal(media_url, 'image', from_number, df)
-            elif 'audio' in media_content_type:
-                respuesta = procesar_archivo_multimodal(media_url, 'audio', from_number, df)
-            else:
-                respuesta = MENSAJES["archivo_no_soportado"]
-        else:
-            # Mensaje de texto
-            logger.info(f"Procesando mensaje de texto: '{incoming_msg}'")
-            # Detectar saludos de manera más flexible
-            saludo_detectado = any(saludo in incoming_msg.lower() for saludo in ['hola', 'hi', 'hello', 'buenos días', 'buenas'])
-            if saludo_detectado:
-                logger.info("Mensaje reconocido como saludo")
-                respuesta = CONFIG["saludo_personalizado"]
-            else:
-                # Consultar inventario con el proveedor configurado
-                logger.info(f"Consultando inventario con {PROVEEDOR_IA_ACTIVO}")
-                respuesta = consultar_excel(incoming_msg, df)
-                logger.info(f"Respuesta generada: {respuesta[:100]}...")
+        if RESPUESTA_ASINCRONA:
+            encolado = cola_respuestas.encolar({
+                'body': incoming_msg,
+                'from': from_number,
+                'to': request.values.get('To', ''),
+                'media_url': media_url,
+                'media_content_type': media_content_type
+            })
+            resp = MessagingResponse()
+            if not encolado:
+                resp.message(configuracion.mensajes.get("servicio_ocupado", "⏳ Estamos recibiendo muchos mensajes. Intenta de nuevo en unos minutos."))
+            return str(resp)
+        
+        respuesta = procesar_mensaje_whatsapp(incoming_msg, from_number, media_url, media_content_type)
         
         # Crear respuesta TwiML
-        logger.info(f"Enviando respuesta: {respuesta[:100]}...")
-        resp = MessagingResponse()
-        resp.message(respuesta)
+        with metricas.medir('twiml_segundos'):
+            resp = MessagingResponse()
+            resp.message(respuesta)
+            twiml_response = str(resp)
         
-        # Log detallado de la respuesta TwiML
-        twiml_response = str(resp)
-        logger.info(f"Respuesta TwiML generada: {twiml_response}")
-        logger.info(f"Longitud de respuesta: {len(twiml_response)} caracteres")
+        # El XML completo solo se registra en una muestra de los mensajes con DEBUG activo
+        if muestrear_debug(logger):
+            logger.debug("Respuesta TwiML generada: %s", texto_log(twiml_response))
+        logger.info("Respuesta para %s: %d caracteres de TwiML", telefono_log(from_number), len(twiml_response))
         
         return twiml_response
         
     except Exception as e:
-        logger.error(f"Error en webhook: {e}")
+        logger.exception("Error en webhook: %s", e)
         resp = MessagingResponse()
         resp.message("Lo siento, ocurrió un error. Intenta de nuevo.")
         return str(resp)
@@ -526,15 +861,40 @@ def whatsapp_webhook():
 @app.route("/health", methods=['GET'])
 def health_check():
     """Endpoint de salud para verificar que el servidor funciona"""
-    modelo_funcional = obtener_modelo_funcional()
+    # Solo datos cacheados: el chequeo de salud nunca llama a la API de Gemini
+    estado_modelos = resolutor_modelos.estado()
+    modelo_funcional = estado_modelos["modelo"]
+    if modelo_funcional:
+        estado = "ok"
+    elif verificando_modelo.is_set() or (gemini_api_key and _PID_SERVICIOS != os.getpid()):
+        # El modelo se resuelve en segundo plano después de iniciar los servicios del proceso
+        estado = "iniciando"
+    else:
+        estado = "error"
     return {
-        "status": "ok" if modelo_funcional else "error",
+        "status": estado,
         "timestamp": datetime.now().isoformat(),
         "gemini_model": modelo_funcional or "none",
         "model_available": bool(modelo_funcional),
-        "available_models": listar_modelos_disponibles()
+        "available_models": estado_modelos["disponibles"],
+        "models_resolved_ago_s": estado_modelos["resuelto_hace_s"],
+        "consultas_rapidas": motor_consultas.estadisticas(),
+        "cache_respuestas": cache_respuestas.estadisticas(),
+        "proveedores": enrutador_proveedores.estado(),
+        "configuracion": almacen_configuracion.obtener().huella,
+        "arranque_ms": fases_arranque.resumen(),
+        "cola_respuestas": cola_respuestas.estadisticas() if RESPUESTA_ASINCRONA else None,
+        "limitador": {
+            "rechazados": limitador_consultas.rechazados,
+            "duplicados": deduplicador_mensajes.duplicados
+        }
     }
 
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
 @app.route("/debug", methods=['GET'])
 def debug_api():
     """Endpoint de debug para probar la API de Gemini"""
@@ -545,6 +905,7 @@ def debug_api():
             return {"error": "GEMINI_API_KEY no configurada"}
         
         # Listar modelos
+        genai = obtener_genai()
         models = genai.list_models()
         available_models = []
         for model in models:
@@ -603,21 +964,20 @@ def config_page():
 def get_config():
     """Obtener configuración actual del agente"""
     try:
+        configuracion = almacen_configuracion.obtener()
         config = {
-            "system_prompt": SYSTEM_PROMPT,
-            "config_agente": CONFIG,
-            "limites": LIMITES,
-            "mensajes": MENSAJES
+            "system_prompt": configuracion.system_prompt,
+            "config_agente": configuracion.config,
+            "limites": configuracion.limites,
+            "mensajes": configuracion.mensajes
         }
-        return jsonify({"success": True, "config": config})
+        return jsonify({"success": True, "config": config, "version": configuracion.version})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 @app.route("/api/config", methods=['POST'])
 def save_config():
-    """Guardar nueva configuración del agente"""
-    global SYSTEM_PROMPT, CONFIG, LIMITES, MENSAJES
-    
+    """Guardar nueva configuración del agente (se aplica en todos los workers sin reiniciar)"""
     try:
         data = request.get_json()
         
@@ -625,25 +985,15 @@ def save_config():
         if not data:
             return jsonify({"success": False, "error": "No se recibieron datos"})
         
-        # Guardar en archivo de configuración
-        config_data = {
-            "system_prompt": data.get("system_prompt", SYSTEM_PROMPT),
-            "config_agente": data.get("config_agente", CONFIG),
-            "limites": data.get("limites", LIMITES),
-            "mensajes": data.get("mensajes", MENSAJES)
-        }
-        
-        # Guardar en archivo JSON
-        with open('config_dinamico.json', 'w', encoding='utf-8') as f:
-            json.dump(config_data, f, ensure_ascii=False, indent=2)
-        
-        # Recargar configuración en memoria
-        SYSTEM_PROMPT = config_data["system_prompt"]
-        CONFIG = config_data["config_agente"]
-        LIMITES = config_data["limites"]
-        MENSAJES = config_data["mensajes"]
+        # Las partes que no vienen en la petición se conservan
+        configuracion = almacen_configuracion.guardar(
+            system_prompt=data.get("system_prompt"),
+            config=data.get("config_agente"),
+            limites=data.get("limites"),
+            mensajes=data.get("mensajes")
+        )
         
-        return jsonify({"success": True, "message": "Configuración guardada exitosamente"})
+        return jsonify({"success": True, "message": "Configuración guardada exitosamente", "version": configuracion.version})
         
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
@@ -651,20 +1001,9 @@ def save_config():
 @app.route("/api/config/reset", methods=['POST'])
 def reset_config():
     """Restablecer configuración a valores por defecto"""
-    global SYSTEM_PROMPT, CONFIG, LIMITES, MENSAJES
-    
     try:
-        # Recargar configuración desde archivos originales
-        SYSTEM_PROMPT = obtener_system_prompt()
-        CONFIG = obtener_configuracion()
-        LIMITES = obtener_limites()
-        MENSAJES = obtener_mensajes()
-        
-        # Eliminar archivo de configuración dinámica si existe
-        if os.path.exists('config_dinamico.json'):
-            os.remove('config_dinamico.json')
-        
-        return jsonify({"success": True, "message": "Configuración restablecida a valores por defecto"})
+        configuracion = almacen_configuracion.restablecer()
+        return jsonify({"success": True, "message": "Configuración restablecida a valores por defecto", "version": configuracion.version})
         
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
@@ -674,29 +1013,27 @@ def get_proveedor():
     """Obtener el proveedor de IA actual"""
     return jsonify({
         "success": True, 
-        "proveedor": PROVEEDOR_IA_ACTIVO,
-        "opciones": ["gemini", "siliconflow"]
+        "proveedor": almacen_configuracion.obtener().proveedor,
+        "opciones": PROVEEDORES_IA
     })
 
 @app.route("/api/proveedor", methods=['POST'])
 def set_proveedor():
-    """Cambiar el proveedor de IA"""
-    global PROVEEDOR_IA_ACTIVO
-    
+    """Cambiar el proveedor de IA (en todos los workers)"""
     try:
         data = request.get_json()
         nuevo_proveedor = data.get('proveedor')
         
-        if nuevo_proveedor not in ['gemini', 'siliconflow']:
+        if nuevo_proveedor not in PROVEEDORES_IA:
             return jsonify({"success": False, "error": "Proveedor no válido"})
         
-        PROVEEDOR_IA_ACTIVO = nuevo_proveedor
+        configuracion = almacen_configuracion.guardar(proveedor=nuevo_proveedor)
         logger.info(f"Proveedor de IA cambiado a: {nuevo_proveedor}")
         
         return jsonify({
             "success": True, 
             "message": f"Proveedor cambiado a {nuevo_proveedor}",
-            "proveedor": PROVEEDOR_IA_ACTIVO
+            "proveedor": configuracion.proveedor
         })
         
     except Exception as e:
@@ -710,6 +1047,7 @@ def chat_page():
 @app.route("/api/chat", methods=['POST'])
 def chat_api():
     """API para el chat de pruebas"""
+    configuracion = almacen_configuracion.obtener()
     try:
         data = request.get_json()
         mensaje = data.get('mensaje', '')
@@ -717,38 +1055,211 @@ def chat_api():
         if not mensaje:
             return jsonify({"success": False, "error": "Mensaje vacío"})
         
-        logger.info(f"Chat de pruebas - Mensaje recibido: {mensaje}")
+        logger.info("Chat de pruebas - Mensaje recibido: %s", texto_log(mensaje))
         
         # Cargar inventario
         df = cargar_inventario()
         
         # Procesar mensaje igual que en WhatsApp
-        saludo_detectado = any(saludo in mensaje.lower() for saludo in ['hola', 'hi', 'hello', 'buenos días', 'buenas'])
+        clasificacion = clasificar_mensaje(mensaje)
         
-        if saludo_detectado:
-            logger.info("Chat de pruebas - Mensaje reconocido como saludo")
-            respuesta = CONFIG["saludo_personalizado"]
+        if clasificacion.saludo:
+            logger.debug("Chat de pruebas - Mensaje reconocido como saludo")
+            respuesta = configuracion.config["saludo_personalizado"]
         else:
             # Consultar inventario con el proveedor configurado
-            logger.info(f"Chat de pruebas - Consultando inventario con {PROVEEDOR_IA_ACTIVO}")
-            respuesta = consultar_excel(mensaje, df)
-            logger.info(f"Chat de pruebas - Respuesta generada: {respuesta[:100]}...")
+            respuesta = consultar_excel(mensaje, df, usuario_id=data.get('usuario_id'), clasificacion=clasificacion)
+            if muestrear_debug(logger):
+                logger.debug("Chat de pruebas - Respuesta generada: %s", texto_log(respuesta))
         
         return jsonify({
             "success": True,
             "respuesta": respuesta,
-            "proveedor": PROVEEDOR_IA_ACTIVO,
+            "proveedor": configuracion.proveedor,
             "timestamp": datetime.now().isoformat()
         })
         
     except Exception as e:
-        logger.error(f"Error en chat de pruebas: {e}")
+        logger.error("Error en chat de pruebas: %s", e)
         return jsonify({
             "success": False, 
             "error": "Error procesando mensaje",
             "respuesta": "❌ Lo siento, ocurrió un error. Intenta de nuevo."
         })
 
+# Consultas en lote: máximo de mensajes por petición y de consultas a la IA en paralelo
+# (el pool es del worker, así que el límite vale para todos los lotes que lleguen a la vez)
+CHAT_LOTE_MAX_MENSAJES = int(os.getenv('CHAT_LOTE_MAX_MENSAJES', 100))
+executor_lotes = ThreadPoolExecutor(max_workers=int(os.getenv('CHAT_LOTE_CONCURRENCIA', 4)), thread_name_prefix='chat-lote')
+
+def resolver_con_ia_medido(mensaje, df):
+    """Resuelve una consulta del lote con caché o IA y retorna (respuesta, segundos)"""
+    inicio = time.perf_counter()
+    respuesta = resolver_consulta(mensaje, df, [], camino_rapido=False)
+    return respuesta, time.perf_counter() - inicio
+
+@app.route("/api/chat/batch", methods=['POST'])
+def chat_batch_api():
+    """API de consultas en lote para herramientas internas (sin historial de conversación)
+
+    Recibe {"mensajes": ["...", ...]} y retorna los resultados en el mismo orden. Los mensajes
+    repetidos se resuelven una vez, el camino rápido responde todos los que puede en una pasada
+    y el resto va a la IA en paralelo, con CHAT_LOTE_CONCURRENCIA consultas como máximo.
+    """
+    configuracion = almacen_configuracion.obtener()
+    inicio_lote = time.perf_counter()
+    try:
+        data = request.get_json(silent=True) or {}
+        mensajes = data.get('mensajes')
+        if not isinstance(mensajes, list) or not mensajes:
+            return jsonify({"success": False, "error": "Se esperaba una lista 'mensajes' no vacía"})
+        if len(mensajes) > CHAT_LOTE_MAX_MENSAJES:
+            return jsonify({"success": False, "error": f"Máximo {CHAT_LOTE_MAX_MENSAJES} mensajes por lote"})
+        mensajes = [m.get('mensaje', '') if isinstance(m, dict) else m for m in mensajes]
+        if not all(isinstance(m, str) for m in mensajes):
+            return jsonify({"success": False, "error": "Cada mensaje debe ser texto"})
+        
+        df = cargar_inventario()
+        
+        # Mensajes iguales (sin contar espacios ni mayúsculas) se resuelven una sola vez
+        unicos = {}
+        for mensaje in mensajes:
+            unicos.setdefault(' '.join(mensaje.split()).casefold(), mensaje.strip())
+        resultados = {}
+        
+        # Saludos, mensajes vacíos o prohibidos y camino rápido, sin salir del proceso
+        inicio = time.perf_counter()
+        candidatos = []
+        for clave, mensaje in unicos.items():
+            if not mensaje:
+                resultados[clave] = ("Mensaje vacío", "error", 0.0)
+            elif df.empty:
+                resultados[clave] = (configuracion.mensajes["error_general"], "error", 0.0)
+            else:
+                clasificacion = clasificar_mensaje(mensaje)
+                if clasificacion.bloqueado:
+                    resultados[clave] = (configuracion.mensajes["consulta_fuera_tema"], "fuera_tema", 0.0)
+                elif clasificacion.saludo:
+                    resultados[clave] = (configuracion.config["saludo_personalizado"], "saludo", 0.0)
+                else:
+                    candidatos.append(clave)
+        respuestas = motor_consultas.responder_lote(
+            [unicos[clave] for clave in candidatos], df,
+            almacen_inventario.version_de(df), configuracion.config, almacen_inventario.consultas_de(df)
+        )
+        duracion_rapido = time.perf_counter() - inicio
+        pendientes = []
+        for clave, respuesta in zip(candidatos, respuestas):
+            if respuesta is not None:
+                resultados[clave] = (respuesta, "camino_rapido", duracion_rapido)
+            else:
+                pendientes.append(clave)
+        
+        # El resto, a la caché o al proveedor de IA en paralelo (acotado por el pool del worker)
+        futuros = {clave: executor_lotes.submit(resolver_con_ia_medido, unicos[clave], df) for clave in pendientes}
+        for clave, futuro in futuros.items():
+            try:
+                respuesta, segundos = futuro.result()
+                resultados[clave] = (respuesta, "ia", segundos)
+            except Exception as e:
+                logger.error("Error en consulta del lote: %s", e)
+                resultados[clave] = ("❌ Lo siento, ocurrió un error. Intenta de nuevo.", "error", 0.0)
+        
+        items = []
+        vistos = set()
+        for indice, mensaje in enumerate(mensajes):
+            clave = ' '.join(mensaje.split()).casefold()
+            respuesta, origen, segundos = resultados[clave]
+            metricas.contar('chat_lote_mensajes_total', origen=origen)
+            items.append({
+                "indice": indice,
+                "mensaje": mensaje,
+                "respuesta": respuesta,
+                "origen": origen,
+                "duplicado": clave in vistos,
+                "ms": round(segundos * 1000, 1)
+            })
+            vistos.add(clave)
+        
+        logger.info("Lote de %d mensajes (%d únicos, %d a la IA)", len(mensajes), len(unicos), len(pendientes))
+        return jsonify({
+            "success": True,
+            "resultados": items,
+            "unicos": len(unicos),
+            "proveedor": configuracion.proveedor,
+            "total_ms": round((time.perf_counter() - inicio_lote) * 1000, 1),
+            "timestamp": datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error("Error en chat en lote: %s", e)
+        return jsonify({"success": False, "error": "Error procesando el lote"})
+
+# Secreto compartido que deben enviar los clientes de la API de cambios del inventario (sin él, la API está deshabilitada)
+INVENTARIO_API_TOKEN = os.getenv('INVENTARIO_API_TOKEN', '')
+
+def token_inventario_valido(token):
+    """True si el token recibido coincide con INVENTARIO_API_TOKEN (comparación en tiempo constante)"""
+    return bool(INVENTARIO_API_TOKEN) and hmac.compare_digest(token.encode('utf-8'), INVENTARIO_API_TOKEN.encode('utf-8'))
+
+@app.route("/api/inventario/delta", methods=['POST'])
+def inventario_delta_api():
+    """Aplica cambios puntuales al inventario sin reimportarlo
+
+    Recibe {"upserts": [{"ID": 3, "Stock": 12}, ...], "deletes": [5, ...]}: las filas con un ID existente
+    se actualizan (solo las columnas enviadas), las demás se agregan y los IDs de "deletes" se eliminan.
+    El lote se aplica completo o no se aplica; la base SQLite se actualiza en segundo plano.
+    Requiere la cabecera X-Inventario-Token con el valor de INVENTARIO_API_TOKEN.
+    """
+    inicio = time.perf_counter()
+    if not INVENTARIO_API_TOKEN:
+        return jsonify({"success": False, "error": "API de cambios deshabilitada: configura INVENTARIO_API_TOKEN"}), 403
+    if not token_inventario_valido(request.headers.get('X-Inventario-Token', '')):
+        logger.warning("Cambios de inventario rechazados: token inválido (%s)", request.remote_addr)
+        return jsonify({"success": False, "error": "Token inválido"}), 401
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"success": False, "error": "Se esperaba un objeto JSON con 'upserts' y/o 'deletes'"})
+        snapshot, plan = almacen_inventario.aplicar_cambios(data.get('upserts'), data.get('deletes'))
+        logger.info(
+            "Cambios de inventario aplicados: %s (v%s)",
+            ", ".join(f"{cantidad} {operacion}" for operacion, cantidad in plan.resumen.items()), snapshot.version
+        )
+        return jsonify({
+            "success": True,
+            "version": snapshot.version,
+            "huella": almacen_inventario.huella_de(snapshot.df),
+            "total": len(snapshot.df),
+            **plan.resumen,
+            "no_encontrados": plan.no_encontrados,
+            "pendientes_persistencia": almacen_inventario.pendientes_persistencia(),
+            "ms": round((time.perf_counter() - inicio) * 1000, 1)
+        })
+    except ErrorCambios as e:
+        return jsonify({"success": False, "error": str(e)})
+    except Exception as e:
+        logger.error("Error aplicando cambios de inventario: %s", e)
+        return jsonify({"success": False, "error": "Error aplicando los cambios"})
+
+def preparar_en_segundo_plano(port, espera_maxima=5.0):
+    """Espera a que el servidor escuche en el puerto y luego inicializa servicios e inventario"""
+    limite = time.monotonic() + espera_maxima
+    while time.monotonic() < limite:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            fases_arranque.marcar('puerto')
+            break
+        except OSError:
+            time.sleep(0.01)
+    try:
+        inicializar_servicios()
+        precargar()
+    except Exception as e:
+        logger.error(f"Error preparando el servidor: {e}")
+
+fases_arranque.marcar('importacion')
+
 if __name__ == '__main__':
     # Verificar configuración
     if not os.getenv('GEMINI_API_KEY'):
@@ -759,17 +1270,13 @@ if __name__ == '__main__':
         logger.error("TWILIO_ACCOUNT_SID no configurada")
         exit(1)
     
-    # Verificar que el modelo esté disponible (no crítico para el inicio)
-    modelo_disponible, modelo_usado = verificar_modelo_disponible()
-    if not modelo_disponible:
-        logger.warning("El modelo de Gemini no está disponible al inicio, pero la aplicación continuará")
-        logger.warning("Se intentará encontrar un modelo funcional cuando se reciba el primer mensaje")
-    else:
-        logger.info(f"Modelo verificado al inicio: {modelo_usado}")
-    
     # Obtener puerto de Railway o usar 5000 por defecto
     port = int(os.getenv('PORT', 5000))
     
+    # Servicios, inventario y modelo se preparan cuando el servidor ya escucha (las consultas que
+    # lleguen antes esperan lo que necesiten; /health responde de inmediato)
+    threading.Thread(target=preparar_en_segundo_plano, args=(port,), name='arranque', daemon=True).start()
+    
     logger.info("Iniciando servidor Flask...")
     app.run(debug=False, host='0.0.0.0', port=port)
 
@@ -0,0 +1,43 @@
+"""
+Tiempos de arranque del proceso
+Registra en qué momento termina cada fase (importación, servicios, inventario, modelo de Gemini) contando
+desde que se empezó a importar la aplicación
+"""
+
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FasesArranque:
+    """Momento en que terminó cada fase del arranque, en segundos desde la creación"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self._fases = {}
+        self._lock = threading.Lock()
+
+    def marcar(self, fase):
+        """Registra el fin de la fase (solo la primera vez: en gunicorn algunas se repiten por worker)"""
+        transcurrido = time.perf_counter() - self.inicio
+        with self._lock:
+            if fase in self._fases:
+                return
+            self._fases[fase] = transcurrido
+        logger.info(f"Arranque: {fase} a los {transcurrido * 1000:.0f} ms")
+
+    def resumen(self):
+        """{fase: milisegundos desde el inicio} en el orden en que terminaron"""
+        with self._lock:
+            return {fase: round(segundos * 1000, 1) for fase, segundos in self._fases.items()}
+
+    def segundos(self):
+        """{fase: segundos desde el inicio}, para las métricas"""
+        with self._lock:
+            return dict(self._fases)
+
+
+# Fases del proceso actual (el módulo se importa primero, al empezar a cargar la aplicación)
+fases_arranque = FasesArranque()
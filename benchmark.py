@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline del webhook de WhatsApp y del chat de pruebas
+Levanta servidores falsos de SiliconFlow y Gemini, genera inventarios sintéticos de distintos tamaños,
+arranca la aplicación con gunicorn y mide latencia (p50/p95/p99) y mensajes por segundo
+sin llamar a Twilio ni a las APIs reales.
+
+Uso:
+    python benchmark.py --tamanos 10,1000,100000 --mensajes 500 --concurrencia 16
+    python benchmark.py --salida base.json
+    python benchmark.py --comparar base.json --tolerancia 0.2
+    python benchmark.py --solo-servidores
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+MARCAS = ['Dell', 'HP', 'Lenovo', 'Apple', 'Samsung', 'Sony', 'Logitech', 'Razer', 'Asus', 'Xiaomi', 'Anker', 'LG']
+TIPOS = [
+    ('Laptop', 'Computadoras'), ('Mouse', 'Periféricos'), ('Teclado', 'Periféricos'),
+    ('Monitor', 'Monitores'), ('Auriculares', 'Audio'), ('Parlante', 'Audio'), ('Webcam', 'Video'),
+    ('Tablet', 'Tablets'), ('Smartphone', 'Smartphones'), ('Cargador', 'Accesorios'),
+    ('Disco SSD', 'Almacenamiento'), ('Memoria USB', 'Almacenamiento'),
+]
+ADJETIVOS = ['inalámbrico', 'profesional', 'compacto', 'gaming', 'ultradelgado', 'con cancelación de ruido', 'de alta precisión']
+
+MODELO_GEMINI_FALSO = 'gemini-1.5-flash'
+# Más larga que max_respuesta_caracteres, para que se note el corte de la generación en streaming
+RESPUESTA_FALSA = (
+    "Tenemos varias opciones disponibles en el inventario. Te recomiendo revisar precio y stock "
+    "de los productos mencionados; si quieres, te paso el detalle de alguno en particular. "
+    "Los equipos de gama media suelen tener el mejor equilibrio entre precio y prestaciones, "
+    "mientras que los de gama alta conviene elegirlos solo si vas a aprovechar su rendimiento. "
+    "También revisa la garantía y la disponibilidad, porque algunos productos tienen pocas unidades. "
+    "Si me cuentas para qué lo vas a usar y cuál es tu presupuesto, puedo sugerirte dos o tres "
+    "alternativas concretas con su precio y stock actual, y avisarte si hay accesorios compatibles "
+    "que valga la pena considerar junto con tu compra."
+)
+FRAGMENTOS_FALSOS = re.findall(r'\S+\s*', RESPUESTA_FALSA)
+
+
+# ---------------------------------------------------------------------------
+# Servidores falsos de los proveedores de IA
+# ---------------------------------------------------------------------------
+
+class PerfilLatencia:
+    """Latencia hasta el primer token, tiempo por fragmento generado y tasa de errores de un servidor falso"""
+
+    def __init__(self, latencia=0.2, jitter=0.05, tasa_error=0.0, codigo_error=503, latencia_fragmento=0.005):
+        self.latencia = latencia
+        self.jitter = jitter
+        self.tasa_error = tasa_error
+        self.codigo_error = codigo_error
+        self.latencia_fragmento = latencia_fragmento
+
+    def esperar(self):
+        """Duerme la latencia hasta el primer token; retorna el código de error a devolver o None"""
+        time.sleep(max(0.0, random.gauss(self.latencia, self.jitter)))
+        if self.tasa_error and random.random() < self.tasa_error:
+            return self.codigo_error
+        return None
+
+
+class _ManejadorIA(BaseHTTPRequestHandler):
+    """Emula /v1/chat/completions (SiliconFlow) y la API REST v1beta de Gemini"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, codigo, datos):
+        cuerpo = json.dumps(datos).encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _leer_cuerpo(self):
+        largo = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(largo) if largo else b''
+
+    def _generar_completa(self, perfil):
+        """Sin streaming la respuesta llega cuando se generaron todos los fragmentos"""
+        time.sleep(perfil.latencia_fragmento * len(FRAGMENTOS_FALSOS))
+        self.server.contar('fragmentos_generados', len(FRAGMENTOS_FALSOS))
+
+    def _transmitir(self, tipo, partes, perfil, por_parte=1):
+        """Envía las partes con Transfer-Encoding chunked; cada una tarda lo que sus por_parte fragmentos"""
+        self.send_response(200)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for parte in partes:
+                time.sleep(perfil.latencia_fragmento * por_parte)
+                datos = parte.encode('utf-8')
+                self.wfile.write(f"{len(datos):x}\r\n".encode() + datos + b"\r\n")
+                self.wfile.flush()
+                self.server.contar('fragmentos_generados', por_parte)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente cortó la generación (límite de caracteres alcanzado)
+            self.server.contar('streaming_cortados')
+            self.close_connection = True
+
+    def do_GET(self):
+        ruta = self.path.split('?')[0]
+        if ruta.endswith('/models'):
+            self.server.contar('gemini_modelos')
+            return self._responder(200, {"models": [{
+                "name": f"models/{MODELO_GEMINI_FALSO}",
+                "version": "001",
+                "displayName": "Gemini falso",
+                "inputTokenLimit": 1048576,
+                "outputTokenLimit": 8192,
+                "supportedGenerationMethods": ["generateContent", "countTokens"],
+            }]})
+        self._responder(404, {"error": {"code": 404, "message": "Ruta no encontrada"}})
+
+    def do_POST(self):
+        ruta = self.path.split('?')[0]
+        cuerpo = self._leer_cuerpo()
+
+        if ruta.endswith('/chat/completions'):
+            self.server.contar('siliconflow')
+            perfil = self.server.perfil_siliconflow
+            error = perfil.esperar()
+            if error:
+                return self._responder(error, {"message": "Error simulado"})
+            if json.loads(cuerpo or b'{}').get('stream'):
+                eventos = [
+                    "data: " + json.dumps({"choices": [{"index": 0, "delta": {"content": fragmento}}]}) + "\n\n"
+                    for fragmento in FRAGMENTOS_FALSOS
+                ]
+                return self._transmitir('text/event-stream', eventos + ["data: [DONE]\n\n"], perfil)
+            self._generar_completa(perfil)
+            return self._responder(200, {
+                "id": uuid.uuid4().hex,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": RESPUESTA_FALSA}, "finish_reason": "stop"}],
+            })
+
+        if ruta.endswith(':streamGenerateContent'):
+            self.server.contar('gemini')
+            perfil = self.server.perfil_gemini
+            error = perfil.esperar()
+            if error:
+                return self._responder(error, {"error": {"code": error, "message": "Error simulado", "status": "UNAVAILABLE"}})
+            # La API REST transmite un arreglo JSON; Gemini agrupa varias palabras por elemento
+            elementos = [
+                json.dumps({"candidates": [{"content": {"role": "model", "parts": [{"text": ''.join(FRAGMENTOS_FALSOS[i:i + 5])}]}, "index": 0}]})
+                for i in range(0, len(FRAGMENTOS_FALSOS), 5)
+            ]
+            partes = ["[" + elementos[0]] + ["," + e for e in elementos[1:]] + ["]"]
+            return self._transmitir('application/json', partes, perfil, por_parte=5)
+
+        if ruta.endswith(':generateContent'):
+            self.server.contar('gemini')
+            perfil = self.server.perfil_gemini
+            error = perfil.esperar()
+            if error:
+                return self._responder(error, {"error": {"code": error, "message": "Error simulado", "status": "UNAVAILABLE"}})
+            self._generar_completa(perfil)
+            return self._responder(200, {"candidates": [{
+                "content": {"role": "model", "parts": [{"text": RESPUESTA_FALSA}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }]})
+
+        self._responder(404, {"error": {"code": 404, "message": "Ruta no encontrada"}})
+
+
+class ServidorIAFalso(ThreadingHTTPServer):
+    """Servidor HTTP local que responde como SiliconFlow y Gemini con los perfiles indicados"""
+
+    daemon_threads = True
+
+    def __init__(self, perfil_siliconflow, perfil_gemini, puerto=0):
+        super().__init__(('127.0.0.1', puerto), _ManejadorIA)
+        self.perfil_siliconflow = perfil_siliconflow
+        self.perfil_gemini = perfil_gemini
+        self.llamadas = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def contar(self, nombre, cantidad=1):
+        with self._lock:
+            self.llamadas[nombre] = self.llamadas.get(nombre, 0) + cantidad
+
+    def reiniciar_conteos(self):
+        with self._lock:
+            conteos, self.llamadas = self.llamadas, {}
+        return conteos
+
+    def iniciar(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+# ---------------------------------------------------------------------------
+# Inventario y tráfico sintéticos
+# ---------------------------------------------------------------------------
+
+def generar_inventario(filas, ruta, semilla=42):
+    """Genera un inventario Excel sintético con las columnas del inventario real"""
+    import pandas as pd
+
+    aleatorio = random.Random(semilla)
+    productos, categorias, proveedores, descripciones = [], [], [], []
+    for _ in range(filas):
+        marca = aleatorio.choice(MARCAS)
+        tipo, categoria = aleatorio.choice(TIPOS)
+        productos.append(f"{tipo} {marca} {aleatorio.choice('ABCDEFGHXZ')}{aleatorio.randint(10, 9999)}")
+        categorias.append(categoria)
+        proveedores.append(marca)
+        descripciones.append(f"{tipo} {aleatorio.choice(ADJETIVOS)} de {marca}")
+
+    df = pd.DataFrame({
+        'ID': range(1, filas + 1),
+        'Producto': productos,
+        'Categoria': categorias,
+        'Precio': [aleatorio.randint(10, 3000) for _ in range(filas)],
+        'Stock': [aleatorio.randint(0, 100) for _ in range(filas)],
+        'Proveedor': proveedores,
+        'Descripcion': descripciones,
+    })
+    df.to_excel(ruta, index=False)
+    return df
+
+
+def generar_mensajes(df, cantidad, semilla=7):
+    """Mezcla de saludos, consultas simples (camino rápido) y preguntas abiertas (proveedor de IA)"""
+    aleatorio = random.Random(semilla)
+    productos = df['Producto'].tolist()
+    categorias = sorted(set(df['Categoria']))
+    plantillas_simples = [
+        "¿Cuánto cuesta el {p}?",
+        "¿Hay stock del {p}?",
+        "¿Quién es el proveedor del {p}?",
+    ]
+    plantillas_abiertas = [
+        "¿Qué me recomiendas en {c} para trabajar desde casa?",
+        "Compara el {p} con el {q}",
+        "Busco algo de {c} económico, ¿qué opciones tienes?",
+    ]
+    mensajes = []
+    for _ in range(cantidad):
+        tirada = aleatorio.random()
+        if tirada < 0.1:
+            mensajes.append(aleatorio.choice(['Hola', 'Buenas', 'hola, buenos días']))
+        elif tirada < 0.5:
+            mensajes.append(aleatorio.choice(plantillas_simples).format(p=aleatorio.choice(productos)))
+        else:
+            mensajes.append(aleatorio.choice(plantillas_abiertas).format(
+                p=aleatorio.choice(productos), q=aleatorio.choice(productos), c=aleatorio.choice(categorias)
+            ))
+    return mensajes
+
+
+def formulario_twilio(cuerpo, numero):
+    """Campos form-encoded de un webhook entrante de WhatsApp de Twilio"""
+    sid = 'SM' + uuid.uuid4().hex
+    return {
+        'SmsMessageSid': sid,
+        'NumMedia': '0',
+        'ProfileName': 'Benchmark',
+        'SmsSid': sid,
+        'WaId': numero.split('+')[-1],
+        'SmsStatus': 'received',
+        'Body': cuerpo,
+        'To': 'whatsapp:+14155238886',
+        'NumSegments': '1',
+        'ReferralNumMedia': '0',
+        'MessageSid': sid,
+        'AccountSid': 'AC' + '0' * 32,
+        'From': numero,
+        'ApiVersion': '2010-04-01',
+    }
+
+
+# ---------------------------------------------------------------------------
+# Aplicación bajo prueba y generador de carga
+# ---------------------------------------------------------------------------
+
+def iniciar_aplicacion(puerto, ruta_inventario, servidor_ia, args, ruta_log):
+    """Arranca la aplicación con gunicorn apuntando a los servidores falsos"""
+    entorno = dict(os.environ)
+    entorno.update({
+        'PORT': str(puerto),
+        'INVENTARIO_PATH': ruta_inventario,
+        'PROVEEDOR_IA': args.proveedor,
+        'SILICONFLOW_API_KEY': 'clave-falsa',
+        'SILICONFLOW_API_URL': f"{servidor_ia.url}/v1/chat/completions",
+        'GEMINI_API_KEY': 'clave-falsa',
+        'GEMINI_API_ENDPOINT': servidor_ia.url,
+        'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32,
+        'TWILIO_AUTH_TOKEN': 'token-falso',
+        'REDIS_URL': args.redis_url,
+        'RESPUESTA_ASINCRONA': 'false',
+        'WEB_CONCURRENCY': str(args.workers),
+        'GUNICORN_THREADS': str(args.hilos),
+        'LOG_LEVEL': 'WARNING',
+    })
+    if args.sin_cache:
+        entorno['CACHE_RESPUESTAS_MAX'] = '0'
+    if args.streaming:
+        entorno['STREAMING_IA'] = 'true'
+
+    log = open(ruta_log, 'w')
+    proceso = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=entorno, stdout=log, stderr=subprocess.STDOUT
+    )
+
+    url = f"http://127.0.0.1:{puerto}"
+    limite = time.monotonic() + args.timeout_inicio
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"La aplicación terminó al iniciar (ver {ruta_log})")
+        try:
+            if requests.get(f"{url}/health", timeout=2).status_code == 200:
+                return proceso, url
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    proceso.terminate()
+    raise RuntimeError(f"La aplicación no respondió en {args.timeout_inicio}s (ver {ruta_log})")
+
+
+def enviar_carga(url, endpoint, mensajes, concurrencia, usuarios):
+    """Envía los mensajes con `concurrencia` clientes y retorna [(segundos, ok)] y la duración total"""
+    local = threading.local()
+    # Sin --usuarios cada mensaje viene de un número distinto (el límite por número no interfiere)
+    numeros = [f"whatsapp:+549{random.randint(10**9, 10**10 - 1)}" for _ in range(usuarios)] if usuarios else None
+
+    def enviar(indice_mensaje):
+        indice, cuerpo = indice_mensaje
+        sesion = getattr(local, 'sesion', None)
+        if sesion is None:
+            sesion = local.sesion = requests.Session()
+        numero = numeros[indice % len(numeros)] if numeros else f"whatsapp:+549{10**9 + indice}"
+        inicio = time.perf_counter()
+        try:
+            if endpoint == 'whatsapp':
+                r = sesion.post(f"{url}/whatsapp", data=formulario_twilio(cuerpo, numero), timeout=120)
+                ok = r.status_code == 200 and '<Response' in r.text
+            else:
+                r = sesion.post(f"{url}/api/chat", json={'mensaje': cuerpo, 'usuario_id': numero}, timeout=120)
+                ok = r.status_code == 200 and r.json().get('success', False)
+        except requests.exceptions.RequestException:
+            ok = False
+        return time.perf_counter() - inicio, ok
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+        resultados = list(executor.map(enviar, enumerate(mensajes)))
+    return resultados, time.perf_counter() - inicio
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano de una lista ordenada"""
+    if not valores:
+        return 0.0
+    indice = max(0, min(len(valores) - 1, math.ceil(p / 100.0 * len(valores)) - 1))
+    return valores[indice]
+
+
+def resumir(filas, endpoint, resultados, duracion, llamadas_ia):
+    latencias = sorted(s for s, ok in resultados if ok)
+    return {
+        "filas": filas,
+        "endpoint": endpoint,
+        "mensajes": len(resultados),
+        "errores": sum(1 for _, ok in resultados if not ok),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+        "mensajes_por_segundo": round(len(resultados) / duracion, 2) if duracion else 0.0,
+        "llamadas_ia": llamadas_ia,
+    }
+
+
+def imprimir_tabla(resultados):
+    print(f"\n{'Inventario':>10}  {'Endpoint':<9} {'Mensajes':>8} {'Errores':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'msg/s':>8}  Llamadas IA")
+    for r in resultados:
+        llamadas = ', '.join(f"{k}={v}" for k, v in sorted(r['llamadas_ia'].items())) or '-'
+        print(f"{r['filas']:>10}  {r['endpoint']:<9} {r['mensajes']:>8} {r['errores']:>7} "
+              f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['mensajes_por_segundo']:>8.1f}  {llamadas}")
+
+
+def comparar(resultados, ruta_base, tolerancia):
+    """Retorna las combinaciones cuyo p95 empeoró más que la tolerancia respecto de la base"""
+    with open(ruta_base, encoding='utf-8') as f:
+        base = {(r['filas'], r['endpoint']): r for r in json.load(f)}
+    regresiones = []
+    for r in resultados:
+        anterior = base.get((r['filas'], r['endpoint']))
+        if anterior and anterior['p95_ms'] > 0 and r['p95_ms'] > anterior['p95_ms'] * (1 + tolerancia):
+            regresiones.append((r, anterior))
+    return regresiones
+
+
+def parsear_argumentos():
+    parser = argparse.ArgumentParser(description="Benchmark offline del chatbot con proveedores de IA falsos")
+    parser.add_argument('--tamanos', default='10,1000,10000,100000', help="Filas de inventario a probar, separadas por coma")
+    parser.add_argument('--endpoints', default='whatsapp,chat', help="whatsapp, chat o ambos")
+    parser.add_argument('--mensajes', type=int, default=300, help="Mensajes medidos por tamaño y endpoint")
+    parser.add_argument('--calentamiento', type=int, default=20, help="Mensajes previos que no se miden")
+    parser.add_argument('--concurrencia', type=int, default=16, help="Clientes simultáneos")
+    parser.add_argument('--usuarios', type=int, default=0, help="Números de origen distintos (0 = uno por mensaje)")
+    parser.add_argument('--proveedor', default='siliconflow', choices=['siliconflow', 'gemini'])
+    parser.add_argument('--latencia', type=float, default=0.3, help="Latencia media hasta el primer token del proveedor falso (segundos)")
+    parser.add_argument('--latencia-fragmento', type=float, default=0.005, help="Segundos por fragmento generado por el proveedor falso")
+    parser.add_argument('--jitter', type=float, default=0.05, help="Desvío de la latencia del proveedor falso (segundos)")
+    parser.add_argument('--tasa-error', type=float, default=0.0, help="Fracción de llamadas al proveedor que fallan")
+    parser.add_argument('--codigo-error', type=int, default=503, help="Código HTTP de los errores simulados")
+    parser.add_argument('--sin-cache', action='store_true', help="Desactivar la caché de respuestas")
+    parser.add_argument('--streaming', action='store_true', help="Activar STREAMING_IA en la aplicación")
+    parser.add_argument('--workers', type=int, default=2, help="Workers de gunicorn")
+    parser.add_argument('--hilos', type=int, default=8, help="Hilos por worker de gunicorn")
+    parser.add_argument('--puerto', type=int, default=5055, help="Puerto de la aplicación bajo prueba")
+    parser.add_argument('--redis-url', default='redis://127.0.0.1:1/0', help="Redis a usar (por defecto, ninguno)")
+    parser.add_argument('--timeout-inicio', type=float, default=300, help="Segundos máximos de arranque de la aplicación")
+    parser.add_argument('--salida', help="Guardar los resultados en un archivo JSON")
+    parser.add_argument('--comparar', help="JSON de resultados base para detectar regresiones de p95")
+    parser.add_argument('--tolerancia', type=float, default=0.2, help="Empeoramiento de p95 tolerado al comparar (0.2 = 20%%)")
+    parser.add_argument('--solo-servidores', action='store_true', help="Solo levantar los servidores falsos")
+    return parser.parse_args()
+
+
+def main():
+    args = parsear_argumentos()
+    perfil = PerfilLatencia(args.latencia, args.jitter, args.tasa_error, args.codigo_error, args.latencia_fragmento)
+    servidor_ia = ServidorIAFalso(perfil, perfil).iniciar()
+
+    if args.solo_servidores:
+        print("🤖 Servidores falsos de IA escuchando. Variables para la aplicación:")
+        print(f"   SILICONFLOW_API_URL={servidor_ia.url}/v1/chat/completions")
+        print(f"   GEMINI_API_ENDPOINT={servidor_ia.url}")
+        print("   (Ctrl+C para salir)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            return
+
+    tamanos = [int(t) for t in re.split(r'[,\s]+', args.tamanos.strip()) if t]
+    endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    resultados = []
+
+    with tempfile.TemporaryDirectory(prefix='benchmark_') as directorio:
+        for filas in tamanos:
+            print(f"📊 Inventario de {filas} filas...")
+            ruta_inventario = os.path.join(directorio, f"inventario_{filas}.xlsx")
+            df = generar_inventario(filas, ruta_inventario)
+
+            inicio = time.perf_counter()
+            proceso, url = iniciar_aplicacion(args.puerto, ruta_inventario, servidor_ia, args, os.path.join(directorio, f"app_{filas}.log"))
+            print(f"   Aplicación lista en {time.perf_counter() - inicio:.1f}s")
+            try:
+                for endpoint in endpoints:
+                    if args.calentamiento:
+                        enviar_carga(url, endpoint, generar_mensajes(df, args.calentamiento, semilla=1), args.concurrencia, args.usuarios)
+                    servidor_ia.reiniciar_conteos()
+                    medidos, duracion = enviar_carga(url, endpoint, generar_mensajes(df, args.mensajes), args.concurrencia, args.usuarios)
+                    resultados.append(resumir(filas, endpoint, medidos, duracion, servidor_ia.reiniciar_conteos()))
+                    print(f"   {endpoint}: {resultados[-1]['p95_ms']:.1f} ms p95, {resultados[-1]['mensajes_por_segundo']:.1f} msg/s")
+            finally:
+                proceso.terminate()
+                proceso.wait(timeout=60)
+
+    imprimir_tabla(resultados)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"\n✅ Resultados guardados en {args.salida}")
+
+    if args.comparar:
+        regresiones = comparar(resultados, args.comparar, args.tolerancia)
+        if regresiones:
+            print(f"\n❌ Regresiones de p95 (tolerancia {args.tolerancia:.0%}):")
+            for r, anterior in regresiones:
+                print(f"   {r['filas']} filas / {r['endpoint']}: {anterior['p95_ms']:.1f} ms -> {r['p95_ms']:.1f} ms")
+            sys.exit(1)
+        print(f"\n✅ Sin regresiones de p95 respecto de {args.comparar}")
+
+
+if __name__ == "__main__":
+    main()
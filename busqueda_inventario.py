@@ -0,0 +1,137 @@
+"""
+Índice léxico local (BM25) sobre el inventario
+Permite enviar al modelo solo las filas relevantes para la consulta en lugar de la tabla completa
+"""
+
+import re
+import math
+import threading
+import unicodedata
+import logging
+from collections import defaultdict, Counter
+
+logger = logging.getLogger(__name__)
+
+# Columnas indexadas y su peso (repeticiones del texto en el documento)
+COLUMNAS_BUSQUEDA = {
+    'Producto': 2,
+    'Categoria': 1,
+    'Proveedor': 1,
+    'Descripcion': 1,
+}
+
+# Parámetros estándar de BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Largo máximo de los tokens: recorta plurales y variantes ("auriculares" ~ "auricular")
+LARGO_RAIZ = 6
+
+# Atributo (DataFrame.attrs) con el origen de un subconjunto: "versión/posiciones" del snapshot del que salió
+ATRIBUTO_ORIGEN = 'origen_inventario'
+
+_PATRON_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def normalizar_texto(texto):
+    """Pasa a minúsculas y elimina acentos"""
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    """Divide el texto en tokens normalizados y recortados a su raíz"""
+    return [token[:LARGO_RAIZ] for token in _PATRON_TOKEN.findall(normalizar_texto(texto))]
+
+
+class IndiceInventario:
+    """Índice invertido BM25 construido a partir de un DataFrame de inventario"""
+
+    def __init__(self, df):
+        self.total = len(df)
+        self.postings = defaultdict(list)
+        self.largos = []
+
+        columnas = [(c, peso) for c, peso in COLUMNAS_BUSQUEDA.items() if c in df.columns]
+        valores = [df[c].fillna('').astype(str).tolist() for c, _ in columnas]
+
+        for posicion in range(self.total):
+            tokens = []
+            for (_, peso), columna in zip(columnas, valores):
+                tokens.extend(tokenizar(columna[posicion]) * peso)
+            self.largos.append(len(tokens))
+            for token, frecuencia in Counter(tokens).items():
+                self.postings[token].append((posicion, frecuencia))
+
+        self.largo_promedio = (sum(self.largos) / self.total) if self.total else 0.0
+        self.idf = {
+            token: math.log(1 + (self.total - len(lista) + 0.5) / (len(lista) + 0.5))
+            for token, lista in self.postings.items()
+        }
+
+    def buscar(self, consulta, top_k):
+        """Retorna [(posición, puntaje)] de las filas más relevantes, de mayor a menor puntaje"""
+        puntajes = defaultdict(float)
+        for token in set(tokenizar(consulta)):
+            lista = self.postings.get(token)
+            if not lista:
+                continue
+            idf = self.idf[token]
+            for posicion, frecuencia in lista:
+                norma = BM25_K1 * (1 - BM25_B + BM25_B * self.largos[posicion] / self.largo_promedio)
+                puntajes[posicion] += idf * frecuencia * (BM25_K1 + 1) / (frecuencia + norma)
+        mejores = sorted(puntajes.items(), key=lambda item: (-item[1], item[0]))
+        return mejores[:top_k]
+
+
+class BuscadorInventario:
+    """Mantiene el índice de la versión actual del inventario y selecciona filas relevantes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._indice = None
+
+    def obtener_indice(self, df, version):
+        """Retorna el índice para la versión dada, construyéndolo si hace falta"""
+        if version is None:
+            return IndiceInventario(df)
+        with self._lock:
+            if self._version != version:
+                self._indice = IndiceInventario(df)
+                self._version = version
+                logger.info(f"Índice de búsqueda construido para inventario v{version} ({len(self._indice.postings)} términos)")
+            return self._indice
+
+    def seleccionar_filas(self, df, consulta, version, top_k=8, min_filas=50, consultas=None):
+        """Retorna el subconjunto del inventario relevante para la consulta
+
+        consultas: InventarioSQLite del snapshot; si está disponible se busca en su índice FTS5
+        en lugar de construir el índice en memoria.
+        """
+        # Inventarios pequeños se envían completos
+        if len(df) <= max(min_filas, top_k):
+            return df
+
+        resultados = consultas.buscar_texto(consulta, top_k) if consultas is not None else None
+        if resultados is None:
+            resultados = self.obtener_indice(df, version).buscar(consulta, top_k)
+        if not resultados:
+            logger.info("Búsqueda sin coincidencias, se envían las primeras filas del inventario")
+            posiciones = list(range(min(top_k, len(df))))
+        else:
+            posiciones = [posicion for posicion, _ in resultados if posicion < len(df)]
+        subconjunto = df.iloc[posiciones]
+        if version is not None:
+            # Las mismas filas de la misma versión dan el mismo prompt: permite cachearlo
+            subconjunto.attrs[ATRIBUTO_ORIGEN] = f"{version}/{','.join(map(str, posiciones))}"
+        return subconjunto
+
+    @staticmethod
+    def version_de(df):
+        """Versión de las filas seleccionadas con seleccionar_filas ("versión/posiciones"), o None"""
+        return df.attrs.get(ATRIBUTO_ORIGEN)
+
+
+# Buscador compartido por todo el proceso
+buscador_inventario = BuscadorInventario()
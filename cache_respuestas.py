@@ -0,0 +1,111 @@
+"""
+Caché de respuestas de la IA
+Evita repetir llamadas a los proveedores para la misma consulta mientras no cambien el inventario ni la configuración
+"""
+
+import os
+import re
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+from busqueda_inventario import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+_PATRON_PALABRA = re.compile(r'[a-z0-9]+')
+
+
+class RespuestaRespaldo(str):
+    """Respuesta de respaldo (estática o de error) que no debe cachearse"""
+
+
+def normalizar_consulta(texto):
+    """Normaliza la consulta para que variantes triviales compartan entrada en caché"""
+    return ' '.join(_PATRON_PALABRA.findall(normalizar_texto(texto)))
+
+
+class CacheRespuestas:
+    """Caché LRU con expiración en memoria y respaldo opcional en Redis"""
+
+    def __init__(self, max_entradas=1000, ttl=300, redis_client=None, prefijo='respuesta_cache_'):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.redis_client = redis_client
+        self.prefijo = prefijo
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def clave(self, consulta, proveedor, huella_inventario, version_config):
+        """Construye la clave de caché de una consulta"""
+        contenido = '|'.join([normalizar_consulta(consulta), proveedor, str(huella_inventario), version_config])
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+    def obtener(self, clave):
+        """Retorna la respuesta cacheada o None"""
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                respuesta, expira = entrada
+                if expira > ahora:
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    return respuesta
+                del self._entradas[clave]
+
+        if self.redis_client:
+            try:
+                valor = self.redis_client.get(self.prefijo + clave)
+                if valor is not None:
+                    respuesta = valor.decode('utf-8')
+                    self._guardar_local(clave, respuesta, ahora)
+                    with self._lock:
+                        self.aciertos += 1
+                    return respuesta
+            except Exception as e:
+                logger.warning(f"Error leyendo caché de respuestas en Redis: {e}")
+
+        with self._lock:
+            self.fallos += 1
+        return None
+
+    def guardar(self, clave, respuesta):
+        """Guarda una respuesta (las respuestas de respaldo se ignoran)"""
+        if isinstance(respuesta, RespuestaRespaldo) or not respuesta:
+            return
+        self._guardar_local(clave, respuesta, time.monotonic())
+        if self.redis_client:
+            try:
+                self.redis_client.setex(self.prefijo + clave, self.ttl, respuesta)
+            except Exception as e:
+                logger.warning(f"Error guardando caché de respuestas en Redis: {e}")
+
+    def limpiar(self):
+        """Vacía la caché en memoria (las entradas de Redis expiran solas por su clave versionada)"""
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self):
+        """Retorna tamaño, aciertos y fallos de la caché"""
+        with self._lock:
+            return {"entradas": len(self._entradas), "aciertos": self.aciertos, "fallos": self.fallos}
+
+    def _guardar_local(self, clave, respuesta, ahora):
+        """Guarda en la caché en memoria aplicando el límite LRU"""
+        with self._lock:
+            self._entradas[clave] = (respuesta, ahora + self.ttl)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+
+# Caché compartida por todo el proceso (Redis se conecta desde app.py si está disponible)
+cache_respuestas = CacheRespuestas(
+    max_entradas=int(os.getenv('CACHE_RESPUESTAS_MAX', 1000)),
+    ttl=int(os.getenv('CACHE_RESPUESTAS_TTL', 300))
+)
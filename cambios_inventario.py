@@ -0,0 +1,205 @@
+"""
+Cambios incrementales del inventario (altas, modificaciones y bajas por ID de producto)
+Planifica un lote de cambios sobre las posiciones del inventario y lo aplica al DataFrame sin releerlo completo.
+La misma planificación se usa sobre la base SQLite, así que memoria y base quedan con las mismas posiciones
+"""
+
+import hashlib
+import numbers
+from collections import namedtuple
+
+# Columna que identifica cada producto en los cambios
+COLUMNA_ID = 'ID'
+
+# Columnas que ninguna fila puede quedar sin valor (ni al agregarla ni al actualizarla)
+COLUMNAS_OBLIGATORIAS = (COLUMNA_ID, 'Producto')
+
+# Máximo de operaciones por lote
+MAX_OPERACIONES = 1000
+
+# escrituras: {posición: fila (dict)} con el contenido final de cada posición modificada (todas < total)
+# claves: {clave: posición o None si se eliminó}; resumen: operaciones aplicadas por tipo
+PlanCambios = namedtuple('PlanCambios', ['escrituras', 'claves', 'total', 'resumen', 'no_encontrados'])
+
+
+class ErrorCambios(ValueError):
+    """Lote de cambios inválido (no se aplica ninguna de sus operaciones)"""
+
+
+def clave_id(valor):
+    """Clave normalizada de un ID: 7, 7.0 y "7" son el mismo producto"""
+    if isinstance(valor, bool):
+        raise ErrorCambios(f"ID inválido: {valor!r}")
+    if isinstance(valor, numbers.Real):
+        if valor != valor:
+            raise ErrorCambios("ID vacío")
+        if float(valor).is_integer():
+            return str(int(valor))
+    clave = str(valor).strip()
+    if not clave:
+        raise ErrorCambios("ID vacío")
+    return clave
+
+
+def _vacio(valor):
+    """True si el valor deja la columna sin dato (null, NaN o texto en blanco)"""
+    if valor is None:
+        return True
+    if isinstance(valor, float) and valor != valor:
+        return True
+    return isinstance(valor, str) and not valor.strip()
+
+
+def normalizar_operaciones(altas, bajas, columnas, numericas=()):
+    """Lista ordenada de (clave, datos) a partir de las filas a insertar o actualizar y los IDs a eliminar
+
+    datos es el dict de columnas a escribir, o None para eliminar. Se valida todo el lote antes de aplicarlo.
+    """
+    altas = altas or []
+    bajas = bajas or []
+    if not isinstance(altas, list) or not isinstance(bajas, list):
+        raise ErrorCambios("'upserts' y 'deletes' deben ser listas")
+    if len(altas) + len(bajas) > MAX_OPERACIONES:
+        raise ErrorCambios(f"Máximo {MAX_OPERACIONES} operaciones por lote")
+    if COLUMNA_ID not in columnas:
+        raise ErrorCambios(f"El inventario no tiene la columna {COLUMNA_ID}")
+
+    operaciones = []
+    for fila in altas:
+        if not isinstance(fila, dict) or fila.get(COLUMNA_ID) is None:
+            raise ErrorCambios(f"Cada fila de 'upserts' debe ser un objeto con '{COLUMNA_ID}'")
+        desconocidas = [c for c in fila if c not in columnas]
+        if desconocidas:
+            raise ErrorCambios(f"Columnas desconocidas: {', '.join(map(str, desconocidas))}")
+        vacias = [c for c in COLUMNAS_OBLIGATORIAS if c in fila and _vacio(fila[c])]
+        if vacias:
+            raise ErrorCambios(f"'{vacias[0]}' no puede quedar vacío (producto {fila[COLUMNA_ID]!r})")
+        for columna in numericas:
+            valor = fila.get(columna)
+            if valor is not None and (isinstance(valor, bool) or not isinstance(valor, numbers.Real)):
+                raise ErrorCambios(f"'{columna}' debe ser numérico")
+        operaciones.append((clave_id(fila[COLUMNA_ID]), dict(fila)))
+    for valor in bajas:
+        operaciones.append((clave_id(valor), None))
+    return operaciones
+
+
+def planificar(operaciones, posicion_de, fila_en, total, columnas):
+    """Efecto de las operaciones sobre las posiciones del inventario
+
+    posicion_de(clave) -> posición o None; fila_en(posición) -> dict con la fila. Las altas se agregan al
+    final y las bajas mueven la última fila al hueco, así solo cambian las posiciones tocadas.
+    """
+    escrituras = {}
+    claves = {}
+    resumen = {'insertados': 0, 'actualizados': 0, 'eliminados': 0}
+    no_encontrados = []
+
+    def posicion(clave):
+        return claves[clave] if clave in claves else posicion_de(clave)
+
+    def fila(posicion_fila):
+        return escrituras[posicion_fila] if posicion_fila in escrituras else fila_en(posicion_fila)
+
+    for clave, datos in operaciones:
+        actual = posicion(clave)
+        if datos is None:
+            if actual is None:
+                no_encontrados.append(clave)
+                continue
+            ultima = total - 1
+            if actual != ultima:
+                movida = fila(ultima)
+                escrituras[actual] = movida
+                claves[clave_id(movida[COLUMNA_ID])] = actual
+            escrituras.pop(ultima, None)
+            claves[clave] = None
+            total -= 1
+            resumen['eliminados'] += 1
+        elif actual is None:
+            faltantes = [c for c in COLUMNAS_OBLIGATORIAS if c in columnas and _vacio(datos.get(c))]
+            if faltantes:
+                raise ErrorCambios(f"El producto nuevo {clave} necesita '{faltantes[0]}'")
+            nueva = dict.fromkeys(columnas)
+            nueva.update(datos)
+            escrituras[total] = nueva
+            claves[clave] = total
+            total += 1
+            resumen['insertados'] += 1
+        else:
+            # El ID de la fila existente se conserva tal cual (7 y "7" son el mismo producto)
+            nueva = dict(fila(actual))
+            nueva.update((c, v) for c, v in datos.items() if c != COLUMNA_ID)
+            escrituras[actual] = nueva
+            resumen['actualizados'] += 1
+
+    escrituras = {p: f for p, f in escrituras.items() if p < total}
+    return PlanCambios(escrituras, claves, total, resumen, no_encontrados)
+
+
+def lector_filas(df):
+    """Función que retorna la fila de df en una posición como dict de valores de Python"""
+    columnas = [(columna, df[columna].array) for columna in df.columns]
+    return lambda posicion: {columna: _valor_python(arreglo[posicion]) for columna, arreglo in columnas}
+
+
+def _valor_python(valor):
+    # Escalares de NumPy (np.generic) a su tipo de Python, sin importar NumPy en este módulo
+    if hasattr(valor, 'item') and hasattr(valor, 'dtype'):
+        valor = valor.item()
+    if isinstance(valor, float) and valor != valor:
+        return None
+    return valor
+
+
+def _columna_actualizada(serie, posiciones, valores):
+    """Copia de la columna con los valores dados en las posiciones (ampliando el tipo si hace falta)"""
+    import numpy as np
+    import pandas as pd
+    nuevos = pd.Series(valores, dtype=object).infer_objects()
+    if serie.dtype.kind in 'biuf' and (nuevos.dtype.kind in 'biuf' or nuevos.isna().all()):
+        tipo = np.result_type(serie.dtype, nuevos.dtype) if nuevos.dtype.kind in 'biuf' else np.result_type(serie.dtype, np.float64)
+        arreglo = serie.to_numpy(dtype=tipo, copy=True)
+        arreglo[posiciones] = nuevos.to_numpy(dtype=tipo, na_value=np.nan)
+        return pd.Series(arreglo, name=serie.name)
+    copia = serie.copy()
+    try:
+        # Columnas de texto: se conserva su tipo (object o string de pandas)
+        copia.iloc[posiciones] = nuevos.to_numpy(dtype=object, na_value=None)
+        return copia
+    except (TypeError, ValueError):
+        copia = serie.astype(object)
+        copia.iloc[posiciones] = nuevos.to_numpy(dtype=object, na_value=None)
+        return copia
+
+
+def aplicar_a_dataframe(df, plan):
+    """Nuevo DataFrame con el plan aplicado
+
+    df no se modifica (es el del snapshot anterior): solo se copian las columnas con valores nuevos y el
+    resto se comparte entre ambos DataFrames.
+    """
+    import pandas as pd
+    conservadas = min(plan.total, len(df))
+    existentes = sorted(p for p in plan.escrituras if p < conservadas)
+    columnas = {}
+    for columna in df.columns:
+        serie = df[columna]
+        if conservadas < len(df):
+            serie = serie.iloc[:conservadas]
+        valores = [plan.escrituras[p].get(columna) for p in existentes]
+        arreglo = serie.array
+        if any(_valor_python(arreglo[p]) != v for p, v in zip(existentes, valores)):
+            serie = _columna_actualizada(serie, existentes, valores)
+        columnas[columna] = serie
+    nuevo = pd.DataFrame(columnas, columns=df.columns, copy=False)
+
+    agregadas = [plan.escrituras[p] for p in range(conservadas, plan.total)]
+    if agregadas:
+        nuevo = pd.concat([nuevo, pd.DataFrame(agregadas, columns=df.columns)], ignore_index=True)
+    return nuevo
+
+
+def encadenar_huella(cadena, lote):
+    """Huella del inventario después de aplicar un lote sobre el estado con huella cadena"""
+    return hashlib.sha256(f"{cadena}|{lote}".encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,97 @@
+"""
+Clasificador de mensajes con una sola expresión regular precompilada
+Detecta en una pasada palabras prohibidas, saludos e intenciones de las respuestas estáticas
+"""
+
+import re
+import threading
+from collections import namedtuple
+
+from busqueda_inventario import normalizar_texto
+
+# Saludos reconocidos (palabras completas: "hi" ya no coincide con "chip")
+SALUDOS = ['hola', 'hi', 'hello', 'buenos días', 'buenas']
+
+# Palabras que pueden acompañar a un saludo sin cambiar el mensaje ("hola, buenas tardes, ¿cómo estás?");
+# si queda cualquier otra, el mensaje es una consulta ("hello kitty", "hola, precio del mouse")
+COMPLEMENTOS_SALUDO = {
+    'tardes', 'noches', 'dias', 'buen', 'dia', 'como', 'estas', 'esta', 'estan', 'que', 'tal', 'hey',
+    'saludos', 'amigo', 'amiga', 'equipo', 'a', 'todos', 'y', 'bien', 'gracias', 'por', 'favor',
+}
+
+_PATRON_PALABRA = re.compile(r'\w+')
+
+# Intenciones usadas por las respuestas estáticas, en orden de prioridad
+INTENCIONES_ESTATICAS = {
+    'inventario': ['inventario', 'productos', 'lista'],
+    'precio': ['precio', 'cuesta', 'vale'],
+    'stock': ['stock', 'disponible', 'hay'],
+}
+
+Clasificacion = namedtuple('Clasificacion', ['bloqueado', 'saludo', 'intenciones'])
+
+
+def _alternativas(palabras, plurales=False):
+    """Une las palabras normalizadas en una alternancia regex (las más largas primero)"""
+    normalizadas = {normalizar_texto(p).strip() for p in palabras if str(p).strip()}
+    if not normalizadas:
+        return None
+    partes = [r'\s+'.join(re.escape(t) for t in p.split()) for p in sorted(normalizadas, key=len, reverse=True)]
+    # Las palabras prohibidas también bloquean su plural ("pago" -> "pagos"), no otras palabras que empiezan
+    # igual ("acceso" no bloquea "accesorios"); otras variantes se agregan a la lista
+    return '(?:' + '|'.join(partes) + (r')(?:s|es)?' if plurales else ')')
+
+
+class ClasificadorMensajes:
+    """Expresión compilada con un grupo con nombre por categoría"""
+
+    def __init__(self, palabras_prohibidas, saludos=None, intenciones=None):
+        self.intenciones = intenciones or INTENCIONES_ESTATICAS
+        alternativa_saludos = _alternativas(saludos or SALUDOS)
+        self.patron_saludos = re.compile(r'\b' + alternativa_saludos + r'\b') if alternativa_saludos else None
+        grupos = [
+            ('bloqueado', _alternativas(palabras_prohibidas, plurales=True)),
+            ('saludo', alternativa_saludos),
+        ]
+        grupos += [(f'i_{nombre}', _alternativas(palabras)) for nombre, palabras in self.intenciones.items()]
+        patron = '|'.join(f'(?P<{nombre}>{alternativa})' for nombre, alternativa in grupos if alternativa)
+        self.patron = re.compile(r'\b(?:' + patron + r')\b')
+
+    def clasificar(self, texto):
+        """Clasifica el mensaje recorriéndolo una sola vez
+
+        Es saludo solo si el mensaje no dice nada más que el saludo: si además nombra un producto o una
+        intención, se responde como consulta.
+        """
+        normalizado = normalizar_texto(texto)
+        encontrados = {m.lastgroup for m in self.patron.finditer(normalizado)}
+        intenciones = [nombre for nombre in self.intenciones if f'i_{nombre}' in encontrados]
+        saludo = 'saludo' in encontrados and not intenciones and self._solo_saludo(normalizado)
+        return Clasificacion('bloqueado' in encontrados, saludo, intenciones)
+
+    def _solo_saludo(self, normalizado):
+        """True si el texto (normalizado) no tiene más palabras que saludos y sus complementos"""
+        resto = self.patron_saludos.sub(' ', normalizado)
+        return all(palabra in COMPLEMENTOS_SALUDO for palabra in _PATRON_PALABRA.findall(resto))
+
+
+# Clasificadores compilados que se mantienen (uno por versión de configuración)
+MAX_CLASIFICADORES = 4
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def obtener_clasificador(version_config, palabras_prohibidas):
+    """Retorna el clasificador de la versión de configuración, compilándolo solo cuando cambia"""
+    clasificador = _cache.get(version_config)
+    if clasificador is None:
+        with _lock:
+            clasificador = _cache.get(version_config)
+            if clasificador is None:
+                clasificador = ClasificadorMensajes(palabras_prohibidas)
+                # Solo interesan las últimas configuraciones: descartar las más antiguas
+                while len(_cache) >= MAX_CLASIFICADORES:
+                    _cache.pop(next(iter(_cache)))
+                _cache[version_config] = clasificador
+    return clasificador
@@ -0,0 +1,188 @@
+"""
+Cliente HTTP reutilizable para la API de SiliconFlow
+Sesión con pool de conexiones keep-alive, reintentos con backoff e interruptor de circuito
+"""
+
+import os
+import json
+import logging
+
+# requests se importa al crear el cliente (en cada worker), no al cargar la aplicación
+
+from resiliencia import InterruptorCircuito, CircuitoAbierto, esperar_reintento
+
+logger = logging.getLogger(__name__)
+
+# Códigos HTTP que justifican reintentar la petición
+CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+class ErrorSiliconFlow(Exception):
+    """La API de SiliconFlow no devolvió una respuesta válida"""
+
+
+class ClienteSiliconFlow:
+    """Cliente de chat completions de SiliconFlow con conexiones persistentes"""
+
+    def __init__(self, api_key, url, modelo, tamano_pool=10, timeout_conexion=3.05,
+                 timeout_lectura=25.0, max_reintentos=2, circuito=None):
+        self.api_key = api_key
+        self.url = url
+        self.modelo = modelo
+        self.timeout = (timeout_conexion, timeout_lectura)
+        self.max_reintentos = max_reintentos
+        self.circuito = circuito or InterruptorCircuito("siliconflow")
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        # Los reintentos se manejan aquí (con jitter y circuito), no en urllib3
+        self.session = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=tamano_pool, max_retries=0)
+        self.session.mount('https://', adaptador)
+        self.session.mount('http://', adaptador)
+        self.session.headers.update({
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        })
+
+    def _datos(self, contenido, max_tokens, temperature, historial):
+        return {
+            "model": self.modelo,
+            "messages": (historial or []) + [
+                {
+                    "role": "user",
+                    "content": contenido
+                }
+            ],
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+
+    def _enviar(self, data, stream=False):
+        """POST con reintentos; retorna la respuesta 200 o lanza ErrorSiliconFlow"""
+        import requests
+        for intento in range(self.max_reintentos + 1):
+            ultimo = intento == self.max_reintentos
+            try:
+                response = self.session.post(self.url, json=data, timeout=self.timeout, stream=stream)
+            except requests.exceptions.ConnectionError as e:
+                # Incluye ConnectTimeout: si no se llegó a conectar, reintentar es seguro
+                if ultimo:
+                    self.circuito.registrar_fallo()
+                    raise ErrorSiliconFlow(f"Error de conexión con SiliconFlow: {e}") from e
+                logger.warning(f"Error de conexión con SiliconFlow (intento {intento + 1}): {e}")
+                esperar_reintento(intento)
+                continue
+            except requests.exceptions.Timeout as e:
+                # Un timeout de lectura no se reintenta: ya se esperó el máximo
+                self.circuito.registrar_fallo()
+                raise ErrorSiliconFlow(f"Timeout consultando SiliconFlow: {e}") from e
+            except requests.exceptions.RequestException as e:
+                # URL inválida, redirecciones de más, etc.: también cuenta como fallo (libera la prueba del
+                # circuito semiabierto)
+                self.circuito.registrar_fallo()
+                raise ErrorSiliconFlow(f"Error consultando SiliconFlow: {e}") from e
+
+            if response.status_code == 200:
+                return response
+
+            if response.status_code in CODIGOS_REINTENTABLES and not ultimo:
+                logger.warning(f"SiliconFlow respondió {response.status_code} (intento {intento + 1}), reintentando")
+                response.close()
+                esperar_reintento(intento, retry_after=_leer_retry_after(response))
+                continue
+
+            self.circuito.registrar_fallo()
+            raise ErrorSiliconFlow(f"Error en SiliconFlow API: {response.status_code} - {response.text[:200]}")
+
+    def completar(self, contenido, max_tokens=500, temperature=0.7, historial=None):
+        """Envía el prompt (precedido del historial de mensajes) y retorna el texto generado
+
+        Lanza CircuitoAbierto si el proveedor está marcado como caído y
+        ErrorSiliconFlow si la petición falla tras agotar los reintentos.
+        """
+        self.circuito.permitir()
+        response = self._enviar(self._datos(contenido, max_tokens, temperature, historial))
+        try:
+            respuesta = response.json()['choices'][0]['message']['content']
+        except (ValueError, KeyError, IndexError) as e:
+            self.circuito.registrar_fallo()
+            raise ErrorSiliconFlow(f"Respuesta inválida de SiliconFlow: {e}") from e
+        self.circuito.registrar_exito()
+        return respuesta
+
+    def completar_en_streaming(self, contenido, max_tokens=500, temperature=0.7, historial=None):
+        """Igual que completar, pero genera los fragmentos de texto a medida que llegan (SSE)
+
+        Dejar de iterar cierra la conexión, lo que corta la generación en el servidor.
+        Solo se reintenta antes de recibir el primer byte.
+        """
+        import requests
+        self.circuito.permitir()
+        data = self._datos(contenido, max_tokens, temperature, historial)
+        data["stream"] = True
+        response = self._enviar(data, stream=True)
+        try:
+            # chunk_size=None: cada línea se procesa apenas llega, sin esperar a llenar un bloque
+            for linea in response.iter_lines(chunk_size=None):
+                if not linea.startswith(b'data:'):
+                    continue
+                datos = linea[5:].strip()
+                if datos == b'[DONE]':
+                    break
+                try:
+                    opciones = json.loads(datos).get('choices') or [{}]
+                    delta = opciones[0].get('delta') or {}
+                except (ValueError, AttributeError) as e:
+                    raise ErrorSiliconFlow(f"Evento inválido de SiliconFlow: {e}") from e
+                # Los modelos de razonamiento envían reasoning_content aparte: solo interesa la respuesta
+                if delta.get('content'):
+                    yield delta['content']
+        except requests.exceptions.RequestException as e:
+            self.circuito.registrar_fallo()
+            raise ErrorSiliconFlow(f"Error leyendo el streaming de SiliconFlow: {e}") from e
+        except ErrorSiliconFlow:
+            self.circuito.registrar_fallo()
+            raise
+        except GeneratorExit:
+            # El consumidor cortó la generación al llegar a su límite
+            self.circuito.registrar_exito()
+            raise
+        else:
+            self.circuito.registrar_exito()
+        finally:
+            response.close()
+
+    def cerrar(self):
+        """Cierra las conexiones del pool"""
+        self.session.close()
+
+
+def _leer_retry_after(response):
+    """Retorna los segundos de la cabecera Retry-After si es numérica"""
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def crear_cliente_siliconflow(api_key):
+    """Crea el cliente usando la configuración de variables de entorno"""
+    # Un pool por worker dimensionado a los hilos que pueden llamar en paralelo
+    tamano_pool = int(os.getenv('SILICONFLOW_POOL_SIZE', os.getenv('GUNICORN_THREADS', 10)))
+    return ClienteSiliconFlow(
+        api_key=api_key,
+        url=os.getenv('SILICONFLOW_API_URL', 'https://api.siliconflow.com/v1/chat/completions'),
+        modelo=os.getenv('SILICONFLOW_MODEL', 'deepseek-ai/DeepSeek-R1-Distill-Qwen-14B'),
+        tamano_pool=tamano_pool,
+        timeout_conexion=float(os.getenv('SILICONFLOW_CONNECT_TIMEOUT', 3.05)),
+        timeout_lectura=float(os.getenv('SILICONFLOW_READ_TIMEOUT', 25)),
+        max_reintentos=int(os.getenv('SILICONFLOW_MAX_RETRIES', 2)),
+        circuito=InterruptorCircuito(
+            "siliconflow",
+            max_fallos=int(os.getenv('SILICONFLOW_CIRCUIT_FAILURES', 5)),
+            tiempo_apertura=float(os.getenv('SILICONFLOW_CIRCUIT_OPEN_SECONDS', 30))
+        )
+    )
+
@@ -0,0 +1,159 @@
+"""
+Cola de procesamiento asíncrono de mensajes de WhatsApp
+El webhook encola el mensaje y responde de inmediato; los workers generan la respuesta y la envían por la API de Twilio
+"""
+
+import json
+import time
+import queue
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ColaRespuestas:
+    """Cola acotada (en memoria o lista de Redis) atendida por un pool de hilos"""
+
+    def __init__(self, procesar, max_pendientes=100, hilos=4, redis_client=None, nombre_lista='cola_whatsapp'):
+        self.procesar = procesar
+        self.max_pendientes = max_pendientes
+        self.hilos = hilos
+        self.redis_client = redis_client
+        self.nombre_lista = nombre_lista
+        self._cola = queue.Queue(maxsize=max_pendientes)
+        self._lock = threading.Lock()
+        self._workers = []
+        self._detener = threading.Event()
+        self.encolados = 0
+        self.rechazados = 0
+        self.procesados = 0
+        self.errores = 0
+        self.max_profundidad = 0
+        self.espera_total = 0.0
+
+    def iniciar(self):
+        """Arranca los hilos si aún no están corriendo (se llama después del fork de cada worker)"""
+        with self._lock:
+            if self._workers:
+                return
+            self._detener.clear()
+            for i in range(self.hilos):
+                hilo = threading.Thread(target=self._atender, name=f"cola-respuestas-{i}", daemon=True)
+                hilo.start()
+                self._workers.append(hilo)
+            logger.info(f"Cola de respuestas iniciada con {self.hilos} hilos ({'Redis' if self.redis_client else 'memoria'})")
+
+    def detener(self, timeout=10.0):
+        """Espera a que se vacíe la cola en memoria, deja de tomar trabajos nuevos y espera a que terminen los hilos
+
+        Todo dentro de timeout segundos. Los mensajes que siguen en la cola en memoria se pierden al terminar el
+        proceso y se registran; en Redis quedan en la lista para los demás workers.
+        """
+        limite = time.monotonic() + timeout
+        if not self.redis_client and self._workers:
+            while self._cola.qsize() and time.monotonic() < limite:
+                time.sleep(0.05)
+        self._detener.set()
+        for hilo in self._workers:
+            hilo.join(max(0.0, limite - time.monotonic()))
+        self._workers = []
+
+        if not self.redis_client:
+            descartados = 0
+            while True:
+                try:
+                    self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                descartados += 1
+            if descartados:
+                logger.warning(f"Cola de respuestas detenida con {descartados} mensajes sin procesar (descartados)")
+
+    def profundidad(self):
+        """Cantidad de mensajes pendientes"""
+        if self.redis_client:
+            try:
+                return self.redis_client.llen(self.nombre_lista)
+            except Exception:
+                return 0
+        return self._cola.qsize()
+
+    def encolar(self, tarea):
+        """Encola la tarea; retorna False si la cola está llena (backpressure)"""
+        self.iniciar()
+        tarea = dict(tarea, encolado_en=time.time())
+
+        if self.redis_client:
+            try:
+                if self.redis_client.llen(self.nombre_lista) >= self.max_pendientes:
+                    return self._rechazar()
+                self.redis_client.lpush(self.nombre_lista, json.dumps(tarea))
+            except Exception as e:
+                logger.error(f"Error encolando en Redis: {e}")
+                return self._rechazar()
+        else:
+            try:
+                self._cola.put_nowait(tarea)
+            except queue.Full:
+                return self._rechazar()
+
+        profundidad = self.profundidad()
+        with self._lock:
+            self.encolados += 1
+            self.max_profundidad = max(self.max_profundidad, profundidad)
+        return True
+
+    def _rechazar(self):
+        """Contabiliza un mensaje rechazado por cola llena"""
+        with self._lock:
+            self.rechazados += 1
+        logger.warning("Cola de respuestas llena, mensaje rechazado")
+        return False
+
+    def _tomar(self):
+        """Obtiene la siguiente tarea o None si no hay ninguna en el último segundo"""
+        if self.redis_client:
+            try:
+                resultado = self.redis_client.brpop(self.nombre_lista, timeout=1)
+            except Exception as e:
+                logger.error(f"Error leyendo cola de Redis: {e}")
+                time.sleep(1)
+                return None
+            return json.loads(resultado[1]) if resultado else None
+        try:
+            return self._cola.get(timeout=1)
+        except queue.Empty:
+            return None
+
+    def _atender(self):
+        """Bucle de cada hilo: toma tareas y las procesa"""
+        while not self._detener.is_set():
+            tarea = self._tomar()
+            if tarea is None:
+                continue
+            espera = time.time() - tarea.pop('encolado_en', time.time())
+            try:
+                self.procesar(tarea)
+                with self._lock:
+                    self.procesados += 1
+                    self.espera_total += espera
+            except Exception as e:
+                logger.error(f"Error procesando mensaje encolado: {e}")
+                with self._lock:
+                    self.errores += 1
+
+    def estadisticas(self):
+        """Métricas de la cola para monitoreo"""
+        profundidad = self.profundidad()
+        with self._lock:
+            return {
+                "pendientes": profundidad,
+                "max_pendientes": self.max_pendientes,
+                "max_profundidad": self.max_profundidad,
+                "encolados": self.encolados,
+                "rechazados": self.rechazados,
+                "procesados": self.procesados,
+                "errores": self.errores,
+                "espera_promedio_s": round(self.espera_total / self.procesados, 3) if self.procesados else 0.0
+            }
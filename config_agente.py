@@ -3,6 +3,9 @@ Configuración del comportamiento del agente de IA
 Puedes modificar estas reglas según tus necesidades
 """
 
+import json
+import hashlib
+
 # System Prompt - Personaliza el comportamiento del agente
 SYSTEM_PROMPT = """
 Eres un asistente de inventario especializado para WhatsApp. Tu función es ayudar a los usuarios a consultar información sobre productos, stock, precios y proveedores.
@@ -38,6 +41,10 @@ CONFIG_AGENTE = {
     "incluir_proveedores": True,      # Mostrar información de proveedores
     "respuesta_error_personalizada": "❌ Lo siento, no puedo ayudarte con esa consulta. Solo puedo responder preguntas sobre el inventario de productos.",
     "saludo_personalizado": "¡Hola! 👋 Soy tu asistente de inventario. Puedes preguntarme sobre productos, precios, stock, o enviarme fotos/audios para análisis. ¿En qué puedo ayudarte?",
+    "top_k_inventario": 8,            # Productos relevantes que se envían al modelo por consulta
+    "min_productos_busqueda": 50,     # Con menos productos se envía el inventario completo
+    "max_turnos_historial": 6,        # Turnos de conversación que se recuerdan por usuario
+    "max_tokens_historial": 1000,     # Tokens aproximados máximos del historial enviado a la IA
 }
 
 # Límites de seguridad
@@ -50,7 +57,8 @@ LIMITES_SEGURIDAD = {
         "información personal", "datos bancarios", "contraseñas",
         "transacciones financieras", "compras online"
     ],
-    "max_intentos_consulta": 3,  # Máximo intentos de consulta por usuario
+    "max_intentos_consulta": 3,  # Máximo intentos de consulta por usuario en la ventana
+    "ventana_consultas_segundos": 60,  # Ventana en la que se recargan los intentos
 }
 
 # Mensajes personalizados
@@ -60,6 +68,7 @@ MENSAJES = {
     "error_general": "❌ Lo siento, ocurrió un error. Intenta de nuevo o reformula tu pregunta.",
     "limite_excedido": "⚠️ Has alcanzado el límite de consultas. Intenta más tarde.",
     "archivo_no_soportado": "❌ Tipo de archivo no soportado. Envía una imagen o audio.",
+    "servicio_ocupado": "⏳ Estamos recibiendo muchos mensajes. Intenta de nuevo en unos minutos.",
 }
 
 def obtener_system_prompt():
@@ -78,15 +87,21 @@ def obtener_mensajes():
     """Retorna los mensajes personalizados"""
     return MENSAJES
 
+def calcular_version_config(system_prompt, config, limites, mensajes):
+    """Retorna un hash corto que identifica una combinación de configuración"""
+    contenido = json.dumps([system_prompt, config, limites, mensajes], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:16]
+
 def validar_consulta(texto):
-    """Valida si la consulta cumple con las reglas de seguridad"""
-    limites = obtener_limites()
-    mensajes = obtener_mensajes()
+    """Valida si la consulta cumple con las reglas de seguridad de la configuración actual"""
+    # Importación diferida: configuracion_dinamica importa este módulo
+    from configuracion_dinamica import almacen_configuracion
+    from clasificador_mensajes import obtener_clasificador
     
-    # Verificar palabras prohibidas
-    texto_lower = texto.lower()
-    for palabra in limites["palabras_prohibidas"]:
-        if palabra in texto_lower:
-            return False, mensajes["consulta_fuera_tema"]
+    # Matcher precompilado y cacheado por la versión de la configuración (la misma clave que usa app.py)
+    configuracion = almacen_configuracion.obtener()
+    clasificador = obtener_clasificador(configuracion.version, configuracion.limites.get("palabras_prohibidas", []))
+    if clasificador.clasificar(texto).bloqueado:
+        return False, configuracion.mensajes["consulta_fuera_tema"]
     
     return True, None
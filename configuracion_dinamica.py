@@ -0,0 +1,249 @@
+"""
+Configuración del agente editable en caliente (system prompt, configuración, límites, mensajes y proveedor de IA)
+Cada cambio crea una configuración inmutable que reemplaza a la anterior de una sola vez y se propaga a los
+demás workers del nodo por config_dinamico.json y a los demás nodos por Redis (pub/sub)
+"""
+
+import os
+import json
+import time
+import copy
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+
+from config_agente import obtener_system_prompt, obtener_configuracion, obtener_limites, obtener_mensajes, calcular_version_config
+
+logger = logging.getLogger(__name__)
+
+# version: hash del prompt, la configuración, los límites y los mensajes (invalida las cachés de prompts
+# y respuestas); huella: hash de todo, incluido el proveedor (identifica la configuración entre workers)
+ConfiguracionAgente = namedtuple(
+    'ConfiguracionAgente', ['system_prompt', 'config', 'limites', 'mensajes', 'proveedor', 'version', 'huella']
+)
+
+# Segundos entre reintentos de la suscripción a Redis
+ESPERA_RECONEXION = 5.0
+
+
+def crear_configuracion(system_prompt, config, limites, mensajes, proveedor):
+    """Configuración inmutable a partir de sus partes (se copian: nadie más tiene referencias a ellas)"""
+    config, limites, mensajes = copy.deepcopy((config, limites, mensajes))
+    version = calcular_version_config(system_prompt, config, limites, mensajes)
+    huella = hashlib.sha256(f"{version}|{proveedor}".encode('utf-8')).hexdigest()[:16]
+    return ConfiguracionAgente(system_prompt, config, limites, mensajes, proveedor, version, huella)
+
+
+def configuracion_por_defecto(proveedor):
+    """Configuración de config_agente.py con el proveedor dado"""
+    return crear_configuracion(obtener_system_prompt(), obtener_configuracion(), obtener_limites(), obtener_mensajes(), proveedor)
+
+
+class AlmacenConfiguracion:
+    """Configuración actual del agente, compartida por todo el proceso
+
+    Los lectores toman la configuración con obtener() y usan sus campos: nunca ven una mezcla de dos
+    versiones. El archivo se revisa como máximo una vez cada intervalo_verificacion segundos (un stat).
+    De Redis solo se aplica la configuración publicada por nodos con los mismos valores por defecto
+    (config_agente.py de la misma versión) y guardada después que la local.
+    """
+
+    def __init__(self, ruta='config_dinamico.json', proveedor=None, intervalo_verificacion=1.0,
+                 redis_client=None, prefijo='config_agente_'):
+        self.ruta = ruta
+        self.proveedor_defecto = proveedor or 'auto'
+        self.intervalo_verificacion = intervalo_verificacion
+        self.redis_client = redis_client
+        self.prefijo = prefijo
+        self._lock = threading.Lock()
+        self._suscriptores = []
+        # Versión de la configuración de config_agente.py: identifica a los nodos del mismo despliegue
+        self.base = configuracion_por_defecto(self.proveedor_defecto).version
+        # Momento (time.time()) en que se guardó la configuración actual; 0 para la por defecto
+        self._guardada_en = 0.0
+        self._firma_archivo = self._firma()
+        self._ultima_verificacion = time.monotonic()
+        self._actual = self._leer_archivo()
+        self._pid_escucha = None
+
+    def obtener(self):
+        """Retorna la configuración actual (recargando el archivo si otro worker lo cambió)"""
+        if time.monotonic() - self._ultima_verificacion >= self.intervalo_verificacion:
+            self._verificar_archivo()
+        return self._actual
+
+    def suscribir(self, funcion):
+        """Registra funcion(anterior, nueva), llamada cada vez que cambia la configuración"""
+        self._suscriptores.append(funcion)
+
+    def guardar(self, **cambios):
+        """Reemplaza las partes dadas (system_prompt, config, limites, mensajes, proveedor) y propaga el cambio"""
+        with self._lock:
+            actual = self._actual._asdict()
+            actual.update((campo, valor) for campo, valor in cambios.items() if valor is not None)
+            nueva = crear_configuracion(
+                actual['system_prompt'], actual['config'], actual['limites'], actual['mensajes'], actual['proveedor']
+            )
+            self._escribir_archivo(nueva)
+            self._guardada_en = time.time()
+            self._reemplazar(nueva)
+        self._publicar(nueva, self._guardada_en)
+        return nueva
+
+    def restablecer(self):
+        """Vuelve a la configuración de config_agente.py, conservando el proveedor de IA elegido"""
+        with self._lock:
+            nueva = configuracion_por_defecto(self._actual.proveedor)
+            if nueva.proveedor == self.proveedor_defecto:
+                if os.path.exists(self.ruta):
+                    os.remove(self.ruta)
+                self._firma_archivo = None
+            else:
+                self._escribir_archivo(nueva, solo_proveedor=True)
+            self._guardada_en = time.time()
+            self._reemplazar(nueva)
+        self._publicar(nueva, self._guardada_en)
+        return nueva
+
+    def _reemplazar(self, nueva):
+        """Publica la configuración nueva (con el lock) y avisa a los suscriptores si cambió"""
+        anterior = self._actual
+        if nueva.huella == anterior.huella:
+            return
+        self._actual = nueva
+        logger.info(f"Configuración del agente actualizada ({anterior.huella} -> {nueva.huella})")
+        for funcion in self._suscriptores:
+            try:
+                funcion(anterior, nueva)
+            except Exception as e:
+                logger.error(f"Error notificando el cambio de configuración: {e}")
+
+    # Archivo local (compartido por los workers del nodo)
+
+    def _firma(self):
+        try:
+            estado = os.stat(self.ruta)
+            return estado.st_mtime_ns, estado.st_size
+        except OSError:
+            return None
+
+    def _verificar_archivo(self):
+        with self._lock:
+            if time.monotonic() - self._ultima_verificacion < self.intervalo_verificacion:
+                return
+            self._ultima_verificacion = time.monotonic()
+            firma = self._firma()
+            if firma == self._firma_archivo:
+                return
+            self._firma_archivo = firma
+            self._reemplazar(self._leer_archivo())
+
+    def _leer_archivo(self):
+        """Configuración de config_dinamico.json, o la por defecto si no existe o no se puede leer"""
+        proveedor = self.proveedor_defecto
+        self._guardada_en = 0.0
+        try:
+            if os.path.exists(self.ruta):
+                with open(self.ruta, 'r', encoding='utf-8') as f:
+                    datos = json.load(f)
+                self._guardada_en = os.path.getmtime(self.ruta)
+                logger.info(f"Configuración dinámica cargada desde {self.ruta}")
+                return crear_configuracion(
+                    datos.get("system_prompt", obtener_system_prompt()),
+                    datos.get("config_agente", obtener_configuracion()),
+                    datos.get("limites", obtener_limites()),
+                    datos.get("mensajes", obtener_mensajes()),
+                    datos.get("proveedor_ia", proveedor)
+                )
+        except Exception as e:
+            logger.error(f"Error cargando configuración dinámica: {e}")
+            logger.info("Usando configuración por defecto como fallback")
+        return configuracion_por_defecto(proveedor)
+
+    def _escribir_archivo(self, configuracion, solo_proveedor=False):
+        """Escribe el archivo de una vez (archivo temporal y reemplazo): otro worker nunca lee uno a medias"""
+        datos = {} if solo_proveedor else {
+            "system_prompt": configuracion.system_prompt,
+            "config_agente": configuracion.config,
+            "limites": configuracion.limites,
+            "mensajes": configuracion.mensajes,
+        }
+        if configuracion.proveedor != self.proveedor_defecto:
+            datos["proveedor_ia"] = configuracion.proveedor
+        temporal = f"{self.ruta}.{os.getpid()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, self.ruta)
+        self._firma_archivo = self._firma()
+
+    # Redis (compartido entre nodos)
+
+    def _publicar(self, configuracion, guardada_en):
+        if not self.redis_client:
+            return
+        datos = dict(configuracion._asdict(), base=self.base, guardada_en=guardada_en)
+        try:
+            self.redis_client.set(self.prefijo + 'actual', json.dumps(datos, ensure_ascii=False))
+            self.redis_client.publish(self.prefijo + 'cambios', configuracion.huella)
+        except Exception as e:
+            logger.warning(f"No se pudo propagar la configuración por Redis: {e}")
+
+    def _leer_redis(self):
+        """Aplica la configuración publicada en Redis si es de este despliegue, distinta y más nueva que la actual
+
+        Una clave que quedó de un despliegue anterior (otro config_agente.py) no pisa los valores por defecto
+        de la versión nueva.
+        """
+        datos = self.redis_client.get(self.prefijo + 'actual')
+        if not datos:
+            return
+        datos = json.loads(datos)
+        if datos.get('huella') == self._actual.huella:
+            return
+        if datos.get('base') != self.base:
+            logger.info("Configuración en Redis de otro despliegue ignorada")
+            return
+        nueva = crear_configuracion(
+            datos['system_prompt'], datos['config'], datos['limites'], datos['mensajes'], datos['proveedor']
+        )
+        with self._lock:
+            if datos.get('guardada_en', 0.0) <= self._guardada_en:
+                return
+            self._guardada_en = datos['guardada_en']
+            self._reemplazar(nueva)
+
+    def escuchar(self):
+        """Inicia (una vez por proceso) el hilo que aplica los cambios publicados por otros nodos"""
+        if not self.redis_client or self._pid_escucha == os.getpid():
+            return
+        self._pid_escucha = os.getpid()
+        threading.Thread(target=self._escuchar, name='config-agente', daemon=True).start()
+
+    def _escuchar(self):
+        while True:
+            suscripcion = None
+            try:
+                suscripcion = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                suscripcion.subscribe(self.prefijo + 'cambios')
+                # Cambios publicados mientras el worker no estaba suscrito
+                self._leer_redis()
+                for mensaje in suscripcion.listen():
+                    if mensaje.get('type') == 'message':
+                        self._leer_redis()
+            except Exception as e:
+                logger.warning(f"Suscripción de configuración en Redis interrumpida: {e}")
+            finally:
+                if suscripcion is not None:
+                    try:
+                        suscripcion.close()
+                    except Exception:
+                        pass
+            time.sleep(ESPERA_RECONEXION)
+
+
+# Configuración compartida por todo el proceso
+almacen_configuracion = AlmacenConfiguracion(
+    proveedor=os.getenv('PROVEEDOR_IA', 'auto'),
+    intervalo_verificacion=float(os.getenv('CONFIG_VERIFICACION_SEGUNDOS', 1.0))
+)
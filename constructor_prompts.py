@@ -0,0 +1,122 @@
+"""
+Construcción de prompts con caché por versión de inventario y de configuración
+El bloque system prompt + inventario se renderiza una sola vez y solo se agrega la consulta por mensaje
+"""
+
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Plantillas de prompt: (encabezado con system prompt e inventario, cierre con la consulta)
+PLANTILLAS = {
+    "siliconflow": (
+        """
+        {system_prompt}
+
+        INVENTARIO ({total} productos):
+        {inventario}
+
+        CONSULTA: """,
+        """
+
+        Responde solo con información del inventario.
+        """
+    ),
+    "gemini": (
+        """
+    {system_prompt}
+
+    DATOS DEL INVENTARIO:
+    Columnas disponibles: {columnas}
+
+    Inventario completo:
+    {inventario}
+
+    CONSULTA DEL USUARIO: """,
+        """
+
+    Responde siguiendo las reglas establecidas y usando solo la información del inventario.
+    """
+    ),
+    "multimodal": (
+        """
+        {system_prompt}
+
+        DATOS DEL INVENTARIO:
+        {inventario}
+
+        TAREA: Analiza este """,
+        """ y busca información relacionada en el inventario.
+
+        Responde siguiendo las reglas establecidas y usando solo la información del inventario.
+        """
+    ),
+}
+
+
+def renderizar_inventario(df):
+    """Convierte el DataFrame del inventario en el texto que se envía al modelo"""
+    if df.empty:
+        return "No hay datos de inventario"
+    return df.to_string()
+
+
+class ConstructorPrompts:
+    """Cachea el contexto de cada plantilla por (versión de inventario, versión de configuración)
+
+    La versión de inventario de un subconjunto de filas incluye sus posiciones: cada selección distinta
+    ocupa su propia entrada.
+    """
+
+    def __init__(self, max_entradas=256):
+        self.max_entradas = max_entradas
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def contexto(self, plantilla, system_prompt, df, version_inventario, version_config):
+        """Retorna el encabezado de la plantilla (system prompt + inventario) ya renderizado"""
+        # Sin versión de inventario (DataFrame ajeno al almacén) no se puede cachear
+        if version_inventario is None:
+            return self._renderizar(plantilla, system_prompt, df)
+
+        clave = (plantilla, version_inventario, version_config)
+        with self._lock:
+            texto = self._cache.get(clave)
+            if texto is not None:
+                self._cache.move_to_end(clave)
+                return texto
+
+        texto = self._renderizar(plantilla, system_prompt, df)
+        with self._lock:
+            self._cache[clave] = texto
+            while len(self._cache) > self.max_entradas:
+                self._cache.popitem(last=False)
+        # Los subconjuntos se renderizan por consulta: solo el inventario completo merece un registro INFO
+        nivel = logging.DEBUG if isinstance(version_inventario, str) else logging.INFO
+        logger.log(nivel, f"Prompt '{plantilla}' renderizado para inventario v{version_inventario} ({len(texto)} caracteres)")
+        return texto
+
+    def construir(self, plantilla, consulta, system_prompt, df, version_inventario, version_config):
+        """Retorna el prompt completo agregando la consulta al contexto cacheado"""
+        encabezado = self.contexto(plantilla, system_prompt, df, version_inventario, version_config)
+        return encabezado + consulta + PLANTILLAS[plantilla][1]
+
+    def limpiar(self):
+        """Descarta todos los contextos cacheados"""
+        with self._lock:
+            self._cache.clear()
+
+    def _renderizar(self, plantilla, system_prompt, df):
+        """Renderiza el encabezado de una plantilla"""
+        return PLANTILLAS[plantilla][0].format(
+            system_prompt=system_prompt,
+            total=len(df),
+            columnas=list(df.columns),
+            inventario=renderizar_inventario(df)
+        )
+
+
+# Constructor compartido por todo el proceso
+constructor_prompts = ConstructorPrompts()
@@ -0,0 +1,576 @@
+"""
+Motor de consultas rápidas sobre el inventario
+Responde directamente las consultas simples de precio, stock y proveedor sin llamar a la IA
+"""
+
+import re
+import copy
+import math
+import threading
+import logging
+from collections import defaultdict
+
+# NumPy se importa dentro de los métodos que lo usan: este módulo se carga al arrancar la aplicación y
+# NumPy recién al construir el primer índice
+
+from busqueda_inventario import normalizar_texto, tokenizar, LARGO_RAIZ
+from resolutor_productos import resolutor_productos, palabras_normalizadas
+
+logger = logging.getLogger(__name__)
+
+# Palabras (normalizadas, sin acentos) que identifican cada intención
+INTENCIONES = {
+    'precio': {'precio', 'precios', 'cuesta', 'cuestan', 'vale', 'valen', 'costo', 'coste', 'cuanto'},
+    'stock': {'stock', 'disponible', 'disponibles', 'disponibilidad', 'hay', 'quedan', 'unidades', 'existencias', 'cuantos', 'cuantas'},
+    'proveedor': {'proveedor', 'proveedores', 'fabricante', 'distribuidor', 'surte', 'provee'},
+    'lista': {'inventario', 'catalogo', 'lista', 'productos'},
+}
+
+# Opción de CONFIG que debe estar activa y columna necesaria para responder cada intención
+OPCION_INTENCION = {
+    'precio': ('incluir_precios', 'Precio'),
+    'stock': ('incluir_stock', 'Stock'),
+    'proveedor': ('incluir_proveedores', 'Proveedor'),
+}
+
+# Palabras que no aportan a la identificación del producto
+PALABRAS_VACIAS = {
+    'el', 'la', 'los', 'las', 'un', 'una', 'de', 'del', 'al', 'a', 'en', 'y', 'o', 'que', 'es',
+    'me', 'por', 'para', 'con', 'tiene', 'tienen', 'tienes', 'cual', 'hola', 'favor', 'dime',
+}
+
+# Máximo de productos para responder la lista completa sin IA
+MAX_PRODUCTOS_LISTA = 30
+
+# Filtros de las listas por categoría, proveedor o stock (requieren la base indexada del inventario)
+PALABRAS_AGOTADO = {'agotado', 'agotados', 'agotada', 'agotadas'}
+PALABRAS_POCO = {'poco', 'poca', 'pocos', 'pocas', 'bajo', 'baja'}
+PALABRAS_MENOS = {'menos', 'menor', 'maximo', 'hasta'}
+PALABRAS_MAS = {'mas', 'mayor', 'minimo', 'desde', 'sobre'}
+PALABRAS_CANTIDAD_STOCK = {'stock', 'unidades', 'existencias'}
+PALABRAS_FILTRO = (
+    PALABRAS_AGOTADO | PALABRAS_POCO | PALABRAS_MENOS | PALABRAS_MAS
+    | {'sin', 'categoria', 'categorias', 'marca', 'marcas', 'solo', 'todos', 'todas'}
+)
+
+# Stock máximo considerado "poco stock"
+STOCK_BAJO = 5
+
+# El mejor candidato debe superar al segundo por este factor para considerarse inequívoco
+MARGEN_AMBIGUEDAD = 1.5
+
+# Letras distintas toleradas entre una palabra de la consulta y una del nombre (error de tipeo),
+# según el largo de la palabra; las palabras con números (modelos: "15", "s24") deben coincidir
+ERRORES_TIPEO = ((5, 1), (None, 2))
+
+_PATRON_PALABRA = re.compile(r'[a-z0-9]+')
+
+
+def formatear_precio(valor):
+    """Formatea un precio como en las respuestas del agente ($1,200)"""
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        return str(valor)
+    return f"${valor:,.0f}" if valor.is_integer() else f"${valor:,.2f}"
+
+
+def presente(fila, columna):
+    """True si la fila (dict o Series) tiene un valor en la columna
+
+    Las filas agregadas o modificadas por /api/inventario/delta pueden no tener todas las columnas.
+    """
+    import pandas as pd
+    return columna in fila and pd.notna(fila[columna])
+
+
+def _distancia_edicion(a, b, maximo):
+    """Distancia de Levenshtein entre a y b, o maximo + 1 si la supera"""
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    anterior = list(range(len(b) + 1))
+    for i, letra in enumerate(a, 1):
+        actual = [i]
+        for j, otra in enumerate(b, 1):
+            actual.append(min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (letra != otra)))
+        if min(actual) > maximo:
+            return maximo + 1
+        anterior = actual
+    return anterior[-1]
+
+
+def palabra_en_nombre(palabra, palabras_nombre):
+    """True si la palabra (normalizada) aparece en el nombre, igual, con la misma raíz o con un error de tipeo"""
+    raiz = palabra[:LARGO_RAIZ]
+    if any(p[:LARGO_RAIZ] == raiz for p in palabras_nombre):
+        return True
+    if any(c.isdigit() for c in palabra):
+        return False
+    maximo = next(errores for largo, errores in ERRORES_TIPEO if largo is None or len(palabra) <= largo)
+    return any(_distancia_edicion(palabra, p, maximo) <= maximo for p in palabras_nombre)
+
+
+def nombre_cubre_consulta(palabras, nombre):
+    """True si todas las palabras de producto de la consulta están en el nombre
+
+    Evita responder con otro producto cuando la consulta nombra uno que no existe
+    ("iphone 15 pro" no es el "iPhone 14").
+    """
+    palabras_nombre = palabras_normalizadas(nombre)
+    return all(palabra_en_nombre(palabra, palabras_nombre) for palabra in palabras)
+
+
+def palabras_de_producto(palabras):
+    """Palabras de la consulta que pueden nombrar al producto (sin palabras vacías ni de intención)"""
+    return [
+        p for p in palabras
+        if p not in PALABRAS_VACIAS and not any(p in INTENCIONES[i] for i in INTENCIONES)
+    ]
+
+
+class CatalogoProductos:
+    """Tokens de los nombres de producto de una versión del inventario"""
+
+    def __init__(self, df):
+        import numpy as np
+        self.nombres = df['Producto'].astype(str).tolist()
+        self.tokens = [set(tokenizar(nombre)) for nombre in self.nombres]
+        self.total = len(self.nombres)
+        posiciones = defaultdict(list)
+        for posicion, tokens in enumerate(self.tokens):
+            for token in tokens:
+                posiciones[token].append(posicion)
+        # Posiciones de los productos que contienen cada token, para puntuar con NumPy
+        self.postings = {token: np.array(lista, dtype=np.int64) for token, lista in posiciones.items()}
+
+    def idf(self, token):
+        return math.log(1 + self.total / len(self.postings[token]))
+
+    def actualizado(self, df, posiciones):
+        """Copia del catálogo para df, que solo difiere del anterior en las posiciones dadas y en su largo
+
+        Solo se rehacen las listas de posiciones de los tokens afectados; este catálogo no se modifica.
+        """
+        import numpy as np
+        total = len(df)
+        nuevas = [p for p in posiciones if p < total]
+        quitar, agregar = defaultdict(list), defaultdict(list)
+        for posicion in set(nuevas) | set(range(total, self.total)):
+            if posicion < self.total:
+                for token in self.tokens[posicion]:
+                    quitar[token].append(posicion)
+
+        catalogo = copy.copy(self)
+        catalogo.total = total
+        catalogo.nombres = self.nombres[:total] + [''] * max(0, total - self.total)
+        catalogo.tokens = self.tokens[:total] + [set()] * max(0, total - self.total)
+        productos = df['Producto']
+        for posicion in nuevas:
+            nombre = str(productos.iat[posicion])
+            catalogo.nombres[posicion] = nombre
+            catalogo.tokens[posicion] = set(tokenizar(nombre))
+            for token in catalogo.tokens[posicion]:
+                agregar[token].append(posicion)
+
+        catalogo.postings = dict(self.postings)
+        for token in set(quitar) | set(agregar):
+            lista = catalogo.postings.get(token)
+            if lista is not None and token in quitar:
+                lista = lista[~np.isin(lista, quitar[token])]
+            if token in agregar:
+                nuevas_posiciones = np.array(agregar[token], dtype=np.int64)
+                lista = nuevas_posiciones if lista is None else np.concatenate([lista, nuevas_posiciones])
+            if lista is not None and len(lista):
+                catalogo.postings[token] = lista
+            else:
+                catalogo.postings.pop(token, None)
+        return catalogo
+
+    def resolver_token(self, token):
+        """Retorna el token si está en el catálogo, o None (los errores de tipeo los resuelve resolutor_productos)"""
+        return token if token in self.postings else None
+
+    def buscar(self, palabras):
+        """Retorna (posición, puntaje, segundo_puntaje) del producto más probable"""
+        return self.buscar_lote([palabras])[0]
+
+    def buscar_lote(self, lista_palabras):
+        """(posición, puntaje, segundo_puntaje) del producto más probable para cada consulta
+
+        Todas las consultas se puntúan en una sola pasada: cada par (consulta, producto) suma el idf
+        de los tokens en común y se toman los dos mejores productos de cada consulta.
+        """
+        import numpy as np
+        resultados = [(None, 0.0, 0.0)] * len(lista_palabras)
+        consultas, posiciones, pesos = [], [], []
+        for indice, palabras in enumerate(lista_palabras):
+            tokens = {self.resolver_token(t) for t in tokenizar(' '.join(palabras))}
+            tokens.discard(None)
+            for token in tokens:
+                lista = self.postings[token]
+                consultas.append(np.full(len(lista), indice, dtype=np.int64))
+                posiciones.append(lista)
+                pesos.append(np.full(len(lista), self.idf(token)))
+        if not consultas:
+            return resultados
+
+        # Clave única por (consulta, producto), ordenada por consulta: se suman los pesos de sus tokens comunes
+        claves, inversa = np.unique(np.concatenate(consultas) * self.total + np.concatenate(posiciones), return_inverse=True)
+        puntajes = np.bincount(inversa, weights=np.concatenate(pesos))
+        indices, posiciones = np.divmod(claves, self.total)
+        _, inicios = np.unique(indices, return_index=True)
+        for inicio, fin in zip(inicios.tolist(), inicios[1:].tolist() + [len(claves)]):
+            grupo = puntajes[inicio:fin]
+            mejor = float(grupo.max())
+            empatados = np.flatnonzero(grupo == mejor)
+            # A igual puntaje gana la última posición, como con sort(reverse=True)
+            posicion = int(posiciones[inicio + empatados[-1]])
+            if len(empatados) > 1:
+                segundo = mejor
+            else:
+                segundo = float(np.partition(grupo, -2)[-2]) if len(grupo) > 1 else 0.0
+            resultados[int(indices[inicio])] = (posicion, mejor, segundo)
+        return resultados
+
+
+class MotorConsultasRapidas:
+    """Detecta intención y producto en la consulta y responde desde el DataFrame"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._catalogo = None
+        # Catálogo de la versión anterior, para las consultas que empezaron antes de un lote de cambios
+        self._anterior = (None, None)
+        self._filtros = (None, None, None)
+        self.consultas = 0
+        self.aciertos = 0
+
+    def obtener_catalogo(self, df, version):
+        """Retorna el catálogo para la versión dada, construyéndolo si hace falta"""
+        if version is None:
+            return CatalogoProductos(df)
+        with self._lock:
+            if self._version != version:
+                if self._anterior[0] == version:
+                    return self._anterior[1]
+                self._catalogo = CatalogoProductos(df)
+                self._version = version
+            return self._catalogo
+
+    def actualizar(self, df, version_anterior, version, posiciones):
+        """Lleva el catálogo de version_anterior a version rehaciendo solo las posiciones modificadas"""
+        with self._lock:
+            if self._version != version_anterior or self._catalogo is None:
+                return
+            self._anterior = (self._version, self._catalogo)
+            self._catalogo = self._catalogo.actualizado(df, posiciones)
+            self._version = version
+
+    def obtener_filtros(self, consultas):
+        """Raíces de cada categoría y proveedor de la base, para reconocerlos en la consulta"""
+        with self._lock:
+            origen, revision, filtros = self._filtros
+            if origen is consultas and revision == consultas.revision:
+                return filtros
+        revision = consultas.revision
+        filtros = {}
+        for atributo in ('categoria', 'proveedor'):
+            valores = consultas.valores(atributo)
+            if valores is None:
+                return None
+            filtros[atributo] = [(set(tokenizar(valor)), valor) for valor in valores]
+        with self._lock:
+            self._filtros = (consultas, revision, filtros)
+        return filtros
+
+    def detectar_intenciones(self, palabras):
+        """Retorna las intenciones presentes en la consulta"""
+        return [intencion for intencion, claves in INTENCIONES.items() if claves.intersection(palabras)]
+
+    def responder(self, query_texto, df, version, config, consultas=None):
+        """Retorna la respuesta si la consulta es simple, o None para escalar a la IA
+
+        consultas: InventarioSQLite del snapshot de df (habilita las listas filtradas y la búsqueda por nombre indexada)
+        """
+        return self.responder_lote([query_texto], df, version, config, consultas)[0]
+
+    def responder_lote(self, textos, df, version, config, consultas=None):
+        """Respuestas del camino rápido para varias consultas (None en las que hay que escalar a la IA)
+
+        Los productos de todas las consultas se resuelven juntos y sus filas se leen del DataFrame una sola vez.
+        """
+        respuestas = [None] * len(textos)
+        try:
+            if not df.empty and 'Producto' in df.columns:
+                self._responder_lote(textos, df, version, config, consultas, respuestas)
+        except Exception as e:
+            logger.error(f"Error en consulta rápida: {e}")
+
+        with self._lock:
+            self.consultas += len(textos)
+            self.aciertos += sum(1 for respuesta in respuestas if respuesta is not None)
+        return respuestas
+
+    def _responder_lote(self, textos, df, version, config, consultas, respuestas):
+        """Lógica de la consulta rápida (sin contabilizar métricas); completa respuestas en su lugar
+
+        Un error en una consulta solo escala esa consulta a la IA: las demás del lote se siguen respondiendo.
+        """
+        pendientes = []
+        for indice, texto in enumerate(textos):
+            try:
+                resultado = self._analizar(texto, df, config, consultas)
+            except Exception as e:
+                logger.error(f"Error en consulta rápida: {e}")
+                continue
+            if isinstance(resultado, str):
+                respuestas[indice] = resultado
+            elif resultado is not None:
+                pendientes.append((indice, resultado))
+        if not pendientes:
+            return
+
+        lista_palabras = [palabras for _, (_, palabras) in pendientes]
+        try:
+            posiciones = self._buscar_productos(lista_palabras, df, version, consultas)
+        except Exception as e:
+            logger.error(f"Error resolviendo los productos del lote, se resuelven por separado: {e}")
+            posiciones = [self._buscar_producto_aislado(palabras, df, version, consultas) for palabras in lista_palabras]
+        encontradas = sorted({posicion for posicion in posiciones if posicion is not None})
+        if not encontradas:
+            return
+        filas = dict(zip(encontradas, df.iloc[encontradas].to_dict('records')))
+        for (indice, (intenciones, _)), posicion in zip(pendientes, posiciones):
+            if posicion is None:
+                continue
+            try:
+                respuestas[indice] = self._formatear_producto(filas[posicion], intenciones)
+            except Exception as e:
+                logger.error(f"Error en consulta rápida: {e}")
+
+    def _buscar_producto_aislado(self, palabras, df, version, consultas):
+        """Posición del producto de una sola consulta, o None si no hay uno inequívoco o falla la búsqueda"""
+        try:
+            return self._buscar_productos([palabras], df, version, consultas)[0]
+        except Exception as e:
+            logger.error(f"Error en consulta rápida: {e}")
+            return None
+
+    def _analizar(self, query_texto, df, config, consultas):
+        """Respuesta directa (str), (intenciones, palabras del producto) a resolver, o None para escalar"""
+        palabras = _PATRON_PALABRA.findall(normalizar_texto(query_texto))
+        intenciones = self.detectar_intenciones(palabras)
+        if not intenciones:
+            return None
+
+        palabras_producto = palabras_de_producto(palabras)
+
+        if 'lista' in intenciones and consultas is not None:
+            # "productos de audio", "productos de Logitech", "productos con poco stock"
+            respuesta = self._responder_lista_filtrada(palabras, palabras_producto, df, consultas, config)
+            if respuesta is not None:
+                return respuesta
+
+        if not palabras_producto:
+            # "inventario" o "lista de productos" sin producto concreto
+            if intenciones == ['lista'] and len(df) <= MAX_PRODUCTOS_LISTA:
+                return self._responder_lista(df, config)
+            return None
+
+        intenciones = [i for i in intenciones if i != 'lista']
+        if not intenciones:
+            return None
+        for intencion in intenciones:
+            opcion, columna = OPCION_INTENCION[intencion]
+            if not config.get(opcion, True) or columna not in df.columns:
+                return None
+        return intenciones, palabras_producto
+
+    def _formatear_producto(self, fila, intenciones):
+        """Respuesta con precio, stock o proveedor de un producto (fila como dict), o None si le falta el dato"""
+        if not all(presente(fila, OPCION_INTENCION[intencion][1]) for intencion in intenciones):
+            return None
+        lineas = []
+        for intencion in intenciones:
+            if intencion == 'precio':
+                lineas.append(f"💰 {fila['Producto']}: {formatear_precio(fila['Precio'])}")
+            elif intencion == 'stock':
+                lineas.append(f"📦 {fila['Producto']}: {int(fila['Stock'])} unidades disponibles")
+            elif intencion == 'proveedor':
+                lineas.append(f"🏭 {fila['Producto']}: proveedor {fila['Proveedor']}")
+        return "\n".join(lineas)
+
+    def _buscar_productos(self, lista_palabras, df, version, consultas):
+        """Posición del producto nombrado en cada consulta, o None si no hay uno inequívoco
+
+        Primero el catálogo en memoria, con todas las consultas juntas; las que tienen palabras que no
+        están en ningún nombre (errores de tipeo) se resuelven con la similitud aproximada de los nombres,
+        y las que siguen sin un resultado inequívoco, con el índice FTS5 de la base (si la hay).
+        """
+        catalogo = self.obtener_catalogo(df, version)
+
+        def aceptada(palabras, posicion):
+            # El producto elegido debe contener todas las palabras de la consulta: si alguna falta,
+            # la consulta nombra otro producto y responde la IA
+            return posicion is not None and nombre_cubre_consulta(palabras, catalogo.nombres[posicion])
+
+        posiciones = [None] * len(lista_palabras)
+        for indice, (posicion, puntaje, segundo) in enumerate(catalogo.buscar_lote(lista_palabras)):
+            if posicion is not None and puntaje >= segundo * MARGEN_AMBIGUEDAD and aceptada(lista_palabras[indice], posicion):
+                posiciones[indice] = posicion
+
+        for indice, palabras in enumerate(lista_palabras):
+            if posiciones[indice] is not None:
+                continue
+            # Si todas las palabras existen y aun así no hay un resultado, la consulta es ambigua o
+            # combina palabras de productos distintos
+            if all(t in catalogo.postings for t in tokenizar(' '.join(palabras))):
+                continue
+            posicion = self._resolver_aproximado(palabras, df, version)
+            if posicion is None and consultas is not None:
+                resultados = consultas.buscar_por_nombre(' '.join(palabras), limite=2)
+                if resultados and resultados[0][0] < len(df):
+                    segundo = resultados[1][1] if len(resultados) > 1 else 0.0
+                    if resultados[0][1] >= segundo * MARGEN_AMBIGUEDAD:
+                        posicion = resultados[0][0]
+            if aceptada(palabras, posicion):
+                posiciones[indice] = posicion
+        return posiciones
+
+    def _resolver_aproximado(self, palabras, df, version):
+        """Posición del nombre más parecido a las palabras si es inequívoco, o None"""
+        candidatos = resolutor_productos.buscar(palabras, df, version, k=2)
+        if not candidatos:
+            return None
+        segundo = candidatos[1][1] if len(candidatos) > 1 else 0.0
+        return candidatos[0][0] if candidatos[0][1] >= segundo * MARGEN_AMBIGUEDAD else None
+
+    def buscar_producto(self, query_texto, df, version, consultas=None):
+        """Fila (dict) del producto nombrado en la consulta, o None si no hay uno inequívoco"""
+        if df.empty or 'Producto' not in df.columns:
+            return None
+        palabras = palabras_de_producto(_PATRON_PALABRA.findall(normalizar_texto(query_texto)))
+        if not palabras:
+            return None
+        posicion = self._buscar_productos([palabras], df, version, consultas)[0]
+        return df.iloc[posicion].to_dict() if posicion is not None else None
+
+    def _detectar_rango_stock(self, palabras):
+        """(mínimo, máximo, descripción) del filtro de stock de la consulta, o None"""
+        if PALABRAS_AGOTADO.intersection(palabras):
+            return None, 0, "agotados"
+        for anterior, palabra in zip(palabras, palabras[1:]):
+            if anterior == 'sin' and palabra in PALABRAS_CANTIDAD_STOCK:
+                return None, 0, "agotados"
+        if not PALABRAS_CANTIDAD_STOCK.intersection(palabras):
+            return None
+        for posicion, palabra in enumerate(palabras):
+            if palabra in PALABRAS_POCO:
+                return None, STOCK_BAJO, f"stock hasta {STOCK_BAJO}"
+            if palabra in PALABRAS_MENOS or palabra in PALABRAS_MAS:
+                # "menos de 10 unidades", "stock mayor a 50": el primer número después del comparador
+                numero = next((p for p in palabras[posicion + 1:posicion + 4] if p.isdigit()), None)
+                if numero is None:
+                    continue
+                if palabra in PALABRAS_MENOS:
+                    maximo = int(numero) - (palabra in ('menos', 'menor'))
+                    return None, maximo, f"stock hasta {maximo}"
+                minimo = int(numero) + (palabra in ('mas', 'mayor', 'sobre'))
+                return minimo, None, f"stock desde {minimo}"
+        return None
+
+    def _detectar_valor(self, raices_consulta, opciones):
+        """Categoría o proveedor (normalizado) cuyas raíces aparecen todas en la consulta; el más específico"""
+        mejor = None
+        for raices, valor in opciones:
+            if raices and raices <= raices_consulta and (mejor is None or len(raices) > len(mejor[0])):
+                mejor = (raices, valor)
+        return mejor
+
+    def _responder_lista_filtrada(self, palabras, palabras_producto, df, consultas, config):
+        """Lista los productos de una categoría, de un proveedor o en un rango de stock, consultando la base"""
+        filtros = self.obtener_filtros(consultas)
+        if filtros is None:
+            return None
+
+        raices_consulta = set(tokenizar(' '.join(palabras_producto)))
+        categoria = self._detectar_valor(raices_consulta, filtros['categoria'])
+        proveedor = self._detectar_valor(raices_consulta, filtros['proveedor'])
+        rango = self._detectar_rango_stock(palabras)
+        if categoria is None and proveedor is None and rango is None:
+            return None
+        if proveedor is not None and not config.get('incluir_proveedores', True):
+            return None
+        if rango is not None and (not config.get('incluir_stock', True) or 'Stock' not in df.columns):
+            return None
+
+        # Si quedan palabras que no son parte de los filtros, la consulta es sobre un producto concreto
+        usadas = (categoria[0] if categoria else set()) | (proveedor[0] if proveedor else set())
+        restantes = [
+            p for p in palabras_producto
+            if p[:LARGO_RAIZ] not in usadas and p not in PALABRAS_FILTRO and not p.isdigit()
+        ]
+        if restantes:
+            return None
+
+        minimo, maximo, descripcion_rango = rango if rango else (None, None, None)
+        resultado = consultas.listar(
+            categoria=categoria[1] if categoria else None,
+            proveedor=proveedor[1] if proveedor else None,
+            stock_minimo=minimo, stock_maximo=maximo, limite=MAX_PRODUCTOS_LISTA
+        )
+        if resultado is None:
+            return None
+        filas, total = resultado
+        # La base puede ir unos milisegundos por detrás de los cambios aplicados en memoria
+        filas = [fila for fila in filas if fila < len(df)]
+
+        partes = []
+        for encontrado, columna in ((categoria, 'Categoria'), (proveedor, 'Proveedor')):
+            if encontrado is not None:
+                # Nombre tal como figura en el inventario (el de la base está normalizado)
+                partes.append(str(df.iloc[filas[0]][columna]) if filas and columna in df.columns else encontrado[1])
+        if descripcion_rango:
+            partes.append(descripcion_rango)
+        titulo = ' · '.join(partes)
+        if not total:
+            return f"📦 No hay productos en el inventario para: {titulo}"
+
+        mostrar_precio = config.get('incluir_precios', True) and 'Precio' in df.columns
+        lineas = [f"📦 *PRODUCTOS: {titulo.upper()}* ({total} productos)", ""]
+        for _, fila in df.iloc[filas].iterrows():
+            linea = f"🔹 {fila['Producto']}"
+            if mostrar_precio and presente(fila, 'Precio'):
+                linea += f" - {formatear_precio(fila['Precio'])}"
+            if rango is not None and presente(fila, 'Stock'):
+                linea += f" ({int(fila['Stock'])} unidades)"
+            lineas.append(linea)
+        if total > len(filas):
+            lineas.append(f"… y {total - len(filas)} más")
+        return "\n".join(lineas)
+
+    def _responder_lista(self, df, config):
+        """Lista completa de productos del inventario"""
+        lineas = [f"📦 *INVENTARIO DISPONIBLE* ({len(df)} productos)", ""]
+        mostrar_precio = config.get('incluir_precios', True) and 'Precio' in df.columns
+        for _, fila in df.iterrows():
+            if mostrar_precio and presente(fila, 'Precio'):
+                lineas.append(f"🔹 {fila['Producto']} - {formatear_precio(fila['Precio'])}")
+            else:
+                lineas.append(f"🔹 {fila['Producto']}")
+        return "\n".join(lineas)
+
+    def estadisticas(self):
+        """Retorna consultas atendidas, aciertos y tasa de aciertos del camino rápido"""
+        with self._lock:
+            consultas, aciertos = self.consultas, self.aciertos
+        return {
+            "consultas": consultas,
+            "aciertos": aciertos,
+            "tasa_aciertos": round(aciertos / consultas, 4) if consultas else 0.0
+        }
+
+
+# Motor compartido por todo el proceso
+motor_consultas = MotorConsultasRapidas()
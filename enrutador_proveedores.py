@@ -0,0 +1,224 @@
+"""
+Enrutador de proveedores de IA
+Elige el proveedor/modelo más rápido entre los sanos según su latencia y tasa de errores recientes,
+pasa al siguiente si falla y, opcionalmente, lanza una petición de cobertura (hedging) al segundo
+cuando el primero tarda más que su p95
+"""
+
+import math
+import time
+import random
+import threading
+import logging
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as TiempoAgotado
+
+from cache_respuestas import RespuestaRespaldo
+from metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+# consultar(query_texto, df, historial, entrega=None, cancelado=None) -> respuesta
+# modelo() -> nombre del modelo actual; disponible() -> False si el proveedor está cortado (circuito abierto)
+ProveedorIA = namedtuple('ProveedorIA', ['nombre', 'consultar', 'modelo', 'disponible'])
+
+
+def _percentil(valores, p):
+    """Percentil por rango más cercano de una lista ordenada"""
+    if not valores:
+        return None
+    return valores[max(0, min(len(valores) - 1, math.ceil(p / 100.0 * len(valores)) - 1))]
+
+
+def es_fallo(respuesta):
+    """Las respuestas de respaldo (estáticas o de error) cuentan como fallo del proveedor"""
+    return respuesta is None or isinstance(respuesta, RespuestaRespaldo)
+
+
+class EstadisticasLatencia:
+    """Latencias y errores de las últimas llamadas a un proveedor/modelo"""
+
+    def __init__(self, max_muestras=100, ventana=300.0):
+        self.ventana = ventana
+        self._muestras = deque(maxlen=max_muestras)
+        self._lock = threading.Lock()
+
+    def registrar(self, segundos, ok):
+        with self._lock:
+            self._muestras.append((time.monotonic(), segundos, ok))
+
+    def resumen(self):
+        """(muestras, tasa_error, p50, p95) de las llamadas dentro de la ventana"""
+        limite = time.monotonic() - self.ventana
+        with self._lock:
+            recientes = [(segundos, ok) for instante, segundos, ok in self._muestras if instante >= limite]
+        if not recientes:
+            return 0, 0.0, None, None
+        latencias = sorted(segundos for segundos, ok in recientes if ok)
+        errores = sum(1 for _, ok in recientes if not ok)
+        return len(recientes), errores / len(recientes), _percentil(latencias, 50), _percentil(latencias, 95)
+
+
+class EnrutadorProveedores:
+    """Pool de proveedores ordenado por salud y latencia, con failover y cobertura opcional"""
+
+    def __init__(self, proveedores, cobertura=False, retardo_inicial=3.0, retardo_minimo=0.5,
+                 retardo_maximo=10.0, max_tasa_error=0.5, min_muestras=5, exploracion=0.05, hilos=16):
+        self.proveedores = list(proveedores)
+        self.cobertura = cobertura
+        self.retardo_inicial = retardo_inicial
+        self.retardo_minimo = retardo_minimo
+        self.retardo_maximo = retardo_maximo
+        self.max_tasa_error = max_tasa_error
+        self.min_muestras = min_muestras
+        self.exploracion = exploracion
+        self._estadisticas = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._hilos = hilos
+
+    def _clave(self, proveedor):
+        return f"{proveedor.nombre}:{proveedor.modelo() or '-'}"
+
+    def estadisticas_de(self, proveedor):
+        """Estadísticas del proveedor con su modelo actual (un modelo nuevo empieza sin historial)"""
+        clave = self._clave(proveedor)
+        estadisticas = self._estadisticas.get(clave)
+        if estadisticas is None:
+            with self._lock:
+                estadisticas = self._estadisticas.setdefault(clave, EstadisticasLatencia())
+        return estadisticas
+
+    def _sano(self, proveedor, muestras, tasa_error):
+        if not proveedor.disponible():
+            return False
+        return muestras < self.min_muestras or tasa_error <= self.max_tasa_error
+
+    def ordenar(self):
+        """Proveedores del más conveniente al menos: sanos por latencia mediana y luego los degradados"""
+        candidatos = []
+        for proveedor in self.proveedores:
+            muestras, tasa_error, p50, _ = self.estadisticas_de(proveedor).resumen()
+            # Sin muestras se prueba primero, para conocer su latencia
+            candidatos.append((not self._sano(proveedor, muestras, tasa_error), p50 or 0.0, proveedor))
+        candidatos.sort(key=lambda c: (c[0], c[1]))
+        orden = [c[2] for c in candidatos]
+        # Exploración: de vez en cuando va primero el segundo sano, para que sus estadísticas no envejezcan
+        if len(candidatos) > 1 and not candidatos[1][0] and random.random() < self.exploracion:
+            orden[0], orden[1] = orden[1], orden[0]
+        return orden
+
+    def retardo_cobertura(self, proveedor):
+        """Espera antes de la petición de cobertura: el p95 reciente del proveedor, acotado"""
+        muestras, _, _, p95 = self.estadisticas_de(proveedor).resumen()
+        if muestras < self.min_muestras or p95 is None:
+            return self.retardo_inicial
+        return min(max(p95, self.retardo_minimo), self.retardo_maximo)
+
+    def _llamar(self, proveedor, argumentos, entrega, cancelado):
+        """Llama al proveedor y registra su latencia y resultado"""
+        estadisticas = self.estadisticas_de(proveedor)
+        inicio = time.perf_counter()
+        try:
+            respuesta = proveedor.consultar(*argumentos, entrega=entrega, cancelado=cancelado)
+        except Exception as e:
+            logger.error(f"Error consultando {proveedor.nombre}: {e}")
+            respuesta = None
+        # Una llamada cancelada (perdedora de la cobertura) no se registra: su texto está cortado y su
+        # latencia es solo una cota inferior, que haría parecer más rápido al proveedor más lento
+        if not cancelado.is_set():
+            estadisticas.registrar(time.perf_counter() - inicio, not es_fallo(respuesta))
+        return respuesta
+
+    def _obtener_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._hilos, thread_name_prefix='enrutador-ia')
+        return self._executor
+
+    def consultar(self, query_texto, df, historial, entrega=None):
+        """Consulta al mejor proveedor; si falla, al siguiente. Retorna la respuesta de respaldo si fallan todos"""
+        orden = self.ordenar()
+        if not orden:
+            return None
+        argumentos = (query_texto, df, historial)
+        fallida = None
+        consultados = []
+
+        if self.cobertura and len(orden) > 1:
+            respuesta, consultados = self._consultar_con_cobertura(orden[0], orden[1], argumentos, entrega)
+            if not es_fallo(respuesta):
+                return respuesta
+            fallida = respuesta
+
+        for proveedor in orden:
+            if proveedor in consultados:
+                continue
+            if consultados:
+                # Si el usuario ya recibió el comienzo de una respuesta, no se mezcla con la de otro proveedor
+                if entrega is not None and entrega.enviado:
+                    break
+                logger.warning(f"Falló {consultados[-1].nombre}, consultando {proveedor.nombre}")
+                metricas.contar('enrutador_failover_total', proveedor=proveedor.nombre)
+            respuesta = self._llamar(proveedor, argumentos, entrega, threading.Event())
+            consultados.append(proveedor)
+            if not es_fallo(respuesta):
+                return respuesta
+            if fallida is None:
+                fallida = respuesta
+        return fallida
+
+    def _consultar_con_cobertura(self, primero, segundo, argumentos, entrega):
+        """Lanza el primero y, si no terminó en su p95, también el segundo; gana el primer éxito
+
+        Retorna la respuesta y los proveedores consultados.
+        """
+        executor = self._obtener_executor()
+        evento_primero = threading.Event()
+        futuro = executor.submit(self._llamar, primero, argumentos, entrega, evento_primero)
+        try:
+            return futuro.result(timeout=self.retardo_cobertura(primero)), [primero]
+        except TiempoAgotado:
+            pass
+
+        # Si el primero ya envió su primera oración al usuario, la respuesta queda comprometida con él
+        if entrega is not None and not entrega.cancelar():
+            return futuro.result(), [primero]
+
+        metricas.contar('enrutador_coberturas_total', proveedor=segundo.nombre)
+        evento_segundo = threading.Event()
+        pendientes = {
+            futuro: (primero, evento_primero),
+            executor.submit(self._llamar, segundo, argumentos, None, evento_segundo): (segundo, evento_segundo),
+        }
+        fallida = None
+        while pendientes:
+            terminados, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+            for terminado in terminados:
+                proveedor, _ = pendientes.pop(terminado)
+                respuesta = terminado.result()
+                if not es_fallo(respuesta):
+                    # Cancelar al perdedor: los streamings se cortan; una llamada completa termina sola y se descarta
+                    for _, cancelado in pendientes.values():
+                        cancelado.set()
+                    if proveedor is segundo:
+                        metricas.contar('enrutador_coberturas_ganadas_total', proveedor=segundo.nombre)
+                    return respuesta, [primero, segundo]
+                if fallida is None:
+                    fallida = respuesta
+        return fallida, [primero, segundo]
+
+    def estado(self):
+        """Latencia y errores recientes por proveedor/modelo para el endpoint de salud"""
+        resultado = {}
+        for proveedor in self.proveedores:
+            muestras, tasa_error, p50, p95 = self.estadisticas_de(proveedor).resumen()
+            resultado[self._clave(proveedor)] = {
+                "muestras": muestras,
+                "tasa_error": round(tasa_error, 3),
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "sano": self._sano(proveedor, muestras, tasa_error),
+            }
+        return resultado
@@ -0,0 +1,39 @@
+"""
+Configuración de gunicorn para producción
+Los valores se pueden ajustar con variables de entorno en Railway
+"""
+
+import os
+import multiprocessing
+
+# Puerto asignado por Railway
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+
+# Procesos y hilos: las consultas a la IA esperan E/S, así que cada worker atiende varios hilos
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+worker_class = 'gthread'
+
+# Inventario e índices se cargan una vez en el maestro antes del fork (el modelo de Gemini, en cada worker)
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Tiempos de espera
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+
+def post_fork(server, worker):
+    """Crea los clientes de Twilio, Redis y SiliconFlow propios del worker"""
+    from app import inicializar_servicios
+    inicializar_servicios()
+
+
+def worker_exit(server, worker):
+    """Cierra la cola y las conexiones del worker al apagarse"""
+    from app import cerrar_servicios
+    cerrar_servicios()
@@ -0,0 +1,465 @@
+"""
+Almacén indexado del inventario en SQLite
+Importa inventario.xlsx (o .csv) a una base SQLite con índices y búsqueda de texto completo (FTS5) y
+resuelve las consultas por nombre, categoría, proveedor y rango de stock del camino rápido y la búsqueda
+
+Uso manual de la importación:
+    python inventario_sqlite.py inventario.xlsx inventario.db
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+import logging
+from urllib.parse import quote
+
+from busqueda_inventario import LARGO_RAIZ, normalizar_texto
+from cambios_inventario import COLUMNA_ID, ErrorCambios, clave_id, planificar, encadenar_huella
+from metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+# Versión del esquema: una base de otra versión se vuelve a importar
+VERSION_ESQUEMA = '2'
+
+# Extensiones de la base; cualquier otra se considera archivo de origen a importar
+EXTENSIONES_BASE = ('.db', '.sqlite', '.sqlite3')
+
+# Columnas del inventario que alimentan cada columna del índice de texto (mismo orden que PESOS_TEXTO)
+COLUMNAS_TEXTO = {
+    'producto': 'Producto',
+    'categoria': 'Categoria',
+    'proveedor': 'Proveedor',
+    'descripcion': 'Descripcion',
+}
+
+# Pesos de BM25 por columna del índice de texto (el nombre del producto pesa el doble, como en busqueda_inventario)
+PESOS_TEXTO = (2.0, 1.0, 1.0, 1.0)
+
+# Lotes de cambios que se conservan en el registro para que los demás procesos se pongan al día
+MAX_REGISTRO_CAMBIOS = 10000
+
+ESQUEMA = f"""
+CREATE TABLE meta (clave TEXT PRIMARY KEY, valor TEXT);
+CREATE TABLE atributos (fila INTEGER PRIMARY KEY, categoria TEXT, proveedor TEXT, stock REAL);
+CREATE INDEX atributos_categoria ON atributos (categoria, fila);
+CREATE INDEX atributos_proveedor ON atributos (proveedor, fila);
+CREATE INDEX atributos_stock ON atributos (stock, fila);
+CREATE TABLE claves (clave TEXT PRIMARY KEY, fila INTEGER NOT NULL);
+CREATE TABLE cambios (secuencia INTEGER PRIMARY KEY AUTOINCREMENT, lote TEXT NOT NULL, operaciones TEXT NOT NULL);
+CREATE VIRTUAL TABLE texto USING fts5 (
+    {', '.join(COLUMNAS_TEXTO)}, tokenize = 'unicode61 remove_diacritics 2', prefix = '{LARGO_RAIZ}'
+);
+"""
+
+_PATRON_PALABRA = re.compile(r'[a-z0-9]+')
+
+
+def es_base(ruta):
+    """True si la ruta es una base SQLite (y no un archivo de origen a importar)"""
+    return ruta.lower().endswith(EXTENSIONES_BASE)
+
+
+def firma_archivo(ruta):
+    """Obtiene (mtime, tamaño) del archivo o (None, None) si no existe"""
+    try:
+        stat = os.stat(ruta)
+        return stat.st_mtime_ns, stat.st_size
+    except FileNotFoundError:
+        return None, None
+
+
+def leer_origen(ruta):
+    """Lee el archivo de origen (Excel o CSV) con pandas"""
+    import pandas as pd
+    if ruta.lower().endswith('.csv'):
+        return pd.read_csv(ruta)
+    return pd.read_excel(ruta)
+
+
+def normalizar_valor(valor):
+    """Categoría o proveedor normalizado para comparar sin mayúsculas, acentos ni espacios extra"""
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return ''
+    return ' '.join(_PATRON_PALABRA.findall(normalizar_texto(valor)))
+
+
+def expresion_fts(texto):
+    """Convierte texto libre en una expresión FTS5: palabras en OR, como prefijo las que superan LARGO_RAIZ"""
+    terminos = []
+    for palabra in dict.fromkeys(_PATRON_PALABRA.findall(normalizar_texto(texto))):
+        if len(palabra) > LARGO_RAIZ:
+            # Misma raíz que tokenizar(): "auriculares" ~ "auricular"
+            terminos.append(f'"{palabra[:LARGO_RAIZ]}"*')
+        else:
+            terminos.append(f'"{palabra}"')
+    return ' OR '.join(terminos)
+
+
+def _numero(valor):
+    """Valor numérico o None (como pd.to_numeric con errors='coerce')"""
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return None
+    return numero if numero == numero else None
+
+
+def escribir_base(conexion, df, meta):
+    """Crea el esquema y carga el DataFrame, los atributos normalizados y el índice de texto"""
+    import pandas as pd
+    conexion.executescript(ESQUEMA)
+    df = df.reset_index(drop=True)
+    df.to_sql('inventario', conexion, index=True, index_label='_fila')
+
+    total = len(df)
+    vacias = [''] * total
+    columnas = {
+        nombre: df[columna].fillna('').astype(str).tolist() if columna in df.columns else vacias
+        for nombre, columna in COLUMNAS_TEXTO.items()
+    }
+    conexion.executemany(
+        f"INSERT INTO texto (rowid, {', '.join(COLUMNAS_TEXTO)}) VALUES (?, ?, ?, ?, ?)",
+        zip(range(total), *columnas.values())
+    )
+
+    categorias = df['Categoria'].tolist() if 'Categoria' in df.columns else [None] * total
+    proveedores = df['Proveedor'].tolist() if 'Proveedor' in df.columns else [None] * total
+    stock = pd.to_numeric(df['Stock'], errors='coerce').tolist() if 'Stock' in df.columns else [None] * total
+    conexion.executemany(
+        "INSERT INTO atributos (fila, categoria, proveedor, stock) VALUES (?, ?, ?, ?)",
+        ((fila, normalizar_valor(c), normalizar_valor(p), s if s == s else None)
+         for fila, c, p, s in zip(range(total), categorias, proveedores, stock))
+    )
+
+    if COLUMNA_ID in df.columns:
+        claves = {}
+        for fila, valor in enumerate(df[COLUMNA_ID].tolist()):
+            try:
+                claves[clave_id(valor)] = fila
+            except ErrorCambios:
+                continue
+        conexion.executemany("INSERT INTO claves (clave, fila) VALUES (?, ?)", claves.items())
+
+    datos = dict(meta, esquema=VERSION_ESQUEMA, filas=str(total), importado_en=str(time.time()), secuencia='0', cadena='')
+    conexion.executemany("INSERT INTO meta (clave, valor) VALUES (?, ?)", datos.items())
+
+
+def leer_meta(conexion):
+    """Metadatos de la base (dict vacío si no es una base importada por este módulo)"""
+    try:
+        return dict(conexion.execute("SELECT clave, valor FROM meta"))
+    except sqlite3.DatabaseError:
+        return {}
+
+
+def conectar(ruta, solo_lectura=True):
+    """Conexión a la base; en solo lectura no crea el archivo si no existe"""
+    if solo_lectura:
+        return sqlite3.connect(f"file:{quote(os.path.abspath(ruta))}?mode=ro", uri=True)
+    return sqlite3.connect(ruta)
+
+
+def base_actualizada(ruta_base, mtime, tamano):
+    """True si la base existe y fue importada desde el origen con esa firma y el esquema actual"""
+    if not os.path.exists(ruta_base):
+        return False
+    try:
+        conexion = conectar(ruta_base)
+    except sqlite3.Error:
+        return False
+    try:
+        meta = leer_meta(conexion)
+    finally:
+        conexion.close()
+    return meta.get('esquema') == VERSION_ESQUEMA and meta.get('huella') == f"{mtime}-{tamano}"
+
+
+def importar_inventario(ruta_origen, ruta_base):
+    """Importa el archivo de origen a la base indexada; la base se reemplaza de forma atómica"""
+    mtime, tamano = firma_archivo(ruta_origen)
+    if mtime is None:
+        raise FileNotFoundError(ruta_origen)
+    inicio = time.perf_counter()
+    df = leer_origen(ruta_origen)
+
+    # Se escribe en un temporal del mismo directorio y se renombra: quien lee la base anterior
+    # (otro worker) la sigue viendo completa hasta que la suelta
+    directorio = os.path.dirname(os.path.abspath(ruta_base))
+    descriptor, temporal = tempfile.mkstemp(prefix='.inventario-', suffix='.db', dir=directorio)
+    os.close(descriptor)
+    try:
+        # mkstemp crea el archivo solo legible por el dueño; la base queda con los permisos habituales
+        os.chmod(temporal, 0o644)
+        conexion = conectar(temporal, solo_lectura=False)
+        try:
+            with conexion:
+                escribir_base(conexion, df, {'origen': os.path.abspath(ruta_origen), 'huella': f"{mtime}-{tamano}"})
+        finally:
+            conexion.close()
+        os.replace(temporal, ruta_base)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.unlink(temporal)
+        raise
+
+    segundos = time.perf_counter() - inicio
+    metricas.observar('inventario_importacion_segundos', segundos)
+    logger.info(f"Inventario importado a {ruta_base}: {len(df)} productos en {segundos:.2f}s")
+    return len(df)
+
+
+def leer_base(ruta_base):
+    """Retorna (DataFrame, metadatos) leídos en una misma transacción
+
+    meta['huella'] identifica la importación; meta['secuencia'] y meta['cadena'], los cambios aplicados después.
+    """
+    import pandas as pd
+    conexion = conectar(ruta_base)
+    try:
+        with conexion:
+            conexion.execute("BEGIN")
+            meta = leer_meta(conexion)
+            df = pd.read_sql("SELECT * FROM inventario ORDER BY _fila", conexion, index_col='_fila')
+    finally:
+        conexion.close()
+    if meta.get('esquema') != VERSION_ESQUEMA:
+        raise ValueError(f"{ruta_base} no es una base de inventario importada (esquema {meta.get('esquema')})")
+    df.index.name = None
+    return df.reset_index(drop=True), meta
+
+
+def leer_cambios(ruta_base, desde):
+    """Retorna (metadatos, [(secuencia, lote, operaciones)]) de los lotes posteriores a la secuencia desde"""
+    conexion = conectar(ruta_base)
+    try:
+        with conexion:
+            conexion.execute("BEGIN")
+            meta = leer_meta(conexion)
+            filas = conexion.execute(
+                "SELECT secuencia, lote, operaciones FROM cambios WHERE secuencia > ? ORDER BY secuencia", (desde,)
+            ).fetchall()
+    finally:
+        conexion.close()
+    return meta, [(secuencia, lote, [tuple(o) for o in json.loads(operaciones)]) for secuencia, lote, operaciones in filas]
+
+
+def _citar(columna):
+    return '"' + str(columna).replace('"', '""') + '"'
+
+
+def _escribir_fila(conexion, columnas, posicion, fila):
+    """Reemplaza la fila de la posición dada en la tabla del inventario, el índice de texto y los atributos"""
+    conexion.execute("DELETE FROM inventario WHERE _fila = ?", (posicion,))
+    conexion.execute(
+        f"INSERT INTO inventario (_fila, {', '.join(_citar(c) for c in columnas)}) VALUES ({', '.join('?' * (len(columnas) + 1))})",
+        [posicion] + [fila.get(c) for c in columnas]
+    )
+    textos = ['' if fila.get(c) is None else str(fila.get(c)) for c in COLUMNAS_TEXTO.values()]
+    conexion.execute("DELETE FROM texto WHERE rowid = ?", (posicion,))
+    conexion.execute(f"INSERT INTO texto (rowid, {', '.join(COLUMNAS_TEXTO)}) VALUES (?, ?, ?, ?, ?)", [posicion] + textos)
+    conexion.execute(
+        "INSERT OR REPLACE INTO atributos (fila, categoria, proveedor, stock) VALUES (?, ?, ?, ?)",
+        (posicion, normalizar_valor(fila.get('Categoria')), normalizar_valor(fila.get('Proveedor')), _numero(fila.get('Stock')))
+    )
+
+
+def _aplicar_lote(conexion, columnas, operaciones):
+    """Aplica un lote a las tablas con la misma planificación que el DataFrame en memoria"""
+    cursor = conexion.execute("SELECT COUNT(*) FROM inventario")
+    total = cursor.fetchone()[0]
+
+    def posicion_de(clave):
+        fila = conexion.execute("SELECT fila FROM claves WHERE clave = ?", (clave,)).fetchone()
+        return fila[0] if fila else None
+
+    def fila_en(posicion):
+        cursor = conexion.execute("SELECT * FROM inventario WHERE _fila = ?", (posicion,))
+        nombres = [d[0] for d in cursor.description]
+        return {c: v for c, v in zip(nombres, cursor.fetchone()) if c != '_fila'}
+
+    plan = planificar(operaciones, posicion_de, fila_en, total, columnas)
+    for posicion, fila in plan.escrituras.items():
+        _escribir_fila(conexion, columnas, posicion, fila)
+    if plan.total < total:
+        conexion.execute("DELETE FROM inventario WHERE _fila >= ?", (plan.total,))
+        conexion.execute("DELETE FROM texto WHERE rowid >= ?", (plan.total,))
+        conexion.execute("DELETE FROM atributos WHERE fila >= ?", (plan.total,))
+    for clave, posicion in plan.claves.items():
+        if posicion is None:
+            conexion.execute("DELETE FROM claves WHERE clave = ?", (clave,))
+        else:
+            conexion.execute("INSERT OR REPLACE INTO claves (clave, fila) VALUES (?, ?)", (clave, posicion))
+    return plan
+
+
+def aplicar_lotes(ruta_base, huella, lotes):
+    """Aplica los lotes [(lote, operaciones)] a la base y los agrega al registro de cambios, en una transacción
+
+    Retorna [(lote, secuencia)], o None si la base ya no es la importación con esa huella (se reimportó el origen).
+    """
+    conexion = conectar(ruta_base, solo_lectura=False)
+    conexion.isolation_level = None
+    try:
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            meta = leer_meta(conexion)
+            if meta.get('esquema') != VERSION_ESQUEMA or meta.get('huella') != huella:
+                conexion.execute("ROLLBACK")
+                return None
+            columnas = [fila[1] for fila in conexion.execute("PRAGMA table_info(inventario)") if fila[1] != '_fila']
+            cadena = meta.get('cadena', '')
+            secuencias = []
+            for lote, operaciones in lotes:
+                _aplicar_lote(conexion, columnas, operaciones)
+                secuencia = conexion.execute(
+                    "INSERT INTO cambios (lote, operaciones) VALUES (?, ?)", (lote, json.dumps(operaciones, ensure_ascii=False))
+                ).lastrowid
+                cadena = encadenar_huella(cadena, lote)
+                secuencias.append((lote, secuencia))
+            ultima = secuencias[-1][1]
+            conexion.execute("DELETE FROM cambios WHERE secuencia <= ?", (ultima - MAX_REGISTRO_CAMBIOS,))
+            conexion.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('secuencia', ?), ('cadena', ?)", (str(ultima), cadena))
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+    finally:
+        conexion.close()
+    return secuencias
+
+
+class InventarioSQLite:
+    """Consultas indexadas sobre una base importada
+
+    Las filas retornadas son posiciones (iloc) del DataFrame leído de la misma importación. Si la base
+    del disco ya es otra (se reimportó), las consultas retornan None y quien llama usa el DataFrame.
+    Los cambios incrementales se escriben en la misma base: mientras se persisten, una posición puede
+    quedar fuera del DataFrame en memoria y quien llama la descarta.
+    """
+
+    def __init__(self, ruta, huella):
+        self.ruta = ruta
+        self.huella = huella
+        self._local = threading.local()
+        self._valores = {}
+        # Cambia cada vez que se aplican cambios a la base (invalida lo derivado de sus valores)
+        self.revision = 0
+
+    def invalidar(self):
+        """Descarta los valores leídos de la base: se le aplicaron cambios"""
+        self._valores = {}
+        self.revision += 1
+
+    def _conexion(self):
+        """Conexión de solo lectura del hilo actual (nunca se comparte entre hilos ni tras un fork)
+
+        Si no se puede abrir (error transitorio o base reimportada) retorna None sin recordar el fallo: la
+        siguiente consulta del hilo lo vuelve a intentar.
+        """
+        local = self._local
+        if getattr(local, 'pid', None) == os.getpid():
+            return local.conexion
+        try:
+            conexion = conectar(self.ruta)
+            if leer_meta(conexion).get('huella') != self.huella:
+                conexion.close()
+                logger.warning(f"La base {self.ruta} cambió desde que se cargó el inventario")
+                return None
+        except sqlite3.Error as e:
+            logger.error(f"No se pudo abrir la base de inventario {self.ruta}: {e}")
+            return None
+        # La conexión mantiene abierto el archivo: aunque otro proceso lo reemplace, sigue leyendo esta importación
+        local.conexion, local.pid = conexion, os.getpid()
+        return conexion
+
+    def _ejecutar(self, sql, parametros=()):
+        conexion = self._conexion()
+        if conexion is None:
+            return None
+        try:
+            return conexion.execute(sql, parametros).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error consultando la base de inventario: {e}")
+            return None
+
+    def buscar_texto(self, consulta, limite=8, columna=None):
+        """[(fila, puntaje)] de las filas más relevantes (BM25), de mayor a menor puntaje"""
+        expresion = expresion_fts(consulta)
+        if not expresion:
+            return []
+        if columna is not None:
+            expresion = f"{columna} : ({expresion})"
+        pesos = ', '.join(str(p) for p in PESOS_TEXTO)
+        filas = self._ejecutar(
+            f"SELECT rowid, -bm25(texto, {pesos}) AS puntaje FROM texto WHERE texto MATCH ? "
+            f"ORDER BY puntaje DESC, rowid LIMIT ?",
+            (expresion, limite)
+        )
+        return filas if filas is None else [(fila, puntaje) for fila, puntaje in filas]
+
+    def buscar_por_nombre(self, nombre, limite=5):
+        """[(fila, puntaje)] de los productos cuyo nombre coincide mejor con el texto"""
+        return self.buscar_texto(nombre, limite, columna='producto')
+
+    def listar(self, categoria=None, proveedor=None, stock_minimo=None, stock_maximo=None, limite=30):
+        """Retorna (filas, total) de los productos que cumplen todos los filtros dados, por orden de inventario
+
+        Con filtro de stock se ordenan de menor a mayor stock.
+        """
+        condiciones, parametros = [], []
+        if categoria is not None:
+            condiciones.append("categoria = ?")
+            parametros.append(normalizar_valor(categoria))
+        if proveedor is not None:
+            condiciones.append("proveedor = ?")
+            parametros.append(normalizar_valor(proveedor))
+        if stock_minimo is not None:
+            condiciones.append("stock >= ?")
+            parametros.append(stock_minimo)
+        if stock_maximo is not None:
+            condiciones.append("stock <= ?")
+            parametros.append(stock_maximo)
+        donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        orden = "stock, fila" if stock_minimo is not None or stock_maximo is not None else "fila"
+
+        total = self._ejecutar(f"SELECT COUNT(*) FROM atributos {donde}", parametros)
+        filas = self._ejecutar(f"SELECT fila FROM atributos {donde} ORDER BY {orden} LIMIT ?", parametros + [limite])
+        if total is None or filas is None:
+            return None
+        return [fila for (fila,) in filas], total[0][0]
+
+    def por_categoria(self, categoria, limite=30):
+        return self.listar(categoria=categoria, limite=limite)
+
+    def por_proveedor(self, proveedor, limite=30):
+        return self.listar(proveedor=proveedor, limite=limite)
+
+    def por_rango_stock(self, minimo=None, maximo=None, limite=30):
+        return self.listar(stock_minimo=minimo, stock_maximo=maximo, limite=limite)
+
+    def valores(self, atributo):
+        """Valores normalizados distintos de 'categoria' o 'proveedor' (se leen una vez por importación)"""
+        if atributo not in ('categoria', 'proveedor'):
+            raise ValueError(f"Atributo no indexado: {atributo}")
+        valores = self._valores.get(atributo)
+        if valores is None:
+            filas = self._ejecutar(f"SELECT DISTINCT {atributo} FROM atributos WHERE {atributo} != ''")
+            if filas is None:
+                return None
+            valores = self._valores[atributo] = [valor for (valor,) in filas]
+        return valores
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) not in (2, 3):
+        print(f"Uso: python {sys.argv[0]} inventario.xlsx [inventario.db]")
+        sys.exit(2)
+    origen = sys.argv[1]
+    importar_inventario(origen, sys.argv[2] if len(sys.argv) == 3 else os.path.splitext(origen)[0] + '.db')
@@ -0,0 +1,131 @@
+"""
+Límite de consultas por usuario y deduplicación de reintentos de Twilio
+Token bucket por número (Redis si está disponible, memoria local si no) y registro de MessageSid ya recibidos
+"""
+
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Token bucket atómico en Redis: KEYS[1]=clave, ARGV=capacidad, tokens por segundo, ahora, ttl
+SCRIPT_TOKEN_BUCKET = """
+local datos = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local capacidad = tonumber(ARGV[1])
+local tasa = tonumber(ARGV[2])
+local ahora = tonumber(ARGV[3])
+local tokens = tonumber(datos[1]) or capacidad
+local ts = tonumber(datos[2]) or ahora
+tokens = math.min(capacidad, tokens + (ahora - ts) * tasa)
+local permitido = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    permitido = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', ahora)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return permitido
+"""
+
+
+class LimitadorConsultas:
+    """Token bucket por clave: `capacidad` consultas que se recargan a lo largo de `ventana` segundos"""
+
+    def __init__(self, redis_client=None, prefijo='limite_consultas_', max_claves_locales=10000):
+        self.redis_client = redis_client
+        self.prefijo = prefijo
+        self.max_claves_locales = max_claves_locales
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._script = None
+        self.rechazados = 0
+
+    def permitir(self, clave, capacidad, ventana):
+        """Consume una consulta del bucket; retorna False si el usuario superó el límite"""
+        if capacidad <= 0:
+            return True
+        tasa = capacidad / float(ventana)
+
+        permitido = None
+        if self.redis_client:
+            try:
+                if self._script is None:
+                    self._script = self.redis_client.register_script(SCRIPT_TOKEN_BUCKET)
+                permitido = bool(self._script(
+                    keys=[self.prefijo + clave],
+                    args=[capacidad, tasa, time.time(), int(ventana) + 1]
+                ))
+            except Exception as e:
+                logger.warning(f"Error en límite de consultas con Redis, usando memoria local: {e}")
+
+        if permitido is None:
+            permitido = self._permitir_local(clave, capacidad, tasa)
+
+        if not permitido:
+            with self._lock:
+                self.rechazados += 1
+        return permitido
+
+    def _permitir_local(self, clave, capacidad, tasa):
+        """Token bucket en memoria del proceso"""
+        ahora = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.get(clave, (capacidad, ahora))
+            tokens = min(capacidad, tokens + (ahora - ts) * tasa)
+            permitido = tokens >= 1
+            if permitido:
+                tokens -= 1
+            self._buckets[clave] = (tokens, ahora)
+            self._buckets.move_to_end(clave)
+            while len(self._buckets) > self.max_claves_locales:
+                self._buckets.popitem(last=False)
+        return permitido
+
+
+class DeduplicadorMensajes:
+    """Recuerda los MessageSid recibidos para descartar los reintentos de Twilio"""
+
+    def __init__(self, redis_client=None, ttl=600, prefijo='mensaje_visto_', max_locales=10000):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.prefijo = prefijo
+        self.max_locales = max_locales
+        self._vistos = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicados = 0
+
+    def es_duplicado(self, message_sid):
+        """Registra el MessageSid y retorna True si ya se había recibido"""
+        if not message_sid:
+            return False
+
+        duplicado = None
+        if self.redis_client:
+            try:
+                # SET NX: solo el primer worker que recibe el mensaje lo registra
+                duplicado = not self.redis_client.set(self.prefijo + message_sid, 1, nx=True, ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"Error deduplicando con Redis, usando memoria local: {e}")
+
+        if duplicado is None:
+            ahora = time.monotonic()
+            with self._lock:
+                expira = self._vistos.get(message_sid)
+                duplicado = expira is not None and expira > ahora
+                if not duplicado:
+                    self._vistos[message_sid] = ahora + self.ttl
+                    self._vistos.move_to_end(message_sid)
+                    while len(self._vistos) > self.max_locales:
+                        self._vistos.popitem(last=False)
+
+        if duplicado:
+            with self._lock:
+                self.duplicados += 1
+        return duplicado
+
+
+# Instancias compartidas por todo el proceso (Redis se conecta desde app.py si está disponible)
+limitador_consultas = LimitadorConsultas()
+deduplicador_mensajes = DeduplicadorMensajes()
@@ -0,0 +1,168 @@
+"""
+Descarga de archivos multimedia de Twilio
+Descarga por partes con límite de tamaño y timeouts, en almacenamiento temporal único por petición y con detección del tipo MIME real
+"""
+
+import os
+import time
+import hashlib
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+TAMANO_BLOQUE = 64 * 1024
+
+# Hasta este tamaño el archivo se mantiene en memoria; por encima pasa a un temporal anónimo del sistema
+MAX_EN_MEMORIA = 1024 * 1024
+
+# Firmas de archivo (magic bytes) de los formatos que envía WhatsApp
+FIRMAS_MIME = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'OggS', 'audio/ogg'),
+    (b'ID3', 'audio/mpeg'),
+    (b'\xff\xfb', 'audio/mpeg'),
+    (b'\xff\xf3', 'audio/mpeg'),
+    (b'#!AMR', 'audio/amr'),
+]
+
+
+class ErrorMedio(Exception):
+    """No se pudo descargar el archivo multimedia"""
+
+
+def detectar_mime(cabecera, mime_declarado=None):
+    """Detecta el tipo MIME a partir de los primeros bytes del archivo"""
+    for firma, mime in FIRMAS_MIME:
+        if cabecera.startswith(firma):
+            return mime
+    if cabecera[:4] == b'RIFF' and cabecera[8:12] == b'WEBP':
+        return 'image/webp'
+    if cabecera[:4] == b'RIFF' and cabecera[8:12] == b'WAVE':
+        return 'audio/wav'
+    if cabecera[4:8] == b'ftyp':
+        # Contenedor MP4: WhatsApp lo usa para notas de voz (M4A) y video
+        marca = cabecera[8:12]
+        return 'audio/mp4' if marca in (b'M4A ', b'M4B ') else (mime_declarado or 'video/mp4')
+    return mime_declarado or 'application/octet-stream'
+
+
+class MedioDescargado:
+    """Archivo descargado en un temporal propio de la petición; cerrarlo lo elimina"""
+
+    def __init__(self, archivo, mime, tamano, sha256):
+        self.archivo = archivo
+        self.mime = mime
+        self.tamano = tamano
+        self.sha256 = sha256
+
+    def cerrar(self):
+        self.archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
+
+
+def descargar_medio(url, mime_declarado=None, auth=None, max_bytes=16 * 1024 * 1024, timeout=(3.05, 20)):
+    """Descarga el archivo por partes sin superar max_bytes y retorna un MedioDescargado"""
+    # requests se importa en la primera descarga (no hace falta para arrancar la aplicación)
+    import requests
+    archivo = tempfile.SpooledTemporaryFile(max_size=MAX_EN_MEMORIA)
+    inicio = time.perf_counter()
+    try:
+        with requests.get(url, auth=auth, stream=True, timeout=timeout) as response:
+            if response.status_code != 200:
+                raise ErrorMedio(f"Error al descargar el archivo: HTTP {response.status_code}")
+
+            declarado = int(response.headers.get('Content-Length') or 0)
+            if declarado > max_bytes:
+                raise ErrorMedio(f"Archivo demasiado grande ({declarado} bytes)")
+
+            tamano = 0
+            cabecera = b''
+            huella = hashlib.sha256()
+            for bloque in response.iter_content(chunk_size=TAMANO_BLOQUE):
+                tamano += len(bloque)
+                if tamano > max_bytes:
+                    raise ErrorMedio(f"Archivo demasiado grande (más de {max_bytes} bytes)")
+                if len(cabecera) < 16:
+                    cabecera += bloque[:16]
+                huella.update(bloque)
+                archivo.write(bloque)
+
+            mime_http = response.headers.get('Content-Type', '').split(';')[0].strip() or None
+
+        archivo.seek(0)
+        mime = detectar_mime(cabecera, mime_declarado or mime_http)
+        logger.info(f"Archivo descargado: {tamano} bytes ({mime})")
+        metricas.observar('medio_descarga_segundos', time.perf_counter() - inicio)
+        return MedioDescargado(archivo, mime, tamano, huella.hexdigest())
+    except requests.exceptions.RequestException as e:
+        archivo.close()
+        raise ErrorMedio(f"Error al descargar el archivo: {e}") from e
+    except Exception:
+        archivo.close()
+        raise
+
+
+class CacheReferenciasArchivos:
+    """Referencias a archivos ya subidos a Gemini, por SHA-256 del contenido, hasta poco antes de que expiren"""
+
+    def __init__(self, max_entradas=500, margen_expiracion=3600, duracion_por_defecto=47 * 3600):
+        self.max_entradas = max_entradas
+        self.margen_expiracion = margen_expiracion
+        self.duracion_por_defecto = duracion_por_defecto
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, sha256):
+        """Retorna la referencia vigente al archivo o None"""
+        with self._lock:
+            entrada = self._entradas.get(sha256)
+            if entrada is None:
+                return None
+            file_ref, expira = entrada
+            if expira <= time.monotonic():
+                del self._entradas[sha256]
+                return None
+            self._entradas.move_to_end(sha256)
+            return file_ref
+
+    def guardar(self, sha256, file_ref):
+        """Guarda la referencia respetando su fecha de expiración en Gemini"""
+        vigencia = self.duracion_por_defecto
+        expiracion = getattr(file_ref, 'expiration_time', None)
+        if isinstance(expiracion, datetime):
+            if expiracion.tzinfo is None:
+                expiracion = expiracion.replace(tzinfo=timezone.utc)
+            vigencia = (expiracion - datetime.now(timezone.utc)).total_seconds()
+        vigencia -= self.margen_expiracion
+        if vigencia <= 0:
+            return
+        with self._lock:
+            self._entradas[sha256] = (file_ref, time.monotonic() + vigencia)
+            self._entradas.move_to_end(sha256)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+
+def credenciales_twilio():
+    """Credenciales para descargar medios de Twilio cuando la autenticación HTTP está activa"""
+    sid, token = os.getenv('TWILIO_ACCOUNT_SID'), os.getenv('TWILIO_AUTH_TOKEN')
+    return (sid, token) if sid and token else None
+
+
+# Pool para descargar medios mientras se prepara el prompt
+executor_medios = ThreadPoolExecutor(max_workers=int(os.getenv('MEDIA_DOWNLOAD_WORKERS', 4)), thread_name_prefix='descarga-medios')
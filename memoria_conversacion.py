@@ -0,0 +1,114 @@
+"""
+Memoria conversacional por usuario
+Guarda los últimos turnos en Redis (clave chat_session_{usuario_id}) o en memoria local, recortados por turnos y tokens
+"""
+
+import json
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Aproximación de caracteres por token para estimar el tamaño del historial
+CARACTERES_POR_TOKEN = 4
+
+
+def estimar_tokens(texto):
+    """Estimación barata de tokens de un texto"""
+    return len(texto) // CARACTERES_POR_TOKEN + 1
+
+
+def recortar_historial(turnos, max_turnos, max_tokens):
+    """Conserva los turnos más recientes que entren en el presupuesto de turnos y tokens"""
+    # Un turno es un par pregunta/respuesta: se recorta de a dos mensajes
+    turnos = turnos[-2 * max_turnos:] if max_turnos > 0 else []
+    total = sum(estimar_tokens(t['texto']) for t in turnos)
+    while turnos and total > max_tokens:
+        total -= sum(estimar_tokens(t['texto']) for t in turnos[:2])
+        turnos = turnos[2:]
+    return turnos
+
+
+class MemoriaConversacion:
+    """Historial compacto de mensajes [{"rol": "user"|"model", "texto": ...}] por usuario"""
+
+    def __init__(self, redis_client=None, ttl=3600, max_usuarios_locales=1000):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.max_usuarios_locales = max_usuarios_locales
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _clave(self, usuario_id):
+        return f"chat_session_{usuario_id}"
+
+    def obtener_historial(self, usuario_id):
+        """Retorna la lista de mensajes guardados del usuario (vacía si no hay sesión)"""
+        if self.redis_client:
+            try:
+                datos = self.redis_client.get(self._clave(usuario_id))
+                if not datos:
+                    return []
+                sesion = json.loads(datos)
+                # Sesiones del formato anterior ({'history': ...}) se descartan
+                return sesion.get('turnos', []) if isinstance(sesion, dict) else []
+            except Exception as e:
+                logger.warning(f"Error leyendo sesión de Redis: {e}")
+
+        with self._lock:
+            turnos = self._local.get(usuario_id)
+            if turnos is None:
+                return []
+            self._local.move_to_end(usuario_id)
+            return list(turnos)
+
+    def agregar_turno(self, usuario_id, pregunta, respuesta, max_turnos=6, max_tokens=1000):
+        """Agrega un par pregunta/respuesta y recorta el historial al presupuesto"""
+        turnos = self.obtener_historial(usuario_id)
+        turnos.append({"rol": "user", "texto": pregunta})
+        turnos.append({"rol": "model", "texto": respuesta})
+        turnos = recortar_historial(turnos, max_turnos, max_tokens)
+
+        if self.redis_client:
+            try:
+                self.redis_client.setex(
+                    self._clave(usuario_id), self.ttl,
+                    json.dumps({'turnos': turnos}, ensure_ascii=False)
+                )
+                return
+            except Exception as e:
+                logger.warning(f"Error guardando sesión en Redis: {e}")
+
+        with self._lock:
+            self._local[usuario_id] = turnos
+            self._local.move_to_end(usuario_id)
+            while len(self._local) > self.max_usuarios_locales:
+                self._local.popitem(last=False)
+
+    def borrar(self, usuario_id):
+        """Elimina la sesión del usuario"""
+        if self.redis_client:
+            try:
+                self.redis_client.delete(self._clave(usuario_id))
+            except Exception as e:
+                logger.warning(f"Error borrando sesión de Redis: {e}")
+        with self._lock:
+            self._local.pop(usuario_id, None)
+
+
+def historial_para_siliconflow(turnos):
+    """Convierte el historial al formato de mensajes de chat completions"""
+    return [
+        {"role": "assistant" if t['rol'] == 'model' else "user", "content": t['texto']}
+        for t in turnos
+    ]
+
+
+def historial_para_gemini(turnos):
+    """Convierte el historial al formato de contenidos de Gemini"""
+    return [{"role": t['rol'], "parts": [t['texto']]} for t in turnos]
+
+
+# Memoria compartida por todo el proceso (Redis se conecta desde app.py si está disponible)
+memoria_conversacion = MemoriaConversacion()
@@ -0,0 +1,160 @@
+"""
+Métricas de latencia y contadores en formato de texto de Prometheus
+Con METRICAS_HABILITADAS=false las llamadas no hacen nada (costo casi nulo en el camino crítico)
+"""
+
+import os
+import time
+import bisect
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PREFIJO = 'chatbot_'
+
+# Límites superiores (segundos) de los buckets de los histogramas
+BUCKETS_POR_DEFECTO = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Histograma:
+    """Conteos acumulados por bucket, suma y total"""
+
+    __slots__ = ('conteos', 'suma', 'total')
+
+    def __init__(self, cantidad_buckets):
+        self.conteos = [0] * cantidad_buckets
+        self.suma = 0.0
+        self.total = 0
+
+
+class _Nulo:
+    """Context manager vacío para cuando las métricas están deshabilitadas"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULO = _Nulo()
+
+
+def _etiquetas(etiquetas):
+    """Convierte kwargs de etiquetas en una clave ordenada y hashable"""
+    return tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+def _formatear_etiquetas(clave, extra=None):
+    pares = list(clave) + (extra or [])
+    if not pares:
+        return ''
+    contenido = ','.join('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"')) for k, v in pares)
+    return '{' + contenido + '}'
+
+
+class RegistroMetricas:
+    """Registro de contadores e histogramas del proceso"""
+
+    def __init__(self, habilitado=True, buckets=BUCKETS_POR_DEFECTO):
+        self.habilitado = habilitado
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self._histogramas = {}
+        self._ayudas = {}
+        self._colectores = []
+
+    def describir(self, nombre, ayuda):
+        """Texto de ayuda (# HELP) de una métrica"""
+        self._ayudas[nombre] = ayuda
+
+    def contar(self, nombre, valor=1, **etiquetas):
+        """Incrementa un contador"""
+        if not self.habilitado:
+            return
+        clave = (nombre, _etiquetas(etiquetas))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, segundos, **etiquetas):
+        """Registra una duración en un histograma"""
+        if not self.habilitado:
+            return
+        clave = (nombre, _etiquetas(etiquetas))
+        indice = bisect.bisect_left(self.buckets, segundos)
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None:
+                histograma = self._histogramas[clave] = _Histograma(len(self.buckets))
+            if indice < len(self.buckets):
+                histograma.conteos[indice] += 1
+            histograma.suma += segundos
+            histograma.total += 1
+
+    def medir(self, nombre, **etiquetas):
+        """Context manager que observa la duración del bloque"""
+        if not self.habilitado:
+            return _NULO
+        return self._medir(nombre, etiquetas)
+
+    @contextmanager
+    def _medir(self, nombre, etiquetas):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+    def registrar_colector(self, colector):
+        """Agrega una función que retorna [(nombre, tipo, etiquetas, valor)] al momento de exportar"""
+        self._colectores.append(colector)
+
+    def exportar(self):
+        """Retorna todas las métricas en formato de texto de Prometheus"""
+        with self._lock:
+            contadores = dict(self._contadores)
+            histogramas = {
+                clave: (list(h.conteos), h.suma, h.total) for clave, h in self._histogramas.items()
+            }
+
+        lineas = []
+        vistos = set()
+
+        def encabezado(nombre, tipo):
+            if nombre in vistos:
+                return
+            vistos.add(nombre)
+            if nombre in self._ayudas:
+                lineas.append(f"# HELP {PREFIJO}{nombre} {self._ayudas[nombre]}")
+            lineas.append(f"# TYPE {PREFIJO}{nombre} {tipo}")
+
+        for (nombre, clave), valor in sorted(contadores.items()):
+            encabezado(nombre, 'counter')
+            lineas.append(f"{PREFIJO}{nombre}{_formatear_etiquetas(clave)} {valor}")
+
+        for (nombre, clave), (conteos, suma, total) in sorted(histogramas.items()):
+            encabezado(nombre, 'histogram')
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, conteos):
+                acumulado += conteo
+                lineas.append(f"{PREFIJO}{nombre}_bucket{_formatear_etiquetas(clave, [('le', repr(limite))])} {acumulado}")
+            lineas.append(f"{PREFIJO}{nombre}_bucket{_formatear_etiquetas(clave, [('le', '+Inf')])} {total}")
+            lineas.append(f"{PREFIJO}{nombre}_sum{_formatear_etiquetas(clave)} {suma}")
+            lineas.append(f"{PREFIJO}{nombre}_count{_formatear_etiquetas(clave)} {total}")
+
+        for colector in self._colectores:
+            try:
+                for nombre, tipo, etiquetas, valor in colector():
+                    encabezado(nombre, tipo)
+                    lineas.append(f"{PREFIJO}{nombre}{_formatear_etiquetas(_etiquetas(etiquetas))} {valor}")
+            except Exception as e:
+                logger.error(f"Error en colector de métricas: {e}")
+
+        return '\n'.join(lineas) + '\n'
+
+
+# Registro compartido por todo el proceso (en gunicorn, cada worker expone sus propias métricas)
+metricas = RegistroMetricas(habilitado=os.getenv('METRICAS_HABILITADAS', 'true').lower() == 'true')
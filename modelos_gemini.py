@@ -0,0 +1,120 @@
+"""
+Resolución de modelos de Gemini con caché
+Elige el modelo a partir de genai.list_models() (sin llamadas de generación de prueba) y lo refresca en segundo plano
+"""
+
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Modelos en orden de preferencia
+MODELOS_PREFERIDOS = [
+    'gemini-1.5-flash-latest',
+    'gemini-1.5-flash',
+    'gemini-1.5-pro-latest',
+    'gemini-1.5-pro',
+    'gemini-2.0-flash',
+    'gemini-2.0-flash-001',
+    'gemini-2.5-flash',
+    'gemini-pro-latest',
+    'gemini-pro'
+]
+
+
+class ResolutorModelos:
+    """Cachea el modelo de Gemini elegido y la lista de modelos disponibles"""
+
+    def __init__(self, listar_modelos, preferidos=None, ttl=3600, espera_error=60):
+        # listar_modelos: función que retorna los nombres de modelos con generateContent
+        self.listar_modelos = listar_modelos
+        self.preferidos = preferidos or MODELOS_PREFERIDOS
+        self.ttl = ttl
+        self.espera_error = espera_error
+        self._lock = threading.Lock()
+        self._refrescando = False
+        self._modelo = None
+        self._disponibles = []
+        self._descartados = set()
+        self._resuelto_en = None
+        self._proximo_intento = 0.0
+        self._ultimo_error = None
+
+    def obtener(self):
+        """Retorna el modelo a usar; solo bloquea si nunca se resolvió"""
+        ahora = time.monotonic()
+        if self._modelo is not None:
+            if ahora - self._resuelto_en >= self.ttl:
+                self.refrescar_en_segundo_plano()
+            return self._modelo
+
+        if ahora < self._proximo_intento:
+            return None
+        with self._lock:
+            if self._modelo is None and time.monotonic() >= self._proximo_intento:
+                self._resolver()
+            return self._modelo
+
+    def refrescar_en_segundo_plano(self):
+        """Lanza un refresco sin bloquear a quien consulta (uno a la vez)"""
+        with self._lock:
+            if self._refrescando:
+                return
+            self._refrescando = True
+
+        def refrescar():
+            try:
+                with self._lock:
+                    self._resolver()
+            finally:
+                self._refrescando = False
+
+        threading.Thread(target=refrescar, name="refresco-modelos-gemini", daemon=True).start()
+
+    def descartar(self, modelo):
+        """Marca un modelo como no disponible (p. ej. 404) y elige otro en la próxima consulta"""
+        with self._lock:
+            self._descartados.add(modelo)
+            if self._modelo == modelo:
+                logger.warning(f"Modelo {modelo} descartado, se elegirá otro")
+                self._modelo = None
+                self._proximo_intento = 0.0
+
+    def modelos_disponibles(self):
+        """Lista de modelos obtenida en la última resolución (no consulta la API)"""
+        return list(self._disponibles)
+
+    def estado(self):
+        """Estado cacheado para el endpoint de salud (no consulta la API)"""
+        return {
+            "modelo": self._modelo,
+            "disponibles": list(self._disponibles),
+            "resuelto_hace_s": round(time.monotonic() - self._resuelto_en, 1) if self._resuelto_en else None,
+            "ultimo_error": self._ultimo_error
+        }
+
+    def _resolver(self):
+        """Consulta la lista de modelos y elige el preferido (debe llamarse con el lock)"""
+        try:
+            nombres = self.listar_modelos()
+        except Exception as e:
+            self._ultimo_error = str(e)
+            self._proximo_intento = time.monotonic() + self.espera_error
+            logger.error(f"Error listando modelos de Gemini: {e}")
+            return
+
+        self._disponibles = nombres
+        self._ultimo_error = None
+        cortos = {nombre.split('/', 1)[-1] for nombre in nombres}
+        for modelo in self.preferidos:
+            if modelo in cortos and modelo not in self._descartados:
+                if modelo != self._modelo:
+                    logger.info(f"Modelo funcional encontrado: {modelo}")
+                self._modelo = modelo
+                self._resuelto_en = time.monotonic()
+                return
+
+        self._modelo = None
+        self._proximo_intento = time.monotonic() + self.espera_error
+        logger.error("Ningún modelo de Gemini está disponible")
@@ -0,0 +1,125 @@
+"""
+Configuración de logging del proceso
+Escritura no bloqueante (QueueHandler), nivel por LOG_LEVEL, formato texto o JSON y redacción de teléfonos y mensajes
+"""
+
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+
+NIVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+FORMATO = os.getenv('LOG_FORMATO', 'texto').lower()
+FORMATO_TEXTO = logging.BASIC_FORMAT
+
+# Redacción de datos personales y muestreo de los registros de DEBUG con el contenido de los mensajes
+REDACTAR_TELEFONOS = os.getenv('LOG_REDACTAR_TELEFONOS', 'true').lower() == 'true'
+REDACTAR_MENSAJES = os.getenv('LOG_REDACTAR_MENSAJES', 'true').lower() == 'true'
+MUESTREO_DEBUG = float(os.getenv('LOG_MUESTREO_DEBUG', 0.01))
+LARGO_MENSAJE = int(os.getenv('LOG_LARGO_MENSAJE', 100))
+
+# Atributos propios de LogRecord: el resto son campos estructurados pasados con extra={...}
+_ATRIBUTOS_REGISTRO = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_manejador = None
+_listener = None
+_pid = None
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro, con los campos de extra={...} al mismo nivel"""
+
+    def format(self, record):
+        datos = {
+            "ts": self.formatTime(record),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_REGISTRO:
+                datos[clave] = valor
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class _Redactado:
+    """Valor que se formatea (y redacta) solo si el registro llega a escribirse"""
+
+    __slots__ = ('valor', 'funcion')
+
+    def __init__(self, valor, funcion):
+        self.valor = valor
+        self.funcion = funcion
+
+    def __str__(self):
+        return self.funcion(self.valor)
+
+    def __repr__(self):
+        return self.funcion(self.valor)
+
+
+def _redactar_telefono(numero):
+    if not numero or not REDACTAR_TELEFONOS:
+        return str(numero)
+    # whatsapp:+5491122334455 -> whatsapp:***4455
+    canal, _, telefono = str(numero).rpartition(':')
+    return f"{canal + ':' if canal else ''}***{telefono[-4:]}"
+
+
+def _redactar_mensaje(texto):
+    texto = str(texto)
+    if REDACTAR_MENSAJES:
+        return f"<{len(texto)} caracteres>"
+    return texto if len(texto) <= LARGO_MENSAJE else texto[:LARGO_MENSAJE] + '...'
+
+
+def telefono_log(numero):
+    """Número de teléfono para logs (enmascarado si LOG_REDACTAR_TELEFONOS=true)"""
+    return _Redactado(numero, _redactar_telefono)
+
+
+def texto_log(texto):
+    """Contenido de un mensaje para logs (solo su largo si LOG_REDACTAR_MENSAJES=true)"""
+    return _Redactado(texto, _redactar_mensaje)
+
+
+def muestrear_debug(logger):
+    """True para una fracción LOG_MUESTREO_DEBUG de las llamadas cuando el logger tiene DEBUG activo"""
+    return logger.isEnabledFor(logging.DEBUG) and random.random() < MUESTREO_DEBUG
+
+
+def configurar_logging():
+    """Envía los registros a una cola que un hilo aparte escribe en stdout (una vez por proceso)"""
+    global _manejador, _listener, _pid
+
+    if _pid == os.getpid():
+        return
+    # Tras un fork el hilo del listener no existe en el hijo y la cola heredada puede quedar
+    # bloqueada: cada proceso usa su propia cola y su propio hilo
+    cola = queue.SimpleQueue()
+    raiz = logging.getLogger()
+    if _manejador is None:
+        _manejador = logging.handlers.QueueHandler(cola)
+        raiz.handlers = [_manejador]
+        atexit.register(detener_logging)
+    else:
+        _manejador.queue = cola
+    raiz.setLevel(NIVEL)
+
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(FormatoJSON() if FORMATO == 'json' else logging.Formatter(FORMATO_TEXTO))
+    _listener = logging.handlers.QueueListener(cola, salida)
+    _listener.start()
+    _pid = os.getpid()
+
+
+def detener_logging():
+    """Escribe los registros pendientes y detiene el hilo del listener"""
+    global _listener
+    if _listener is not None and _pid == os.getpid():
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,86 @@
+"""
+Utilidades de resiliencia para llamadas a proveedores externos
+Interruptor de circuito y espera con backoff exponencial y jitter
+"""
+
+import time
+import random
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitoAbierto(Exception):
+    """El proveedor está fallando y el circuito rechaza llamadas sin intentarlas"""
+
+
+class InterruptorCircuito:
+    """Circuito cerrado/abierto/semiabierto que corta las llamadas tras fallos consecutivos"""
+
+    CERRADO = "cerrado"
+    ABIERTO = "abierto"
+    SEMIABIERTO = "semiabierto"
+
+    def __init__(self, nombre, max_fallos=5, tiempo_apertura=30.0):
+        self.nombre = nombre
+        self.max_fallos = max_fallos
+        self.tiempo_apertura = tiempo_apertura
+        self._lock = threading.Lock()
+        self._fallos = 0
+        self._abierto_desde = None
+        self._prueba_en_curso = False
+
+    @property
+    def estado(self):
+        """Estado actual del circuito"""
+        with self._lock:
+            return self._estado(time.monotonic())
+
+    def _estado(self, ahora):
+        if self._abierto_desde is None:
+            return self.CERRADO
+        if ahora - self._abierto_desde >= self.tiempo_apertura:
+            return self.SEMIABIERTO
+        return self.ABIERTO
+
+    def permitir(self):
+        """Lanza CircuitoAbierto si no se debe intentar la llamada"""
+        with self._lock:
+            estado = self._estado(time.monotonic())
+            if estado == self.CERRADO:
+                return
+            # En semiabierto solo se deja pasar una llamada de prueba a la vez
+            if estado == self.SEMIABIERTO and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return
+        raise CircuitoAbierto(f"Circuito de {self.nombre} abierto")
+
+    def registrar_exito(self):
+        """Cierra el circuito tras una llamada exitosa"""
+        with self._lock:
+            if self._abierto_desde is not None:
+                logger.info(f"Circuito de {self.nombre} cerrado")
+            self._fallos = 0
+            self._abierto_desde = None
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self):
+        """Cuenta un fallo y abre el circuito al superar el límite"""
+        with self._lock:
+            self._fallos += 1
+            self._prueba_en_curso = False
+            if self._fallos >= self.max_fallos or self._abierto_desde is not None:
+                if self._abierto_desde is None:
+                    logger.warning(f"Circuito de {self.nombre} abierto tras {self._fallos} fallos consecutivos")
+                self._abierto_desde = time.monotonic()
+
+
+def esperar_reintento(intento, base=0.5, maximo=8.0, retry_after=None):
+    """Duerme antes del reintento usando backoff exponencial con jitter completo"""
+    if retry_after is not None:
+        espera = min(float(retry_after), maximo)
+    else:
+        espera = random.uniform(0, min(maximo, base * (2 ** intento)))
+    time.sleep(espera)
+    return espera
@@ -0,0 +1,210 @@
+"""
+Resolución aproximada de nombres de producto
+Compara la consulta con todos los nombres del inventario en una sola pasada vectorizada (firmas de
+trigramas de 128 bits y similitud de Jaccard) y confirma los mejores candidatos con los trigramas exactos
+"""
+
+import re
+import copy
+import zlib
+import threading
+import logging
+
+# NumPy se importa dentro de las funciones que lo usan (no hace falta para arrancar la aplicación)
+
+from busqueda_inventario import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+# Firma de cada nombre: 2 palabras de 64 bits, un bit por trigrama (por hash). Las colisiones solo
+# afectan a la preselección: la similitud final se calcula con los trigramas exactos
+PALABRAS_FIRMA = 2
+BITS_FIRMA = PALABRAS_FIRMA * 64
+
+# Candidatos de la pasada aproximada que se confirman con los trigramas exactos
+MAX_CANDIDATOS = 32
+
+# Similitud de Jaccard mínima para considerar un nombre como candidato
+SIMILITUD_MINIMA = 0.3
+
+_PATRON_PALABRA = re.compile(r'[a-z0-9]+')
+
+# Cantidad de bits en 1 de cada byte, para NumPy sin bitwise_count (< 2.0); se crea en el primer uso
+_BITS_POR_BYTE = None
+
+
+def _contar_bits(valores):
+    """Bits en 1 de cada elemento de un arreglo uint64 (como uint8)"""
+    global _BITS_POR_BYTE
+    import numpy as np
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(valores)
+    if _BITS_POR_BYTE is None:
+        _BITS_POR_BYTE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    return _BITS_POR_BYTE[valores.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+def palabras_normalizadas(texto):
+    """Palabras en minúsculas, sin acentos ni signos"""
+    return _PATRON_PALABRA.findall(normalizar_texto(texto))
+
+
+class IndiceNombres:
+    """Trigramas y firmas de bits de los nombres de producto de una versión del inventario"""
+
+    def __init__(self, nombres):
+        import numpy as np
+        self.nombres = [str(nombre) for nombre in nombres]
+        self.palabras = [tuple(palabras_normalizadas(nombre)) for nombre in self.nombres]
+        self.total = len(self.nombres)
+        # Cada palabra distinta se procesa una vez: los nombres comparten marcas, tipos y modelos
+        self._trigramas = {}
+        self._mascaras = {}
+
+        firmas = b''.join(self._mascara(palabras).to_bytes(BITS_FIRMA // 8, 'little') for palabras in self.palabras)
+        matriz = np.frombuffer(firmas, dtype='<u8').reshape(self.total, PALABRAS_FIRMA)
+        # Un arreglo contiguo por palabra de la firma: cada operación recorre memoria seguida
+        self.firmas = [np.ascontiguousarray(matriz[:, i], dtype=np.uint64) for i in range(PALABRAS_FIRMA)]
+        self.bits = self._comunes(None)
+
+    def actualizado(self, df, posiciones):
+        """Copia del índice para df, que solo difiere del anterior en las posiciones dadas y en su largo"""
+        import numpy as np
+        total = len(df)
+        nuevas = [p for p in posiciones if p < total]
+        indice = copy.copy(self)
+        indice.total = total
+        indice.nombres = self.nombres[:total] + [''] * max(0, total - self.total)
+        indice.palabras = self.palabras[:total] + [()] * max(0, total - self.total)
+        indice.firmas = [np.zeros(total, dtype=np.uint64) for _ in range(PALABRAS_FIRMA)]
+        conservadas = min(total, self.total)
+        for nueva, anterior in zip(indice.firmas, self.firmas):
+            nueva[:conservadas] = anterior[:conservadas]
+
+        productos = df['Producto']
+        for posicion in nuevas:
+            indice.nombres[posicion] = str(productos.iat[posicion])
+            indice.palabras[posicion] = tuple(palabras_normalizadas(indice.nombres[posicion]))
+            mascara = self._mascara(indice.palabras[posicion])
+            for i in range(PALABRAS_FIRMA):
+                indice.firmas[i][posicion] = (mascara >> (64 * i)) & 0xFFFFFFFFFFFFFFFF
+        indice.bits = indice._comunes(None)
+        return indice
+
+    def trigramas_palabra(self, palabra):
+        trigramas = self._trigramas.get(palabra)
+        if trigramas is None:
+            relleno = f" {palabra} "
+            trigramas = frozenset(relleno[i:i + 3] for i in range(len(relleno) - 2))
+            self._trigramas[palabra] = trigramas
+        return trigramas
+
+    def trigramas(self, palabras):
+        """Trigramas de las palabras (cada palabra con un espacio a cada lado)"""
+        return frozenset().union(*(self.trigramas_palabra(p) for p in palabras))
+
+    def _mascara(self, palabras):
+        """Firma de bits (entero de BITS_FIRMA bits) de una secuencia de palabras"""
+        mascara = 0
+        for palabra in palabras:
+            parcial = self._mascaras.get(palabra)
+            if parcial is None:
+                parcial = 0
+                for trigrama in self.trigramas_palabra(palabra):
+                    parcial |= 1 << (zlib.crc32(trigrama.encode()) % BITS_FIRMA)
+                self._mascaras[palabra] = parcial
+            mascara |= parcial
+        return mascara
+
+    def _comunes(self, consulta):
+        """Bits en 1 compartidos por la firma de cada nombre y la de la consulta (None: bits de cada nombre)"""
+        import numpy as np
+        total = None
+        for i, firmas in enumerate(self.firmas):
+            bits = _contar_bits(firmas if consulta is None else firmas & consulta[i])
+            # Como máximo BITS_FIRMA (128): la suma entra en uint8
+            total = bits if total is None else np.add(total, bits, out=total)
+        return total
+
+    def buscar(self, palabras, k=5, minimo=SIMILITUD_MINIMA):
+        """[(posición, similitud)] de los k nombres más parecidos a las palabras, de mayor a menor
+
+        La similitud es el Jaccard de los trigramas. Todos los nombres se puntúan con sus firmas en
+        una pasada y solo los mejores candidatos se comparan con los trigramas exactos.
+        """
+        import numpy as np
+        palabras = [p for p in palabras if p]
+        if not palabras or not self.total:
+            return []
+        consulta = np.frombuffer(self._mascara(palabras).to_bytes(BITS_FIRMA // 8, 'little'), dtype='<u8')
+        bits_consulta = int(_contar_bits(consulta).sum())
+
+        comunes = self._comunes(consulta.astype(np.uint64))
+        # Jaccard >= minimo exige compartir al menos minimo * |consulta| trigramas; además se descartan
+        # los nombres con menos de la mitad de coincidencias que el mejor, que no pueden quedar entre los primeros
+        umbral = max(1, int(minimo * bits_consulta), int(comunes.max()) // 2)
+        candidatos = np.flatnonzero(comunes >= umbral)
+        if len(candidatos) > MAX_CANDIDATOS:
+            comunes_candidatos = comunes[candidatos].astype(np.float32)
+            aproximada = comunes_candidatos / (bits_consulta + self.bits[candidatos] - comunes_candidatos)
+            candidatos = candidatos[np.argpartition(aproximada, -MAX_CANDIDATOS)[-MAX_CANDIDATOS:]]
+
+        trigramas_consulta = self.trigramas(palabras)
+        resultados = []
+        for posicion in candidatos.tolist():
+            trigramas = self.trigramas(self.palabras[posicion])
+            comunes = len(trigramas_consulta & trigramas)
+            similitud = comunes / (len(trigramas_consulta) + len(trigramas) - comunes)
+            if similitud >= minimo:
+                resultados.append((posicion, similitud))
+        resultados.sort(key=lambda r: (-r[1], r[0]))
+        return resultados[:k]
+
+
+class ResolutorProductos:
+    """Mantiene el índice de nombres de la versión actual del inventario"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._indice = None
+        # Índice de la versión anterior, para las consultas que empezaron antes de un lote de cambios
+        self._anterior = (None, None)
+        # (df, índice) del último DataFrame sin versión (subconjuntos o snapshots ya reemplazados); se guarda
+        # el DataFrame para comparar por identidad sin que su id se reutilice
+        self._sin_version = (None, None)
+
+    def obtener_indice(self, df, version):
+        """Retorna el índice para la versión dada, construyéndolo si hace falta"""
+        if version is None:
+            with self._lock:
+                if self._sin_version[0] is not df:
+                    self._sin_version = (df, IndiceNombres(df['Producto'].tolist()))
+                return self._sin_version[1]
+        with self._lock:
+            if self._version != version:
+                if self._anterior[0] == version:
+                    return self._anterior[1]
+                self._indice = IndiceNombres(df['Producto'].tolist())
+                self._version = version
+                logger.info(f"Índice de nombres construido para inventario v{version} ({self._indice.total} productos)")
+            return self._indice
+
+    def actualizar(self, df, version_anterior, version, posiciones):
+        """Lleva el índice de version_anterior a version rehaciendo solo las posiciones modificadas"""
+        with self._lock:
+            if self._version != version_anterior or self._indice is None:
+                return
+            self._anterior = (self._version, self._indice)
+            self._indice = self._indice.actualizado(df, posiciones)
+            self._version = version
+
+    def buscar(self, palabras, df, version, k=5, minimo=SIMILITUD_MINIMA):
+        """[(posición, similitud)] de los productos de df cuyo nombre más se parece a las palabras"""
+        if df.empty or 'Producto' not in df.columns:
+            return []
+        return self.obtener_indice(df, version).buscar(palabras, k, minimo)
+
+
+# Resolutor compartido por todo el proceso
+resolutor_productos = ResolutorProductos()
@@ -0,0 +1,118 @@
+"""
+Respuestas en streaming de los proveedores de IA
+Junta los fragmentos, corta la generación al llegar al límite de caracteres y adelanta la primera oración completa
+"""
+
+import re
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Fin de oración: puntuación seguida de espacio, o salto de línea ("3." seguido de "5" no cuenta)
+FIN_ORACION = re.compile(r'[.!?…:](?=\s)|\n')
+
+
+class EntregaAnticipada:
+    """Envía la primera oración de la respuesta apenas está completa, antes de que termine la generación"""
+
+    def __init__(self, enviar, min_caracteres=40):
+        self.enviar = enviar
+        self.min_caracteres = min_caracteres
+        self.enviado = ''
+        self._intentado = False
+        self._lock = threading.Lock()
+
+    def ofrecer(self, texto):
+        """Recibe el texto acumulado y envía la primera oración completa de al menos min_caracteres"""
+        if self._intentado:
+            return
+        fin = FIN_ORACION.search(texto, max(0, self.min_caracteres - 1))
+        if fin is None:
+            return
+        with self._lock:
+            if self._intentado:
+                return
+            self._intentado = True
+            segmento = texto[:fin.end()].strip()
+            try:
+                self.enviar(segmento)
+                self.enviado = segmento
+            except Exception as e:
+                # Sin el primer segmento la respuesta se envía completa al final
+                logger.error(f"Error enviando el primer segmento de la respuesta: {e}")
+
+    def cancelar(self):
+        """Impide el envío anticipado; retorna False si ya se había enviado un segmento"""
+        with self._lock:
+            self._intentado = True
+            return not self.enviado
+
+    def resto(self, respuesta):
+        """Parte de la respuesta final que todavía falta enviar"""
+        respuesta = respuesta.lstrip()
+        if self.enviado and respuesta.startswith(self.enviado):
+            return respuesta[len(self.enviado):].strip()
+        return respuesta
+
+
+class AcumuladorRespuesta:
+    """Consume los fragmentos de un streaming hasta el límite de caracteres"""
+
+    def __init__(self, max_caracteres, entrega=None, cancelado=None):
+        self.max_caracteres = max_caracteres
+        self.entrega = entrega
+        self.cancelado = cancelado
+        self.partes = []
+        self.largo = 0
+        self.inicio = time.perf_counter()
+        self.primer_fragmento = None
+
+    def consumir(self, fragmentos):
+        """Lee fragmentos hasta terminar o superar el límite (cerrando el streaming) y retorna la respuesta"""
+        try:
+            for fragmento in fragmentos:
+                if self.primer_fragmento is None:
+                    self.primer_fragmento = time.perf_counter() - self.inicio
+                self.partes.append(fragmento)
+                self.largo += len(fragmento)
+                if self.largo > self.max_caracteres:
+                    # Todo lo que se genere a partir de aquí se descartaría: cortar la generación
+                    break
+                if self.cancelado is not None and self.cancelado.is_set():
+                    # Otro proveedor respondió primero
+                    break
+                if self.entrega is not None:
+                    self.entrega.ofrecer(''.join(self.partes))
+        finally:
+            cerrar = getattr(fragmentos, 'close', None)
+            if cerrar is not None:
+                cerrar()
+        return self.resultado()
+
+    def resultado(self):
+        """Texto acumulado, truncado con "..." igual que las respuestas completas"""
+        texto = ''.join(self.partes)
+        if len(texto) > self.max_caracteres:
+            texto = texto[:self.max_caracteres] + "..."
+        return texto
+
+
+def fragmentos_gemini(response):
+    """Textos de una respuesta de Gemini con stream=True; al cerrar el generador se corta la conexión"""
+    try:
+        for chunk in response:
+            try:
+                texto = chunk.text
+            except ValueError:
+                # Fragmento sin partes de texto (por ejemplo, solo el motivo de finalización)
+                continue
+            if texto:
+                yield texto
+    finally:
+        # La librería no expone cómo cancelar el streaming: con el transporte REST se cierra
+        # la respuesta HTTP subyacente para que el servidor deje de generar
+        conexion = getattr(getattr(response, '_iterator', None), '_response', None)
+        if conexion is not None:
+            conexion.close()
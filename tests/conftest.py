@@ -0,0 +1,76 @@
+"""
+Configuración común de las pruebas: el código de la aplicación está en la raíz del repositorio y las
+pruebas usan el inventario.xlsx de ejemplo
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Los módulos registran cada operación; en las pruebas solo interesan los errores
+logging.disable(logging.WARNING)
+
+
+class Reloj:
+    """Reemplazo de time.monotonic que solo avanza cuando la prueba lo indica"""
+
+    def __init__(self, inicio=1000.0):
+        self.ahora = inicio
+
+    def __call__(self):
+        return self.ahora
+
+    def avanzar(self, segundos):
+        self.ahora += segundos
+
+
+class _TiempoManual:
+    """Módulo time con monotonic reemplazado por el reloj manual (el resto sin cambios)"""
+
+    def __init__(self, reloj):
+        self.monotonic = reloj
+
+    def __getattr__(self, nombre):
+        return getattr(time, nombre)
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    """Reloj manual para los módulos que miden tiempo con time.monotonic"""
+    import limitador
+    import resiliencia
+    reloj = Reloj()
+    for modulo in (limitador, resiliencia):
+        monkeypatch.setattr(modulo, 'time', _TiempoManual(reloj))
+    return reloj
+
+
+@pytest.fixture
+def ruta_inventario(tmp_path):
+    """Copia del inventario de ejemplo en un directorio temporal (la base SQLite se crea al lado)"""
+    ruta = tmp_path / 'inventario.xlsx'
+    shutil.copy(os.path.join(RAIZ, 'inventario.xlsx'), ruta)
+    return str(ruta)
+
+
+@pytest.fixture
+def inventario_df(ruta_inventario):
+    """DataFrame del inventario de ejemplo"""
+    import pandas as pd
+    return pd.read_excel(ruta_inventario)
+
+
+@pytest.fixture
+def almacen(ruta_inventario):
+    """AlmacenInventario con base SQLite sobre la copia del inventario de ejemplo"""
+    from almacen_inventario import AlmacenInventario
+    almacen = AlmacenInventario(ruta_inventario, ruta_base=ruta_inventario[:-len('.xlsx')] + '.db')
+    almacen.obtener_snapshot()
+    return almacen
@@ -0,0 +1,104 @@
+"""
+Cambios incrementales del inventario: la planificación, el snapshot en memoria, la base SQLite y la
+reproducción del registro de cambios en otro proceso deben terminar con las mismas filas en las mismas posiciones
+"""
+
+import pytest
+
+from almacen_inventario import AlmacenInventario
+from cambios_inventario import (
+    ErrorCambios, normalizar_operaciones, planificar, lector_filas, aplicar_a_dataframe
+)
+from inventario_sqlite import importar_inventario, leer_base, leer_cambios, aplicar_lotes
+
+COLUMNAS = ['ID', 'Producto', 'Categoria', 'Precio', 'Stock', 'Proveedor', 'Descripcion']
+NUMERICAS = ['Precio', 'Stock']
+
+# Alta, modificación y bajas (una del medio, que mueve la última fila al hueco, y una inexistente)
+ALTAS = [
+    {'ID': 11, 'Producto': 'Parlante JBL Flip 6', 'Categoria': 'Audio', 'Precio': 130, 'Stock': 9, 'Proveedor': 'JBL'},
+    {'ID': 3, 'Stock': 2, 'Precio': 140},
+]
+BAJAS = [5, 99]
+
+
+def filas(df):
+    """Filas del DataFrame como dicts comparables (sin diferencias de tipos numéricos ni de nulos)"""
+    fila_en = lector_filas(df)
+    return [
+        {c: int(v) if isinstance(v, float) and v.is_integer() else v for c, v in fila_en(p).items()}
+        for p in range(len(df))
+    ]
+
+
+def plan_sobre(df, altas, bajas):
+    """Planifica el lote sobre df como lo hace el almacén (mapa de IDs a posiciones)"""
+    claves = {str(int(v)): p for p, v in enumerate(df['ID'])}
+    operaciones = normalizar_operaciones(altas, bajas, list(df.columns), NUMERICAS)
+    return operaciones, planificar(operaciones, claves.get, lector_filas(df), len(df), list(df.columns))
+
+
+def test_plan_agrega_actualiza_y_elimina(inventario_df):
+    _, plan = plan_sobre(inventario_df, ALTAS, BAJAS)
+    assert plan.resumen == {'insertados': 1, 'actualizados': 1, 'eliminados': 1}
+    assert plan.no_encontrados == ['99']
+    assert plan.total == 10
+    # La fila nueva se agregó al final (posición 10) y la baja del ID 5 la movió a su posición
+    assert plan.claves == {'11': 4, '5': None}
+    assert plan.escrituras[4]['Producto'] == 'Parlante JBL Flip 6'
+    assert plan.escrituras[2]['Stock'] == 2 and plan.escrituras[2]['Producto'] == 'Teclado Mecánico Razer'
+
+    df = aplicar_a_dataframe(inventario_df, plan)
+    assert len(df) == 10
+    assert df['ID'].tolist() == [1, 2, 3, 4, 11, 6, 7, 8, 9, 10]
+    # El DataFrame del snapshot anterior no se modifica
+    assert inventario_df['ID'].tolist() == list(range(1, 11))
+
+
+@pytest.mark.parametrize('altas, bajas', [
+    ([{'ID': 3, 'Producto': None}], []),
+    ([{'ID': 3, 'Producto': '  '}], []),
+    ([{'ID': None, 'Producto': 'Sin ID'}], []),
+    ([{'ID': 20, 'Stock': 5}], []),
+    ([{'ID': 3, 'Stock': 'muchos'}], []),
+    ([{'ID': 3, 'Color': 'rojo'}], []),
+])
+def test_lotes_invalidos(inventario_df, altas, bajas):
+    with pytest.raises(ErrorCambios):
+        plan_sobre(inventario_df, altas, bajas)
+
+
+def test_base_sqlite_igual_a_memoria(inventario_df, ruta_inventario, tmp_path):
+    ruta_base = str(tmp_path / 'directo.db')
+    importar_inventario(ruta_inventario, ruta_base)
+    df, meta = leer_base(ruta_base)
+    operaciones, plan = plan_sobre(df, ALTAS, BAJAS)
+
+    assert aplicar_lotes(ruta_base, meta['huella'], [('lote-1', operaciones)]) == [('lote-1', 1)]
+    persistido, meta_final = leer_base(ruta_base)
+    assert filas(persistido) == filas(aplicar_a_dataframe(df, plan))
+    assert meta_final['secuencia'] == '1'
+
+    # Una base reimportada (otra huella) no acepta los lotes
+    assert aplicar_lotes(ruta_base, 'otra-huella', [('lote-2', operaciones)]) is None
+
+
+def test_almacen_persiste_y_otro_proceso_reproduce_los_cambios(almacen, ruta_inventario):
+    otro = AlmacenInventario(ruta_inventario, intervalo_verificacion=0, ruta_base=almacen.ruta_base)
+    otro.obtener_snapshot()
+
+    almacen.aplicar_cambios(ALTAS[:1])
+    snapshot, _ = almacen.aplicar_cambios(ALTAS[1:], BAJAS)
+    assert almacen.esperar_persistencia()
+
+    persistido, _ = leer_base(almacen.ruta_base)
+    assert filas(persistido) == filas(snapshot.df)
+    _, lotes = leer_cambios(almacen.ruta_base, 0)
+    assert len(lotes) == 2
+
+    # El otro almacén aplica los dos lotes del registro sobre su snapshot, sin releer la base
+    externo = otro.obtener_snapshot()
+    assert externo.version == 3
+    assert externo.cambios == snapshot.cambios
+    assert filas(externo.df) == filas(snapshot.df)
+    assert otro.consultas_de(externo.df).buscar_por_nombre('parlante jbl', limite=1)[0][0] == 4
@@ -0,0 +1,54 @@
+"""
+Clasificador de mensajes: palabras prohibidas, saludos e intenciones
+"""
+
+import pytest
+
+from clasificador_mensajes import ClasificadorMensajes
+from config_agente import obtener_limites
+
+
+@pytest.fixture
+def clasificador():
+    return ClasificadorMensajes(obtener_limites()['palabras_prohibidas'])
+
+
+@pytest.mark.parametrize('texto', [
+    'productos de accesorios',
+    'qué accesorios tienen',
+    'precio del cargador usb-c',
+    'hay stock del chip',
+])
+def test_consultas_del_inventario_no_se_bloquean(clasificador, texto):
+    assert not clasificador.clasificar(texto).bloqueado
+
+
+@pytest.mark.parametrize('texto', [
+    'quiero comprar un mouse',
+    'necesito acceso al sistema',
+    'aceptan pagos con tarjetas?',
+    'cuál es la contraseña',
+])
+def test_palabras_prohibidas_y_sus_plurales(clasificador, texto):
+    assert clasificador.clasificar(texto).bloqueado
+
+
+@pytest.mark.parametrize('texto', [
+    'hola',
+    'Hola!',
+    'hola, buenas tardes',
+    'buenos días, ¿cómo estás?',
+    'hi',
+])
+def test_saludos(clasificador, texto):
+    assert clasificador.clasificar(texto).saludo
+
+
+@pytest.mark.parametrize('texto', [
+    'Hi-Fi audio',
+    'hello kitty',
+    'hola, precio del mouse logitech',
+    'hola, qué productos tienen',
+])
+def test_mensajes_con_saludo_y_consulta_no_son_saludos(clasificador, texto):
+    assert not clasificador.clasificar(texto).saludo
@@ -0,0 +1,24 @@
+"""
+Cliente de SiliconFlow: cualquier error de requests cuenta como fallo del circuito
+"""
+
+import pytest
+
+from cliente_siliconflow import ClienteSiliconFlow, ErrorSiliconFlow
+from resiliencia import InterruptorCircuito
+
+
+def test_error_de_requests_libera_la_prueba_del_circuito(reloj):
+    circuito = InterruptorCircuito('siliconflow', max_fallos=1, tiempo_apertura=30.0)
+    # Sin esquema: requests lanza MissingSchema, que no es de conexión ni de timeout
+    cliente = ClienteSiliconFlow('clave', 'api.invalida/v1/chat/completions', 'modelo', circuito=circuito)
+    circuito.registrar_fallo()
+    reloj.avanzar(30)
+
+    with pytest.raises(ErrorSiliconFlow):
+        cliente.completar('hola')
+    assert circuito.estado == InterruptorCircuito.ABIERTO
+
+    # Tras el tiempo de apertura se admite otra prueba (antes quedaba en curso para siempre)
+    reloj.avanzar(30)
+    circuito.permitir()
@@ -0,0 +1,32 @@
+"""
+Cola de respuestas en memoria: al detenerse procesa los mensajes pendientes dentro del timeout
+"""
+
+import time
+import logging
+
+from cola_respuestas import ColaRespuestas
+
+
+def test_detener_procesa_los_pendientes():
+    procesadas = []
+    cola = ColaRespuestas(lambda tarea: (time.sleep(0.01), procesadas.append(tarea['n'])), hilos=2)
+    for n in range(20):
+        assert cola.encolar({'n': n})
+    cola.detener(timeout=5)
+    assert sorted(procesadas) == list(range(20))
+    assert cola.profundidad() == 0
+
+
+def test_detener_registra_los_descartados_al_vencer_el_timeout(caplog):
+    cola = ColaRespuestas(lambda tarea: time.sleep(0.5), hilos=1)
+    for n in range(5):
+        cola.encolar({'n': n})
+    logging.disable(logging.NOTSET)
+    try:
+        with caplog.at_level(logging.WARNING, logger='cola_respuestas'):
+            cola.detener(timeout=0.2)
+    finally:
+        logging.disable(logging.WARNING)
+    assert cola.profundidad() == 0
+    assert 'mensajes sin procesar' in caplog.text
@@ -0,0 +1,76 @@
+"""
+Configuración dinámica: Redis solo aplica configuraciones del mismo despliegue y más nuevas que la local
+"""
+
+import json
+
+import pytest
+
+from configuracion_dinamica import AlmacenConfiguracion
+
+
+class RedisEnMemoria:
+    """Lo mínimo de redis.Redis que usa AlmacenConfiguracion para publicar y leer"""
+
+    def __init__(self):
+        self.datos = {}
+
+    def set(self, clave, valor):
+        self.datos[clave] = valor
+
+    def get(self, clave):
+        return self.datos.get(clave)
+
+    def publish(self, canal, mensaje):
+        return 0
+
+
+@pytest.fixture
+def redis_compartido():
+    return RedisEnMemoria()
+
+
+def nodo(tmp_path, redis_client, nombre):
+    return AlmacenConfiguracion(ruta=str(tmp_path / f'{nombre}.json'), redis_client=redis_client)
+
+
+def test_nodo_nuevo_toma_la_configuracion_publicada(tmp_path, redis_compartido):
+    primero = nodo(tmp_path, redis_compartido, 'a')
+    guardada = primero.guardar(limites=dict(primero.obtener().limites, max_intentos_consulta=7))
+
+    segundo = nodo(tmp_path, redis_compartido, 'b')
+    segundo._leer_redis()
+    assert segundo.obtener().huella == guardada.huella
+
+
+def test_clave_de_otro_despliegue_se_ignora(tmp_path, redis_compartido):
+    primero = nodo(tmp_path, redis_compartido, 'a')
+    primero.guardar(system_prompt='prompt del despliegue anterior')
+    datos = json.loads(redis_compartido.datos['config_agente_actual'])
+    datos['base'] = 'otra-version'
+    redis_compartido.datos['config_agente_actual'] = json.dumps(datos)
+
+    segundo = nodo(tmp_path, redis_compartido, 'b')
+    por_defecto = segundo.obtener()
+    segundo._leer_redis()
+    assert segundo.obtener() is por_defecto
+
+
+def test_clave_sin_base_se_ignora(tmp_path, redis_compartido):
+    primero = nodo(tmp_path, redis_compartido, 'a')
+    datos = dict(primero.obtener()._asdict(), system_prompt='prompt sin base')
+    redis_compartido.datos['config_agente_actual'] = json.dumps(datos)
+    primero._leer_redis()
+    assert primero.obtener().system_prompt != 'prompt sin base'
+
+
+def test_configuracion_local_mas_nueva_no_se_pisa(tmp_path, redis_compartido):
+    primero = nodo(tmp_path, redis_compartido, 'a')
+    primero.guardar(system_prompt='prompt publicado')
+    datos = json.loads(redis_compartido.datos['config_agente_actual'])
+
+    segundo = nodo(tmp_path, redis_compartido, 'b')
+    local = segundo.guardar(system_prompt='prompt local, guardado después')
+    redis_compartido.datos['config_agente_actual'] = json.dumps(datos)
+    segundo._leer_redis()
+    assert segundo.obtener().huella == local.huella
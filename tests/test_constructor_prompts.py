@@ -0,0 +1,44 @@
+"""
+Caché de prompts: también se reutiliza con las filas seleccionadas de un inventario grande
+"""
+
+import pytest
+
+from busqueda_inventario import BuscadorInventario
+from constructor_prompts import ConstructorPrompts
+
+
+@pytest.fixture
+def inventario_grande(inventario_df):
+    import pandas as pd
+    df = pd.concat([inventario_df] * 10, ignore_index=True)
+    df['ID'] = range(1, len(df) + 1)
+    return df
+
+
+def test_subconjunto_reutiliza_el_prompt(inventario_grande):
+    buscador = BuscadorInventario()
+    constructor = ConstructorPrompts()
+    filas = buscador.seleccionar_filas(inventario_grande, 'mouse logitech', 7, top_k=8, min_filas=50)
+    assert len(filas) < len(inventario_grande)
+    version = buscador.version_de(filas)
+    assert version.startswith('7/')
+
+    primero = constructor.contexto('gemini', 'prompt', filas, version, 'c1')
+    otra_vez = buscador.seleccionar_filas(inventario_grande, 'mouse logitech', 7, top_k=8, min_filas=50)
+    assert buscador.version_de(otra_vez) == version
+    assert constructor.contexto('gemini', 'prompt', otra_vez, version, 'c1') is primero
+
+
+def test_selecciones_distintas_no_comparten_prompt(inventario_grande):
+    buscador = BuscadorInventario()
+    mouse = buscador.seleccionar_filas(inventario_grande, 'mouse logitech', 7, top_k=8, min_filas=50)
+    disco = buscador.seleccionar_filas(inventario_grande, 'disco ssd', 7, top_k=8, min_filas=50)
+    otra_version = buscador.seleccionar_filas(inventario_grande, 'mouse logitech', 8, top_k=8, min_filas=50)
+    assert len({buscador.version_de(mouse), buscador.version_de(disco), buscador.version_de(otra_version)}) == 3
+
+
+def test_sin_version_no_se_cachea(inventario_grande):
+    buscador = BuscadorInventario()
+    filas = buscador.seleccionar_filas(inventario_grande, 'mouse logitech', None, top_k=8, min_filas=50)
+    assert buscador.version_de(filas) is None
@@ -0,0 +1,94 @@
+"""
+Camino rápido: responde solo cuando la consulta nombra un producto del inventario sin ambigüedad
+"""
+
+import pytest
+
+from config_agente import obtener_configuracion
+from consultas_rapidas import MotorConsultasRapidas
+
+
+@pytest.fixture
+def motor():
+    return MotorConsultasRapidas()
+
+
+@pytest.mark.parametrize('consulta', [
+    'precio iphone 15 pro',
+    'precio del samsung galaxy s24',
+    'precio dell xps 15',
+])
+def test_producto_inexistente_escala_a_la_ia(motor, inventario_df, consulta):
+    assert motor.responder(consulta, inventario_df, 1, obtener_configuracion()) is None
+
+
+@pytest.mark.parametrize('consulta, esperado', [
+    ('precio del mouse logitech', 'Mouse Logitech MX Master 3: $99'),
+    ('precio laptop dell xps 13', 'Laptop Dell XPS 13: $1,200'),
+    ('stock del iphone 14', 'Smartphone iPhone 14: 4 unidades'),
+    ('precio smartphon iphone', 'Smartphone iPhone 14: $800'),
+])
+def test_producto_existente(motor, inventario_df, consulta, esperado):
+    respuesta = motor.responder(consulta, inventario_df, 1, obtener_configuracion())
+    assert respuesta is not None and esperado in respuesta
+
+
+def test_producto_eliminado_escala_a_la_ia(motor, almacen):
+    almacen.suscribir(motor.actualizar)
+    snapshot = almacen.obtener_snapshot()
+    configuracion = obtener_configuracion()
+    assert 'Mouse Logitech' in motor.responder('precio mouse logitech', snapshot.df, snapshot.version, configuracion, snapshot.consultas)
+
+    snapshot, _ = almacen.aplicar_cambios(bajas=[2])
+    almacen.esperar_persistencia()
+    assert motor.responder('precio mouse logitech', snapshot.df, snapshot.version, configuracion, snapshot.consultas) is None
+    assert 'Webcam Logitech C920' in motor.responder('precio webcam logitech', snapshot.df, snapshot.version, configuracion, snapshot.consultas)
+
+
+def test_producto_sin_el_dato_pedido_escala_a_la_ia(motor, almacen):
+    almacen.suscribir(motor.actualizar)
+    configuracion = obtener_configuracion()
+    snapshot, _ = almacen.aplicar_cambios([{'ID': 11, 'Producto': 'Parlante JBL Flip 6'}, {'ID': 3, 'Stock': None}])
+
+    def responder(consulta):
+        return motor.responder(consulta, snapshot.df, snapshot.version, configuracion, snapshot.consultas)
+
+    assert responder('precio parlante jbl') is None
+    assert responder('stock teclado razer') is None
+    assert 'Teclado Mecánico Razer: $150' in responder('precio teclado razer')
+    # Las listas muestran el producto sin el dato que le falta
+    lista = responder('inventario')
+    assert '🔹 Parlante JBL Flip 6\n' in lista + '\n'
+    assert 'None' not in lista and 'nan' not in lista
+
+
+def test_error_en_una_consulta_no_escala_el_resto_del_lote(motor, inventario_df, monkeypatch):
+    formatear = motor._formatear_producto
+
+    def formatear_con_error(fila, intenciones):
+        if fila['Producto'] == 'Teclado Mecánico Razer':
+            raise ValueError('fila dañada')
+        return formatear(fila, intenciones)
+
+    monkeypatch.setattr(motor, '_formatear_producto', formatear_con_error)
+    respuestas = motor.responder_lote(
+        ['precio iphone 14', 'stock teclado razer', 'precio mouse logitech'], inventario_df, 1, obtener_configuracion()
+    )
+    assert 'Smartphone iPhone 14' in respuestas[0]
+    assert respuestas[1] is None
+    assert 'Mouse Logitech MX Master 3' in respuestas[2]
+
+
+def test_error_al_analizar_una_consulta_no_escala_el_resto_del_lote(motor, inventario_df, monkeypatch):
+    analizar = motor._analizar
+
+    def analizar_con_error(texto, *args):
+        if 'teclado' in texto:
+            raise ValueError('consulta dañada')
+        return analizar(texto, *args)
+
+    monkeypatch.setattr(motor, '_analizar', analizar_con_error)
+    respuestas = motor.responder_lote(
+        ['precio iphone 14', 'stock teclado razer', 'precio mouse logitech'], inventario_df, 1, obtener_configuracion()
+    )
+    assert respuestas[0] is not None and respuestas[1] is None and respuestas[2] is not None
@@ -0,0 +1,103 @@
+"""
+Enrutador de proveedores de IA: failover, cobertura (hedging) y estadísticas por proveedor
+"""
+
+import threading
+
+import pytest
+
+from cache_respuestas import RespuestaRespaldo
+from enrutador_proveedores import EnrutadorProveedores, ProveedorIA
+
+
+class ProveedorFalso:
+    """Proveedor que responde después de `espera` segundos (o falla), cortándose si lo cancelan"""
+
+    def __init__(self, nombre, respuesta='ok', espera=0.0, error=None):
+        self.nombre = nombre
+        self.respuesta = respuesta
+        self.espera = espera
+        self.error = error
+        self.llamadas = 0
+        self.cancelada = threading.Event()
+        self.termino = threading.Event()
+
+    def consultar(self, query_texto, df, historial, entrega=None, cancelado=None):
+        self.llamadas += 1
+        try:
+            if cancelado is not None and cancelado.wait(self.espera):
+                self.cancelada.set()
+                return f'{self.respuesta} (cortada)'
+            if self.error is not None:
+                raise self.error
+            return self.respuesta
+        finally:
+            self.termino.set()
+
+    def como_proveedor(self):
+        return ProveedorIA(self.nombre, self.consultar, lambda: 'modelo', lambda: True)
+
+
+def enrutador(*falsos, **opciones):
+    opciones.setdefault('exploracion', 0.0)
+    return EnrutadorProveedores([falso.como_proveedor() for falso in falsos], **opciones)
+
+
+def test_usa_el_primero_sin_consultar_al_resto():
+    rapido, lento = ProveedorFalso('a', 'respuesta a'), ProveedorFalso('b', 'respuesta b')
+    assert enrutador(rapido, lento).consultar('hola', None, []) == 'respuesta a'
+    assert (rapido.llamadas, lento.llamadas) == (1, 0)
+
+
+@pytest.mark.parametrize('falla', [
+    ProveedorFalso('a', error=RuntimeError('caído')),
+    ProveedorFalso('a', RespuestaRespaldo('respuesta estática')),
+])
+def test_failover_al_siguiente_proveedor(falla):
+    respaldo = ProveedorFalso('b', 'respuesta b')
+    pool = enrutador(falla, respaldo)
+    assert pool.consultar('hola', None, []) == 'respuesta b'
+    assert pool.estado()['a:modelo']['tasa_error'] == 1.0
+    assert pool.estado()['b:modelo']['tasa_error'] == 0.0
+
+
+def test_si_fallan_todos_retorna_la_respuesta_de_respaldo():
+    primero = ProveedorFalso('a', RespuestaRespaldo('respuesta estática'))
+    segundo = ProveedorFalso('b', error=RuntimeError('caído'))
+    respuesta = enrutador(primero, segundo).consultar('hola', None, [])
+    assert isinstance(respuesta, RespuestaRespaldo) and respuesta == 'respuesta estática'
+
+
+def test_cobertura_gana_el_primer_exito_y_cancela_al_perdedor():
+    lento = ProveedorFalso('a', 'respuesta a', espera=5.0)
+    rapido = ProveedorFalso('b', 'respuesta b', espera=0.01)
+    pool = enrutador(lento, rapido, cobertura=True, retardo_inicial=0.05)
+    assert pool.consultar('hola', None, []) == 'respuesta b'
+    assert lento.cancelada.wait(2) and lento.termino.wait(2)
+    # El perdedor cancelado no cuenta en las estadísticas de latencia ni de errores
+    assert pool.estado()['a:modelo']['muestras'] == 0
+    assert pool.estado()['b:modelo']['muestras'] == 1
+
+
+def test_cobertura_sin_segunda_peticion_si_el_primero_responde_a_tiempo():
+    primero, segundo = ProveedorFalso('a', 'respuesta a'), ProveedorFalso('b', 'respuesta b')
+    pool = enrutador(primero, segundo, cobertura=True, retardo_inicial=1.0)
+    assert pool.consultar('hola', None, []) == 'respuesta a'
+    assert segundo.llamadas == 0
+
+
+def test_cobertura_espera_al_otro_si_el_primero_en_terminar_falla():
+    falla = ProveedorFalso('a', error=RuntimeError('caído'), espera=0.1)
+    lento = ProveedorFalso('b', 'respuesta b', espera=0.3)
+    pool = enrutador(falla, lento, cobertura=True, retardo_inicial=0.05)
+    assert pool.consultar('hola', None, []) == 'respuesta b'
+    assert (falla.llamadas, lento.llamadas) == (1, 1)
+
+
+def test_cobertura_si_fallan_ambos_retorna_el_respaldo():
+    primero = ProveedorFalso('a', RespuestaRespaldo('respuesta estática'), espera=0.1)
+    segundo = ProveedorFalso('b', error=RuntimeError('caído'))
+    pool = enrutador(primero, segundo, cobertura=True, retardo_inicial=0.05)
+    respuesta = pool.consultar('hola', None, [])
+    assert isinstance(respuesta, RespuestaRespaldo)
+    assert (primero.llamadas, segundo.llamadas) == (1, 1)
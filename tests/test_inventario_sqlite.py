@@ -0,0 +1,24 @@
+"""
+Consultas indexadas sobre la base SQLite del inventario
+"""
+
+import os
+import shutil
+
+from inventario_sqlite import InventarioSQLite, importar_inventario, leer_base
+
+
+def test_reintenta_la_conexion_despues_de_un_fallo(ruta_inventario, tmp_path):
+    ruta_base = str(tmp_path / 'inventario.db')
+    importar_inventario(ruta_inventario, ruta_base)
+    _, meta = leer_base(ruta_base)
+    apartada = ruta_base + '.apartada'
+    shutil.move(ruta_base, apartada)
+
+    consultas = InventarioSQLite(ruta_base, meta['huella'])
+    assert consultas.buscar_por_nombre('mouse logitech') is None
+
+    # La base vuelve a estar disponible: el mismo hilo se conecta en la consulta siguiente
+    os.replace(apartada, ruta_base)
+    posicion, _ = consultas.buscar_por_nombre('mouse logitech', limite=1)[0]
+    assert posicion == 1
@@ -0,0 +1,55 @@
+"""
+Límite de consultas por usuario (token bucket en memoria local)
+"""
+
+import pytest
+
+from limitador import LimitadorConsultas
+
+
+@pytest.fixture
+def limitador(reloj):
+    return LimitadorConsultas()
+
+
+def test_rechaza_al_agotar_la_capacidad(limitador):
+    assert [limitador.permitir('a', 3, 60) for _ in range(4)] == [True, True, True, False]
+    assert limitador.rechazados == 1
+
+
+def test_recarga_proporcional_a_la_ventana(limitador, reloj):
+    for _ in range(3):
+        limitador.permitir('a', 3, 60)
+    reloj.avanzar(19.9)
+    assert not limitador.permitir('a', 3, 60)
+    reloj.avanzar(0.2)
+    assert limitador.permitir('a', 3, 60)
+    assert not limitador.permitir('a', 3, 60)
+
+
+def test_recarga_no_supera_la_capacidad(limitador, reloj):
+    limitador.permitir('a', 3, 60)
+    reloj.avanzar(3600)
+    assert [limitador.permitir('a', 3, 60) for _ in range(4)] == [True, True, True, False]
+
+
+def test_buckets_independientes_por_clave(limitador):
+    for _ in range(3):
+        limitador.permitir('a', 3, 60)
+    assert not limitador.permitir('a', 3, 60)
+    assert limitador.permitir('b', 3, 60)
+
+
+def test_capacidad_cero_desactiva_el_limite(limitador):
+    assert all(limitador.permitir('a', 0, 60) for _ in range(100))
+    assert limitador.rechazados == 0
+
+
+def test_descarta_las_claves_menos_recientes(reloj):
+    limitador = LimitadorConsultas(max_claves_locales=2)
+    limitador.permitir('a', 1, 60)
+    limitador.permitir('b', 1, 60)
+    limitador.permitir('c', 1, 60)
+    # 'a' se descartó y vuelve a empezar con el bucket lleno
+    assert limitador.permitir('a', 1, 60)
+    assert not limitador.permitir('c', 1, 60)
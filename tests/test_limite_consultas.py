@@ -0,0 +1,46 @@
+"""
+Límite de consultas del webhook de WhatsApp: solo se cobran los mensajes que llegan a la IA
+"""
+
+import pytest
+
+from limitador import LimitadorConsultas
+
+
+@pytest.fixture
+def cliente(monkeypatch, almacen):
+    import app
+    monkeypatch.setattr(app, 'almacen_inventario', almacen)
+    monkeypatch.setattr(app, 'limitador_consultas', LimitadorConsultas())
+    consultas_ia = []
+    monkeypatch.setattr(app, 'consultar_con_gemini', lambda consulta, *args, **kwargs: consultas_ia.append(consulta) or 'respuesta de la IA')
+    monkeypatch.setattr(app, 'consultar_con_siliconflow', lambda consulta, *args, **kwargs: consultas_ia.append(consulta) or 'respuesta de la IA')
+    monkeypatch.setattr(app.enrutador_proveedores, 'consultar', lambda consulta, *args, **kwargs: consultas_ia.append(consulta) or 'respuesta de la IA')
+    limites = dict(app.almacen_configuracion.obtener().limites, max_intentos_consulta=3, ventana_consultas_segundos=60)
+    monkeypatch.setattr(app.almacen_configuracion, '_actual', app.almacen_configuracion.obtener()._replace(limites=limites))
+    monkeypatch.setattr(app.cache_respuestas, 'obtener', lambda clave: None)
+    cliente = app.app.test_client()
+    cliente.consultas_ia = consultas_ia
+    cliente.limite_excedido = app.almacen_configuracion.obtener().mensajes['limite_excedido']
+    return cliente
+
+
+def enviar(cliente, texto, numero='whatsapp:+5491100000000'):
+    return cliente.post('/whatsapp', data={'Body': texto, 'From': numero}).get_data(as_text=True)
+
+
+def test_saludos_y_camino_rapido_no_consumen_el_limite(cliente):
+    for _ in range(3):
+        assert 'Mouse Logitech MX Master 3' in enviar(cliente, 'precio del mouse logitech')
+        enviar(cliente, 'hola')
+    assert cliente.consultas_ia == []
+    assert 'respuesta de la IA' in enviar(cliente, '¿qué me recomiendas para trabajar desde casa?')
+
+
+def test_consultas_a_la_ia_superan_el_limite(cliente):
+    respuestas = [enviar(cliente, f'¿qué me recomiendas para la oficina {i}?') for i in range(4)]
+    assert len(cliente.consultas_ia) == 3
+    assert cliente.limite_excedido in respuestas[3]
+    assert all(cliente.limite_excedido not in respuesta for respuesta in respuestas[:3])
+    # El camino rápido sigue respondiendo aunque el límite esté agotado
+    assert 'Mouse Logitech MX Master 3' in enviar(cliente, 'precio del mouse logitech')
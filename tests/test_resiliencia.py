@@ -0,0 +1,69 @@
+"""
+Interruptor de circuito: transiciones cerrado -> abierto -> semiabierto -> cerrado/abierto
+"""
+
+import pytest
+
+from resiliencia import InterruptorCircuito, CircuitoAbierto
+
+
+@pytest.fixture
+def circuito(reloj):
+    return InterruptorCircuito('prueba', max_fallos=3, tiempo_apertura=30.0)
+
+
+def test_se_abre_tras_fallos_consecutivos(circuito):
+    for _ in range(2):
+        circuito.permitir()
+        circuito.registrar_fallo()
+    assert circuito.estado == InterruptorCircuito.CERRADO
+    circuito.registrar_fallo()
+    assert circuito.estado == InterruptorCircuito.ABIERTO
+    with pytest.raises(CircuitoAbierto):
+        circuito.permitir()
+
+
+def test_exito_reinicia_los_fallos(circuito):
+    circuito.registrar_fallo()
+    circuito.registrar_fallo()
+    circuito.registrar_exito()
+    circuito.registrar_fallo()
+    circuito.registrar_fallo()
+    assert circuito.estado == InterruptorCircuito.CERRADO
+
+
+def test_semiabierto_deja_pasar_una_sola_prueba(circuito, reloj):
+    for _ in range(3):
+        circuito.registrar_fallo()
+    reloj.avanzar(29.9)
+    assert circuito.estado == InterruptorCircuito.ABIERTO
+    reloj.avanzar(0.1)
+    assert circuito.estado == InterruptorCircuito.SEMIABIERTO
+    circuito.permitir()
+    with pytest.raises(CircuitoAbierto):
+        circuito.permitir()
+
+
+def test_prueba_exitosa_cierra_el_circuito(circuito, reloj):
+    for _ in range(3):
+        circuito.registrar_fallo()
+    reloj.avanzar(30)
+    circuito.permitir()
+    circuito.registrar_exito()
+    assert circuito.estado == InterruptorCircuito.CERRADO
+    circuito.permitir()
+    circuito.permitir()
+
+
+def test_prueba_fallida_vuelve_a_abrir(circuito, reloj):
+    for _ in range(3):
+        circuito.registrar_fallo()
+    reloj.avanzar(30)
+    circuito.permitir()
+    circuito.registrar_fallo()
+    assert circuito.estado == InterruptorCircuito.ABIERTO
+    with pytest.raises(CircuitoAbierto):
+        circuito.permitir()
+    # El tiempo de apertura se cuenta desde el último fallo y admite una nueva prueba
+    reloj.avanzar(30)
+    circuito.permitir()
@@ -0,0 +1,19 @@
+"""
+Resolutor de nombres de productos: tolera errores de tipeo y reutiliza el índice de cada DataFrame
+"""
+
+from resolutor_productos import ResolutorProductos
+
+
+def test_resuelve_con_errores_de_tipeo(inventario_df):
+    resolutor = ResolutorProductos()
+    posicion, _ = resolutor.buscar(['mause', 'logitek'], inventario_df, 1, k=1)[0]
+    assert inventario_df['Producto'].iat[posicion] == 'Mouse Logitech MX Master 3'
+
+
+def test_dataframe_sin_version_construye_el_indice_una_vez(inventario_df):
+    resolutor = ResolutorProductos()
+    subconjunto = inventario_df.iloc[[1, 5]]
+    indice = resolutor.obtener_indice(subconjunto, None)
+    assert resolutor.obtener_indice(subconjunto, None) is indice
+    assert resolutor.obtener_indice(inventario_df.iloc[[1, 5]], None) is not indice
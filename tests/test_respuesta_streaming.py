@@ -0,0 +1,96 @@
+"""
+Respuestas en streaming: corte en el límite de caracteres, cancelación y envío anticipado de la primera oración
+"""
+
+import threading
+
+from respuesta_streaming import AcumuladorRespuesta, EntregaAnticipada
+
+
+class Fragmentos:
+    """Generador de fragmentos que registra cuántos se leyeron y si se cerró"""
+
+    def __init__(self, textos, al_leer=None):
+        self.textos = textos
+        self.al_leer = al_leer
+        self.leidos = 0
+        self.cerrado = False
+
+    def __iter__(self):
+        for texto in self.textos:
+            self.leidos += 1
+            if self.al_leer is not None:
+                self.al_leer(self.leidos)
+            yield texto
+
+    def close(self):
+        self.cerrado = True
+
+
+def test_respuesta_completa_dentro_del_limite():
+    fragmentos = Fragmentos(['Hola', ', ', 'mundo'])
+    assert AcumuladorRespuesta(100).consumir(fragmentos) == 'Hola, mundo'
+    assert fragmentos.cerrado
+
+
+def test_corta_la_generacion_al_superar_el_limite():
+    fragmentos = Fragmentos(['a' * 6] * 10)
+    acumulador = AcumuladorRespuesta(10)
+    assert acumulador.consumir(fragmentos) == 'a' * 10 + '...'
+    # Se deja de leer en el fragmento que supera el límite y se cierra el streaming
+    assert fragmentos.leidos == 2
+    assert fragmentos.cerrado
+    assert acumulador.primer_fragmento is not None
+
+
+def test_cancelacion_corta_la_generacion():
+    cancelado = threading.Event()
+    fragmentos = Fragmentos(['uno ', 'dos ', 'tres ', 'cuatro '], al_leer=lambda n: n == 2 and cancelado.set())
+    assert AcumuladorRespuesta(100, cancelado=cancelado).consumir(fragmentos) == 'uno dos '
+    assert fragmentos.leidos == 2
+    assert fragmentos.cerrado
+
+
+def test_envia_la_primera_oracion_y_resto_completa_la_respuesta():
+    enviados = []
+    entrega = EntregaAnticipada(enviados.append, min_caracteres=10)
+    fragmentos = Fragmentos(['El mouse cue', 'sta $99. Quedan ', '25 unidades.'])
+    respuesta = AcumuladorRespuesta(200, entrega=entrega).consumir(fragmentos)
+
+    assert enviados == ['El mouse cuesta $99.']
+    assert entrega.enviado == 'El mouse cuesta $99.'
+    assert entrega.resto(respuesta) == 'Quedan 25 unidades.'
+
+
+def test_no_adelanta_oraciones_cortas_ni_numeros_decimales():
+    enviados = []
+    entrega = EntregaAnticipada(enviados.append, min_caracteres=20)
+    entrega.ofrecer('Sí. Cuesta 3.5')
+    assert enviados == []
+    entrega.ofrecer('Sí. Cuesta 3.5 dólares el metro. Y')
+    assert enviados == ['Sí. Cuesta 3.5 dólares el metro.']
+
+
+def test_cancelar_antes_de_enviar_impide_el_envio():
+    enviados = []
+    entrega = EntregaAnticipada(enviados.append, min_caracteres=5)
+    assert entrega.cancelar()
+    entrega.ofrecer('Primera oración. Segunda')
+    assert enviados == []
+    assert entrega.resto('Primera oración. Segunda') == 'Primera oración. Segunda'
+
+
+def test_cancelar_despues_de_enviar_informa_que_ya_se_envio():
+    entrega = EntregaAnticipada(lambda texto: None, min_caracteres=5)
+    entrega.ofrecer('Primera oración. Segunda')
+    assert not entrega.cancelar()
+
+
+def test_error_al_enviar_deja_la_respuesta_completa_para_el_final():
+    def enviar(texto):
+        raise ConnectionError('sin red')
+
+    entrega = EntregaAnticipada(enviar, min_caracteres=5)
+    entrega.ofrecer('Primera oración. Segunda')
+    assert entrega.enviado == ''
+    assert entrega.resto('Primera oración. Segunda') == 'Primera oración. Segunda'
@@ -0,0 +1,8 @@
+"""
+Punto de entrada WSGI para producción
+Uso: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from app import create_app
+
+app = create_app()